@@ -8,16 +8,16 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from collections import defaultdict, deque
 import time
 
+from bot_logging import setup_logging, truncate
+
 class TelegramBot:
-    def __init__(self, TOKEN, API_URL, DB_CONFIG, log_file='bot.log'):
+    def __init__(self, TOKEN, API_URL, DB_CONFIG, log_file='bot.log', log_messages=False):
         self.TOKEN = TOKEN
         self.API_URL = API_URL
         self.DB_CONFIG = DB_CONFIG
-        logging.basicConfig(
-            filename=log_file,
-            level=logging.INFO,
-            format="%(asctime)s - %(levelname)s - %(message)s"
-        )
+        setup_logging(log_file)
+        self.log_messages = log_messages  # писать ли в лог текст сообщений пользователей
+        self.log_message_max_chars = 200  # сколько символов сообщения писать в лог
         self.bot = Bot(token=self.TOKEN)
         self.dp = Dispatcher()
         self.dp.message.register(self.start, Command("start"))
@@ -27,6 +27,7 @@ class TelegramBot:
         self.user_requests = defaultdict(lambda: deque()) # количество запросов от пользователя
         self.rate_limit_count = 10         # максимально количество сообщений от пользователя
         self.rate_limit_seconds = 30    # лимит времени на количество запросов
+        self.request_timeout = 10       # время в секундах, за которое Zoo должен ответить
     
     async def db_connect(self):
         return await asyncpg.connect(**self.DB_CONFIG)
@@ -63,7 +64,10 @@ class TelegramBot:
             await message.answer("⏳ Слишком много запросо.")
             logging.info(f"Пользователь {user_id} отправил слишком много запросов")
             return      
-        logging.info(f"Пользователь {user_id} отправил сообщение: {text}")
+        fields = {"user_id": user_id, "words": len(text.split()), "chars": len(text)}
+        if self.log_messages:
+            fields["text"] = truncate(text, self.log_message_max_chars)
+        logging.info("Пользователь отправил сообщение", extra=fields)
         await message.bot.send_chat_action(chat_id=message.chat.id, action="typing")
 
         last_msg = self.last_feedback_messages.get(user_id)
@@ -120,7 +124,12 @@ class TelegramBot:
 
         try:
             async with aiohttp.ClientSession() as session:
-                async with session.post(self.API_URL, json=payload, headers={"Content-Type": "application/json"}) as response:
+                async with session.post(
+                    self.API_URL,
+                    json=payload,
+                    headers={"Content-Type": "application/json", "X-Request-Timeout": str(self.request_timeout)},
+                    timeout=aiohttp.ClientTimeout(total=self.request_timeout + 5),
+                ) as response:
                     response.raise_for_status()
                     result = await response.json()
                     #return result[0][0]
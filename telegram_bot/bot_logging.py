@@ -0,0 +1,55 @@
+"""Настройка логов бота.
+
+Записи кладутся в очередь и пишутся в файл отдельным потоком, поэтому
+запись на диск не блокирует обработку сообщений. Каждая запись — строка
+JSON с полями из `extra`, например id пользователя и длина сообщения.
+Настройка повторяет app/logs.py из Zoo.
+"""
+import atexit
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# атрибуты любой записи, остальные — поля из `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Записывает запись строкой JSON вместе с полями из `extra`."""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(log_file="bot.log", level=logging.INFO):
+    """Направляет записи всех логгеров через очередь в файл.
+
+    Возвращает запущенный QueueListener, он останавливается при выходе.
+    """
+    handler = logging.FileHandler(log_file, encoding="utf-8")
+    handler.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level)
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def truncate(text, max_chars):
+    """Обрезает текст до `max_chars` символов."""
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
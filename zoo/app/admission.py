@@ -0,0 +1,183 @@
+"""The module with the admission control of the Zoo requests.
+
+The requests over the limits are rejected at once instead of queueing
+unbounded work: too large requests get 413, and requests arriving when
+the Zoo is overloaded get 429 or 503 with `Retry-After` header.
+"""
+import json
+from collections import Counter
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class AdmissionController:
+    """Limits of the request size, the batch queue and the texts in flight per model."""
+
+    def __init__(
+        self,
+        max_queued_texts: int = 1_000_000,
+        max_texts_per_request: int = 50_000,
+        max_model_in_flight_texts: int = 10_000,
+        retry_after: int = 5,
+    ):
+        """Init.
+
+        Args:
+            max_queued_texts (int, optional): The max number of texts waiting in
+            batch jobs. Defaults to 1_000_000.
+            max_texts_per_request (int, optional): The max number of texts in one
+            request. Defaults to 50_000.
+            max_model_in_flight_texts (int, optional): The max number of texts
+            predicted by one model for the requests at the same time. Defaults to 10_000.
+            retry_after (int, optional): The value of `Retry-After` header in
+            seconds. Defaults to 5.
+        """
+        self.max_queued_texts = max_queued_texts
+        self.max_texts_per_request = max_texts_per_request
+        self.max_model_in_flight_texts = max_model_in_flight_texts
+        self.retry_after = retry_after
+        self.in_flight: Counter[str] = Counter()
+
+    def _reject(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    def check_request_size(self, n_texts: int):
+        """Reject the request with too many texts.
+
+        Args:
+            n_texts (int): The number of texts in the request.
+
+        Raises:
+            HTTPException: 413 if the limit is exceeded.
+        """
+        if n_texts > self.max_texts_per_request:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many texts in the request, the limit is {self.max_texts_per_request}",
+            )
+
+    def check_queue(self, queued_texts: int, n_texts: int):
+        """Reject the batch if the queue is full.
+
+        Args:
+            queued_texts (int): The number of texts already in the queue.
+            n_texts (int): The number of texts in the batch.
+
+        Raises:
+            HTTPException: 503 if the queue can't take the batch.
+        """
+        if queued_texts + n_texts > self.max_queued_texts:
+            raise self._reject(503, "The batch queue is full, retry later")
+
+    @contextmanager
+    def model_slots(self, model_names: list[str], n_texts: int):
+        """Hold the in-flight slots of the models while the texts are predicted.
+
+        Args:
+            model_names (list[str]): The names of the requested models.
+            n_texts (int): The number of texts.
+
+        Raises:
+            HTTPException: 429 if any model has too many texts in flight.
+        """
+        for name in model_names:
+            # a single request larger than the limit is let through on an idle model
+            if self.in_flight[name] and self.in_flight[name] + n_texts > self.max_model_in_flight_texts:
+                raise self._reject(429, f"The model {name} is overloaded, retry later")
+        for name in model_names:
+            self.in_flight[name] += n_texts
+        try:
+            yield
+        finally:
+            for name in model_names:
+                self.in_flight[name] -= n_texts
+                if self.in_flight[name] <= 0:
+                    del self.in_flight[name]
+
+
+class BodySizeLimitMiddleware:
+    """ASGI middleware rejecting request bodies larger than the limit with 413."""
+
+    def __init__(self, app: ASGIApp, max_body_bytes: int, path_limits: dict[str, int] | None = None):
+        """Init.
+
+        Args:
+            app (ASGIApp): The wrapped app.
+            max_body_bytes (int): The max size of a request body, 0 for no limit.
+            path_limits (dict[str, int] | None, optional): The limits of the paths
+            replacing `max_body_bytes`, e.g. of a streaming endpoint, 0 for no
+            limit. Defaults to None.
+        """
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.path_limits = path_limits or {}
+
+    @staticmethod
+    async def _respond(send: Send, status_code: int, detail: str):
+        """Send the JSON error response."""
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({
+            "type": "http.response.body",
+            "body": json.dumps({"detail": detail}).encode(),
+        })
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        max_body_bytes = self.path_limits.get(scope.get("path"), self.max_body_bytes)
+        if scope["type"] != "http" or not max_body_bytes:
+            await self.app(scope, receive, send)
+            return
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            try:
+                content_length = int(content_length)
+            except ValueError:
+                await self._respond(send, 400, "Invalid Content-Length header")
+                return
+            if content_length > max_body_bytes:
+                await self._respond(send, 413, "Request body is too large")
+                return
+
+        received = 0
+        rejected = False
+        started = False
+
+        async def limited_send(message: Message):
+            nonlocal started
+            # the app answers the cut body too, its response is dropped after the 413
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        async def limited_receive() -> Message:
+            # a chunked body has no content-length, so it's counted on reading
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_bytes:
+                    if not started:
+                        await self._respond(send, 413, "Request body is too large")
+                    rejected = True
+                    # the app stops reading as if the client has gone
+                    return {"type": "http.disconnect"}
+            return message
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except Exception:
+            if not rejected:
+                raise
@@ -0,0 +1,365 @@
+"""The module with AsyncTritonApiClient."""
+import asyncio
+import logging
+import time
+
+import httpx
+import orjson
+
+from app.batch_sizing import AdaptiveBatchSize
+from app.binary_tensor import (
+    INFERENCE_HEADER,
+    make_binary_infer_request,
+    parse_infer_response,
+)
+from app.metrics import MODEL_BATCH_SIZE, MODEL_ERRORS, MODEL_LATENCY
+from app.triton_api_client import (
+    ARRIVAL,
+    BATCHING,
+    LENGTH,
+    length_order,
+    make_infer_request,
+    restore_order,
+    split_into_batches,
+)
+
+logger = logging.getLogger(__name__)
+
+# the status codes of a server that can't parse binary tensor data
+BINARY_REFUSED_CODES = (415, 422)
+# the words of a 400 error about the binary body, other 400 errors are the errors of the batch
+BINARY_REFUSED_MARKERS = ("binary", "parse")
+
+
+def binary_refused(response: httpx.Response) -> bool:
+    """Check if the server refused the request because of the binary tensor data.
+
+    Args:
+        response (httpx.Response): The response to the binary request.
+
+    Returns:
+        bool: True for 415 and 422, and for 400 with the error about the binary body.
+    """
+    if response.status_code in BINARY_REFUSED_CODES:
+        return True
+    if response.status_code != 400:
+        return False
+    error = response.text.lower()
+    return any(marker in error for marker in BINARY_REFUSED_MARKERS)
+
+
+_connection_pools: dict[str, httpx.AsyncClient] = {}
+_connection_pool_users: dict[str, int] = {}
+
+
+def acquire_connection_pool(
+    base: str, pool_size: int = 100, transport: httpx.AsyncBaseTransport | None = None
+) -> httpx.AsyncClient:
+    """Get the keep-alive connection pool for the Triton base url.
+
+    All the models served by one Triton server share the same pool.
+
+    Args:
+        base (str): The base url of Triton service.
+        pool_size (int, optional): The max number of connections. Defaults to 100.
+        transport (httpx.AsyncBaseTransport | None, optional): The custom
+        transport, used in tests. Defaults to None.
+
+    Returns:
+        httpx.AsyncClient: The pooled client.
+    """
+    if base not in _connection_pools:
+        _connection_pools[base] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            timeout=httpx.Timeout(None, connect=5.0),
+            transport=transport,
+        )
+        _connection_pool_users[base] = 0
+    _connection_pool_users[base] += 1
+    return _connection_pools[base]
+
+
+async def release_connection_pool(base: str):
+    """Release the connection pool, it's closed when the last user is gone.
+
+    Args:
+        base (str): The base url of Triton service.
+    """
+    if base not in _connection_pools:
+        return
+    _connection_pool_users[base] -= 1
+    if _connection_pool_users[base] == 0:
+        del _connection_pool_users[base]
+        await _connection_pools.pop(base).aclose()
+
+
+def _version_key(version: str) -> tuple[int, str]:
+    """Sort key for Triton model versions, they are numbers in strings."""
+    return (int(version), "") if version.isdigit() else (-1, version)
+
+
+class AsyncTritonApiClient:
+    """Asyncio Api client for Triton inference server
+
+    It has the same surface as TritonApiClient, but all the network
+    calls are coroutines. Since the constructor can't make requests,
+    the client should be created by `AsyncTritonApiClient.create`.
+    """
+
+    def __init__(
+        self,
+        base: str,
+        port: int,
+        model_name: str,
+        max_concurrency: int = 1,
+        pool_size: int = 100,
+        binary_data: bool = False,
+        batching: str = ARRIVAL,
+        max_batch_chars: int | None = None,
+        adaptive_batching: str | None = None,
+        target_batch_latency: float | None = None,
+        request_timeout: float | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        """Init.
+
+        Args:
+            base (str): Url base
+            port (int): Port of the serivce.
+            model_name (str): Model name in Triton service.
+            max_concurrency (int, optional): The max number of batches sent
+            to the model at the same time. Defaults to 1.
+            pool_size (int, optional): The max number of connections to
+            the Triton service. Defaults to 100.
+            binary_data (bool, optional): Whether to use the binary tensor data
+            extension for inputs and outputs. The client falls back to JSON
+            if the server refuses it. Defaults to False.
+            batching (str, optional): "arrival" to batch the texts in their order
+            or "length" to sort them by length first. Defaults to "arrival".
+            max_batch_chars (int | None, optional): The max total number of
+            characters in one batch, None for no limit. Defaults to None.
+            adaptive_batching (str | None, optional): The objective of the adaptive
+            batch size, "throughput" or "latency", None to always use
+            `max_batch_size`. Defaults to None.
+            target_batch_latency (float | None, optional): The target latency of
+            a batch in seconds for the "latency" objective. Defaults to None.
+            request_timeout (float | None, optional): The timeout of one inference
+            request in seconds, so a hung service doesn't hold the caller
+            forever. None for no timeout. Defaults to None.
+            transport (httpx.AsyncBaseTransport | None, optional): The custom
+            transport, used in tests. Defaults to None.
+        """
+        self.url = base
+        self.port = port
+        self.base = f"{base}:{port}/v2"
+        self.model_name = model_name
+        self.max_batch_size = None
+        self.model_version = ""
+        if batching not in BATCHING:
+            raise ValueError(f"Unknown batching '{batching}', expected one of {BATCHING}")
+        self.binary_data = binary_data
+        self.batching = batching
+        self.max_batch_chars = max_batch_chars
+        self.adaptive_batching = adaptive_batching
+        self.target_batch_latency = target_batch_latency
+        self.batch_sizing: AdaptiveBatchSize | None = None
+        self.request_timeout = request_timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.sess = self._open_session(pool_size, transport)
+
+    def _open_session(self, pool_size: int, transport: httpx.AsyncBaseTransport | None):
+        """Get the shared connection pool of the Triton service."""
+        return acquire_connection_pool(self.base, pool_size, transport)
+
+    async def _close_session(self):
+        """Release the shared connection pool of the Triton service."""
+        await release_connection_pool(self.base)
+
+    @classmethod
+    async def create(cls, *args, **kwargs) -> "AsyncTritonApiClient":
+        """Create the client and connect it to the Triton service.
+
+        The arguments are the same as for the constructor.
+
+        Returns:
+            AsyncTritonApiClient: The connected client.
+        """
+        client = cls(*args, **kwargs)
+        try:
+            await client.connect()
+        except BaseException:
+            # also on cancellation, e.g. by a connection timeout
+            await client.close_connection()
+            raise
+        return client
+
+    async def connect(self):
+        """Check the service and read the model config and metadata.
+
+        The metadata is optional, if it's unavailable `model_version` stays empty.
+        """
+        res = await self.sess.get(self.base)
+        res.raise_for_status()
+        logger.info(f"Connection establisshed to the Triton model {self.model_name}")
+        res = await self.sess.get(f"{self.base}/models/{self.model_name}/config")
+        res.raise_for_status()
+        self.max_batch_size = res.json()["max_batch_size"]
+        self._create_batch_sizing()
+        res = await self.sess.get(f"{self.base}/models/{self.model_name}")
+        if res.status_code == 200:
+            self.model_version = max(res.json().get("versions", [""]), key=_version_key)
+
+    def _create_batch_sizing(self):
+        """Create the adaptive batch size once `max_batch_size` is known."""
+        if self.adaptive_batching:
+            self.batch_sizing = AdaptiveBatchSize(
+                self.max_batch_size, self.adaptive_batching, self.target_batch_latency
+            )
+
+    @property
+    def batch_size(self) -> int:
+        """The number of texts `make_prediction` puts into one batch."""
+        if self.batch_sizing is None:
+            return self.max_batch_size
+        return self.batch_sizing.batch_size
+
+    async def is_ready(self) -> bool:
+        """Check if service ready to receive requests.
+
+        Returns:
+            bool: True if yes, False otherwise.
+        """
+        response = await self.sess.get(f"{self.base}/health/ready")
+        return response.status_code == 200
+
+    async def make_prediction_on_batch(self, batch: list[str]) -> list[str]:
+        """Request the predictions from Triton services for one batch.
+
+        This function assumes that length of the input is less that
+        max_batch_size of the services. Otherwise, it returns an error.
+
+        Args:
+            batch (list[str]): A list of texts.
+
+        Returns:
+            list[str]: A list of predictions.
+        """
+        MODEL_BATCH_SIZE.observe(self.model_name, value=len(batch))
+        try:
+            async with self.semaphore:
+                start = time.perf_counter()
+                try:
+                    preds = await self._infer(batch)
+                finally:
+                    latency = time.perf_counter() - start
+                    MODEL_LATENCY.observe(self.model_name, value=latency)
+        except Exception:
+            MODEL_ERRORS.inc(self.model_name)
+            raise
+        if self.batch_sizing is not None:
+            self.batch_sizing.record(len(batch), latency)
+        return preds
+
+    async def _infer(self, batch: list[str]) -> list[str]:
+        """Send one inference request.
+
+        Args:
+            batch (list[str]): A list of texts.
+
+        Returns:
+            list[str]: A list of predictions.
+        """
+        response = None
+        if self.binary_data:
+            response = await self._post_binary(batch)
+            if binary_refused(response):
+                logger.warning(
+                    f"The {self.model_name} model refused binary tensor data "
+                    f"({response.status_code}), falling back to JSON"
+                )
+                self.binary_data = False
+                response = None
+        if response is None:
+            response = await self.sess.post(
+                f"{self.base}/models/{self.model_name}/infer",
+                content=orjson.dumps(make_infer_request(batch)),
+                headers={"Content-Type": "application/json"},
+                timeout=self._infer_timeout(),
+            )
+        response.raise_for_status()
+        return parse_infer_response(
+            response.content, response.headers.get(INFERENCE_HEADER)
+        )
+
+    async def _post_binary(self, batch: list[str]) -> httpx.Response:
+        """Send the batch using the binary tensor data extension.
+
+        Args:
+            batch (list[str]): A list of texts.
+
+        Returns:
+            httpx.Response: The response of the service.
+        """
+        body, header_length = make_binary_infer_request(batch)
+        return await self.sess.post(
+            f"{self.base}/models/{self.model_name}/infer",
+            content=body,
+            headers={
+                INFERENCE_HEADER: str(header_length),
+                "Content-Type": "application/octet-stream",
+            },
+            timeout=self._infer_timeout(),
+        )
+
+    def _infer_timeout(self) -> httpx.Timeout:
+        """The timeout of an inference request, the connect timeout is the pool one."""
+        return httpx.Timeout(self.request_timeout, connect=5.0)
+
+    async def make_prediction(self, texts: list[str]) -> list[str]:
+        """Request the predictions from Triton services.
+
+        The texts are split by `batch_size` and `max_batch_chars`, the parts
+        are sent concurrently within the `max_concurrency` limit of the client.
+        The remaining parts are cancelled if one fails. With "length" batching the texts are sorted by length before the split
+        and the predictions are returned in the original order.
+
+        Args:
+            texts (list[str]): THe list of text with arbitrary length.
+
+        Returns:
+            list[str]: A list of predictions.
+        """
+        order = length_order(texts) if self.batching == LENGTH else None
+        if order is not None:
+            texts = [texts[i] for i in order]
+        tasks = []
+
+        async def send(batch: list[str]) -> list[str]:
+            try:
+                return await self.make_prediction_on_batch(batch)
+            except Exception:
+                # cancelled at once, before the batch waiting for the freed slot is sent
+                for task in tasks:
+                    task.cancel()
+                raise
+
+        tasks.extend(
+            asyncio.ensure_future(send(texts[start:end]))
+            for start, end in split_into_batches(texts, self.batch_size, self.max_batch_chars)
+        )
+        try:
+            chunks = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        preds = [pred for chunk in chunks for pred in chunk]
+        return preds if order is None else restore_order(preds, order)
+
+    async def close_connection(self):
+        """Close connection to the Triton services gracefully."""
+        if self.sess is not None:
+            await self._close_session()
+        self.sess = None
@@ -0,0 +1,173 @@
+"""The module with the adaptive batch size of a Triton model.
+
+The largest batch a model accepts is not always the fastest one, e.g. on
+CPU a large batch can take longer per text than a medium one. The
+controller measures the latency per batch size and climbs to the size
+with the best throughput, or to the largest size within the target latency.
+"""
+THROUGHPUT = "throughput"
+LATENCY = "latency"
+OBJECTIVES = (THROUGHPUT, LATENCY)
+
+
+def candidate_sizes(max_batch_size: int) -> list[int]:
+    """Get the batch sizes the controller chooses from.
+
+    Args:
+        max_batch_size (int): The max batch size of the model.
+
+    Returns:
+        list[int]: The powers of two below `max_batch_size` and itself, ascending.
+    """
+    sizes = []
+    size = 1
+    while size < max_batch_size:
+        sizes.append(size)
+        size *= 2
+    sizes.append(max_batch_size)
+    return sizes
+
+
+class AdaptiveBatchSize:
+    """The batch size of one model chosen by the observed latency.
+
+    The controller starts at `max_batch_size` and works by hill climbing:
+    after `samples` batches of the current size it tries a neighbour size
+    for `probe_samples` batches and moves there if it's better, otherwise
+    the next probe goes the other way. The latency is averaged
+    exponentially, so the controller follows the changes of the load.
+
+    Only the full and near-full batches of the current size are taken into
+    account, at least `near_full` of it. The smaller ones are the tails of
+    requests and they say little about the size. Hence the size changes
+    only when the batches are full, i.e. under the load, which is when it
+    matters. A probe of a size the traffic doesn't fill is abandoned after
+    `probe_max_batches` batches, and the next probe goes the other way.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int,
+        objective: str = THROUGHPUT,
+        target_latency: float | None = None,
+        samples: int = 20,
+        probe_samples: int = 5,
+        smoothing: float = 0.2,
+        near_full: float = 0.75,
+        probe_max_batches: int = 50,
+    ):
+        """Init.
+
+        Args:
+            max_batch_size (int): The max batch size of the model.
+            objective (str, optional): "throughput" for the most texts per second
+            or "latency" for the largest batch within `target_latency`.
+            Defaults to "throughput".
+            target_latency (float | None, optional): The target latency of a batch
+            in seconds, required for the "latency" objective. Defaults to None.
+            samples (int, optional): The number of batches between the probes. Defaults to 20.
+            probe_samples (int, optional): The number of batches of a probed size. Defaults to 5.
+            smoothing (float, optional): The weight of a new latency in the average. Defaults to 0.2.
+            near_full (float, optional): The share of the current size a batch
+            must have to count for it. Defaults to 0.75.
+            probe_max_batches (int, optional): The number of batches of any size
+            after which an unfinished probe is abandoned. Defaults to 50.
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}', expected one of {OBJECTIVES}")
+        if objective == LATENCY and not target_latency:
+            raise ValueError("The latency objective needs the target latency")
+        self.max_batch_size = max_batch_size
+        self.objective = objective
+        self.target_latency = target_latency
+        self.samples = samples
+        self.probe_samples = probe_samples
+        self.smoothing = smoothing
+        self.near_full = near_full
+        self.probe_max_batches = probe_max_batches
+        self.sizes = candidate_sizes(max_batch_size)
+        # the average latency in seconds per batch size
+        self.latency: dict[int, float] = {}
+        self._index = len(self.sizes) - 1
+        self._probe: int | None = None
+        self._direction = -1
+        self._count = 0
+        self._probe_batches = 0
+
+    @property
+    def batch_size(self) -> int:
+        """The batch size to use now, the probed one during a probe."""
+        return self.sizes[self._index if self._probe is None else self._probe]
+
+    @property
+    def chosen_size(self) -> int:
+        """The best batch size found so far."""
+        return self.sizes[self._index]
+
+    def record(self, size: int, latency: float):
+        """Take the latency of a finished batch into account.
+
+        Args:
+            size (int): The number of texts in the batch.
+            latency (float): The latency of the batch in seconds.
+        """
+        current = self.batch_size
+        if self._probe is not None:
+            self._probe_batches += 1
+        if not self.near_full * current <= size <= current:
+            if self._probe is not None and self._probe_batches >= self.probe_max_batches:
+                # the traffic doesn't fill the probed size
+                self._probe = None
+                self._direction = -self._direction
+                self._count = 0
+            return
+        previous = self.latency.get(current)
+        self.latency[current] = latency if previous is None else (
+            previous + self.smoothing * (latency - previous)
+        )
+        self._count += 1
+        if self._count < (self.samples if self._probe is None else self.probe_samples):
+            return
+        self._count = 0
+        if self._probe is None:
+            self._start_probe()
+        else:
+            if self._score(self._probe) > self._score(self._index):
+                self._index = self._probe
+            else:
+                self._direction = -self._direction
+            self._probe = None
+
+    def _start_probe(self):
+        """Choose the neighbour size to probe in the current direction."""
+        if len(self.sizes) == 1:
+            return
+        probe = self._index + self._direction
+        if not 0 <= probe < len(self.sizes):
+            self._direction = -self._direction
+            probe = self._index + self._direction
+        self._probe = probe
+        self._probe_batches = 0
+
+    def _score(self, index: int) -> float:
+        """The score of the size by the objective, the higher the better."""
+        size = self.sizes[index]
+        latency = self.latency[size]
+        if self.objective == THROUGHPUT:
+            return size / latency if latency > 0 else float("inf")
+        # any size within the target is better than any size over it
+        return size if latency <= self.target_latency else -latency
+
+    def stats(self) -> dict:
+        """Show the state of the controller.
+
+        Returns:
+            dict: The chosen and the current batch size, the max one and the
+            average latency in milliseconds per observed size.
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "batch_size": self.chosen_size,
+            "probing": None if self._probe is None else self.sizes[self._probe],
+            "latency_ms": {size: 1000 * latency for size, latency in sorted(self.latency.items())},
+        }
@@ -0,0 +1,84 @@
+"""The module with the dynamic micro-batching of concurrent requests."""
+import asyncio
+
+from app.async_triton_api_client import AsyncTritonApiClient
+from app.utils import check_predictions_count
+
+
+class MicroBatcher:
+    """Gather texts from concurrent callers into shared batches for one model.
+
+    A batch is sent when it reaches `max_batch_size` of the model
+    or when the oldest text waited for `max_wait` seconds. Every caller
+    gets back only the predictions of its own texts.
+    """
+
+    def __init__(self, client: AsyncTritonApiClient, max_wait: float):
+        """Init.
+
+        Args:
+            client (AsyncTritonApiClient): The client of the model.
+            max_wait (float): The max time in seconds a text waits for a batch.
+        """
+        self.client = client
+        self.model_name = client.model_name
+        self.max_wait = max_wait
+        self._pending: list[tuple[list[str], asyncio.Future]] = []
+        self._n_pending = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def make_prediction(self, texts: list[str]) -> list[str]:
+        """Put the texts into the next batch and wait for their predictions.
+
+        Args:
+            texts (list[str]): The texts of one caller.
+
+        Returns:
+            list[str]: The predictions for these texts only.
+        """
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._n_pending += len(texts)
+        if self._n_pending >= self.client.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        """Send all the pending texts as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        pending, self._pending, self._n_pending = self._pending, [], 0
+        task = asyncio.get_running_loop().create_task(self._send(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, pending: list[tuple[list[str], asyncio.Future]]):
+        """Request the model and give every caller its own predictions.
+
+        Args:
+            pending (list[tuple[list[str], asyncio.Future]]): The texts
+            of callers with futures for the results.
+        """
+        texts = [text for caller_texts, _ in pending for text in caller_texts]
+        try:
+            preds = await self.client.make_prediction(texts)
+            check_predictions_count(preds, len(texts))
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for caller_texts, future in pending:
+            if not future.done():
+                future.set_result(preds[offset : offset + len(caller_texts)])
+            offset += len(caller_texts)
@@ -0,0 +1,98 @@
+"""The module with the binary tensor data extension of KServe v2 protocol.
+
+In this mode the request and response bodies consist of a JSON header
+followed by the raw tensor data. The length of the JSON header is passed
+in `Inference-Header-Content-Length` HTTP header. Elements of BYTES tensors
+are serialized as 4-byte little-endian length followed by the bytes.
+"""
+import json
+import struct
+
+import orjson
+
+INFERENCE_HEADER = "Inference-Header-Content-Length"
+_LENGTH = struct.Struct("<I")
+
+
+def serialize_bytes_tensor(texts: list[str]) -> bytes:
+    """Serialize texts into BYTES tensor data.
+
+    Args:
+        texts (list[str]): The texts.
+
+    Returns:
+        bytes: The length-prefixed utf-8 strings.
+    """
+    parts = []
+    for text in texts:
+        encoded = text.encode("utf-8")
+        parts.append(_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    return b"".join(parts)
+
+
+def deserialize_bytes_tensor(data: bytes) -> list[str]:
+    """Deserialize BYTES tensor data into texts.
+
+    Args:
+        data (bytes): The length-prefixed utf-8 strings.
+
+    Returns:
+        list[str]: The texts.
+    """
+    texts = []
+    offset = 0
+    view = memoryview(data)
+    while offset < len(data):
+        (length,) = _LENGTH.unpack_from(view, offset)
+        offset += _LENGTH.size
+        texts.append(str(view[offset : offset + length], "utf-8"))
+        offset += length
+    return texts
+
+
+def make_binary_infer_request(text_list: list[str]) -> tuple[bytes, int]:
+    """Make an inference request body with binary input and output.
+
+    Args:
+        text_list (list[str]): Texts to be predicted.
+
+    Returns:
+        tuple[bytes, int]: The request body and the length of its JSON header.
+    """
+    tensor = serialize_bytes_tensor(text_list)
+    header = json.dumps(
+        {
+            "inputs": [
+                {
+                    "name": "text_input",
+                    "shape": [len(text_list), 1],
+                    "datatype": "BYTES",
+                    "parameters": {"binary_data_size": len(tensor)},
+                }
+            ],
+            "parameters": {"binary_data_output": True},
+        }
+    ).encode("utf-8")
+    return header + tensor, len(header)
+
+
+def parse_infer_response(content: bytes, header_length: str | None) -> list[str]:
+    """Get the predictions from JSON or binary inference response.
+
+    Args:
+        content (bytes): The response body.
+        header_length (str | None): The value of `Inference-Header-Content-Length`,
+        None for a plain JSON response.
+
+    Returns:
+        list[str]: The data of the first output.
+    """
+    if header_length is None:
+        return orjson.loads(content)["outputs"][0]["data"]
+    header_length = int(header_length)
+    output = orjson.loads(content[:header_length])["outputs"][0]
+    if "data" in output:
+        return output["data"]
+    size = output["parameters"]["binary_data_size"]
+    return deserialize_bytes_tensor(content[header_length : header_length + size])
@@ -0,0 +1,244 @@
+"""The module with the in-memory cache of model predictions."""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from app.utils import check_predictions_count
+
+
+class Predictor(Protocol):
+    """Anything that predicts a list of texts, e.g. a client or a batcher."""
+
+    model_name: str
+
+    async def make_prediction(self, texts: list[str]) -> list[str]: ...
+
+
+def hash_text(text: str) -> bytes:
+    """Get the short digest of the text used in cache keys.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        bytes: The digest.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class PredictionCache:
+    """LRU cache of raw predictions with TTL.
+
+    Keys are (model name, model version, text hash). Besides the stored
+    predictions it tracks the texts that are being predicted now, so
+    the same text requested concurrently is sent to the model once.
+    """
+
+    def __init__(self, max_size: int = 100_000, ttl: float = 86400):
+        """Init.
+
+        Args:
+            max_size (int, optional): The max number of stored predictions.
+            Defaults to 100_000.
+            ttl (float, optional): The time in seconds a prediction is valid.
+            Defaults to 86400.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[str, float]] = OrderedDict()
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: tuple) -> str | None:
+        """Get the stored prediction.
+
+        Args:
+            key (tuple): The cache key.
+
+        Returns:
+            str | None: The prediction, None if it's absent or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        pred, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return pred
+
+    def put(self, key: tuple, pred: str):
+        """Store the prediction, the least recently used one is evicted if full.
+
+        Args:
+            key (tuple): The cache key.
+            pred (str): The prediction.
+        """
+        self._entries[key] = (pred, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, model_name: str):
+        """Remove all the predictions of the model.
+
+        Args:
+            model_name (str): The model name.
+        """
+        for key in [key for key in self._entries if key[0] == model_name]:
+            del self._entries[key]
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache counters.
+
+        Returns:
+            dict[str, int]: Hits, misses, coalesced texts and the cache size.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "size": len(self._entries),
+        }
+
+    async def get_or_predict(
+        self, predictor: Predictor, model_id: tuple[str, str], texts: list[str]
+    ) -> list[str]:
+        """Get the predictions from the cache, predict only the missing texts.
+
+        Duplicates inside the list and texts already being predicted by
+        another caller are not sent to the model again. If that caller is
+        cancelled, e.g. by its deadline, the texts are predicted again by
+        the waiting callers instead of cancelling them too.
+
+        Args:
+            predictor (Predictor): The predictor for missing texts.
+            model_id (tuple[str, str]): The model name and version.
+            texts (list[str]): The texts.
+
+        Returns:
+            list[str]: The predictions in the order of texts.
+        """
+        results = [None] * len(texts)
+        to_predict: dict[tuple, list[int]] = {}
+        waiting: dict[tuple, tuple[asyncio.Future, list[int]]] = {}
+        for i, text in enumerate(texts):
+            key = (*model_id, hash_text(text))
+            pred = self.get(key)
+            if pred is not None:
+                self.hits += 1
+                results[i] = pred
+            elif key in to_predict:
+                self.coalesced += 1
+                to_predict[key].append(i)
+            elif key in waiting:
+                self.coalesced += 1
+                waiting[key][1].append(i)
+            elif key in self._in_flight:
+                self.coalesced += 1
+                waiting[key] = (self._in_flight[key], [i])
+            else:
+                self.misses += 1
+                to_predict[key] = [i]
+
+        if to_predict:
+            await self._predict_missing(predictor, texts, to_predict, results)
+
+        if waiting:
+            # unlike awaiting the futures, a cancelled caller doesn't cancel them here
+            await asyncio.wait([future for future, _ in waiting.values()])
+            orphaned = []
+            for future, indices in waiting.values():
+                if future.cancelled():
+                    orphaned.append(indices)
+                    continue
+                pred = future.result()
+                for i in indices:
+                    results[i] = pred
+            if orphaned:
+                preds = await self.get_or_predict(
+                    predictor, model_id, [texts[indices[0]] for indices in orphaned]
+                )
+                for indices, pred in zip(orphaned, preds):
+                    for i in indices:
+                        results[i] = pred
+        return results
+
+    async def _predict_missing(
+        self,
+        predictor: Predictor,
+        texts: list[str],
+        to_predict: dict[tuple, list[int]],
+        results: list[str | None],
+    ):
+        """Predict the unique missing texts and share them with other callers.
+
+        Args:
+            predictor (Predictor): The predictor.
+            texts (list[str]): All the texts of the caller.
+            to_predict (dict[tuple, list[int]]): The text indices per missing key.
+            results (list[str | None]): The caller results to be filled.
+        """
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for key in to_predict:
+            futures[key] = self._in_flight[key] = loop.create_future()
+        try:
+            preds = await predictor.make_prediction(
+                [texts[indices[0]] for indices in to_predict.values()]
+            )
+            check_predictions_count(preds, len(to_predict))
+        except BaseException as e:
+            for future in futures.values():
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    # other callers may be absent, mark the error as retrieved
+                    future.exception()
+            raise
+        finally:
+            for key in futures:
+                self._in_flight.pop(key, None)
+        for (key, indices), pred in zip(to_predict.items(), preds):
+            self.put(key, pred)
+            futures[key].set_result(pred)
+            for i in indices:
+                results[i] = pred
+
+
+class CachedPredictor:
+    """The predictor behind the prediction cache.
+
+    Only the texts missing in the cache are predicted, the same texts
+    requested at the same time are predicted once.
+    """
+
+    def __init__(self, cache: PredictionCache, predictor: Predictor, model_id: tuple[str, str]):
+        """Init.
+
+        Args:
+            cache (PredictionCache): The cache.
+            predictor (Predictor): The predictor for missing texts.
+            model_id (tuple[str, str]): The model name and version.
+        """
+        self.cache = cache
+        self.predictor = predictor
+        self.model_name = predictor.model_name
+        self.model_id = model_id
+
+    async def make_prediction(self, texts: list[str]) -> list[str]:
+        """Get the predictions from the cache or from the predictor.
+
+        Args:
+            texts (list[str]): The texts.
+
+        Returns:
+            list[str]: The predictions.
+        """
+        return await self.cache.get_or_predict(self.predictor, self.model_id, texts)
@@ -0,0 +1,192 @@
+"""The module with the connection of Triton services in background.
+
+The services that are unreachable on startup are not dropped: they stay
+pending and are retried with exponential backoff until they connect, so
+a Triton container started after the Zoo joins it without a restart.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable
+
+from app.async_triton_api_client import AsyncTritonApiClient
+from app.models import TritonServerAddr
+
+logger = logging.getLogger(__name__)
+
+
+def service_key(server: TritonServerAddr) -> tuple[str, str]:
+    """Get the key of the service: the model name and the base url of the replica.
+
+    Args:
+        server (TritonServerAddr): The address of the service.
+
+    Returns:
+        tuple[str, str]: The key.
+    """
+    return server.model_name, f"{server.url}:{server.port}/v2"
+
+
+class PendingService:
+    """The service waiting for the connection and its retry state."""
+
+    def __init__(self, server: TritonServerAddr, error: str = ""):
+        """Init.
+
+        Args:
+            server (TritonServerAddr): The address of the service.
+            error (str, optional): The last connection error. Defaults to "".
+        """
+        self.server = server
+        self.attempts = 0
+        self.last_error = error
+        self.next_attempt = time.monotonic()
+
+    def info(self) -> dict:
+        """Describe the service for the readiness endpoint.
+
+        Returns:
+            dict: The url, the model name, the number of attempts and the last error.
+        """
+        return {
+            "url": service_key(self.server)[1],
+            "model_name": self.server.model_name,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+        }
+
+
+class Reconnector:
+    """Background connection of the pending services with exponential backoff."""
+
+    def __init__(
+        self,
+        connect: Callable[[TritonServerAddr], Awaitable[AsyncTritonApiClient]],
+        on_connected: Callable[[TritonServerAddr, AsyncTritonApiClient], bool],
+        interval: float = 5.0,
+        max_interval: float = 60.0,
+        timeout: float = 5.0,
+    ):
+        """Init.
+
+        Args:
+            connect (Callable[[TritonServerAddr], Awaitable[AsyncTritonApiClient]]):
+            The coroutine function creating the connected client.
+            on_connected (Callable[[TritonServerAddr, AsyncTritonApiClient], bool]):
+            The function registering the connected client, False if the service
+            is already connected, then the client is closed.
+            interval (float, optional): The delay in seconds before the first
+            retry, it doubles with every failed one. Defaults to 5.0.
+            max_interval (float, optional): The max delay in seconds between
+            retries. Defaults to 60.0.
+            timeout (float, optional): The timeout of one connection attempt
+            in seconds. Defaults to 5.0.
+        """
+        self.connect = connect
+        self.on_connected = on_connected
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.pending: dict[tuple[str, str], PendingService] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def add(self, server: TritonServerAddr, error: str = ""):
+        """Put the service into the pending ones, the first retry is after `interval`.
+
+        Args:
+            server (TritonServerAddr): The address of the service.
+            error (str, optional): The connection error. Defaults to "".
+        """
+        service = PendingService(server, error)
+        service.attempts = 1
+        service.next_attempt = time.monotonic() + self.interval
+        self.pending[service_key(server)] = service
+        self._wakeup.set()
+
+    def remove(self, model_name: str, base: str | None = None) -> bool:
+        """Stop connecting the services of the model.
+
+        Args:
+            model_name (str): The model name.
+            base (str | None, optional): The base url of the replica, all the
+            replicas of the model if None. Defaults to None.
+
+        Returns:
+            bool: True if any service was pending.
+        """
+        keys = [
+            key for key in self.pending
+            if key[0] == model_name and (base is None or key[1] == base)
+        ]
+        for key in keys:
+            del self.pending[key]
+        return bool(keys)
+
+    def model_names(self) -> set[str]:
+        """Get the names of the models with pending services.
+
+        Returns:
+            set[str]: The model names.
+        """
+        return {model_name for model_name, _ in self.pending}
+
+    async def attempt(self, service: PendingService) -> bool:
+        """Try to connect the service once.
+
+        Args:
+            service (PendingService): The pending service.
+
+        Returns:
+            bool: True if it's connected.
+        """
+        key = service_key(service.server)
+        try:
+            client = await asyncio.wait_for(self.connect(service.server), self.timeout)
+        except Exception as e:
+            service.attempts += 1
+            service.last_error = repr(e)
+            delay = min(self.interval * 2 ** (service.attempts - 1), self.max_interval)
+            service.next_attempt = time.monotonic() + delay * random.uniform(0.9, 1.1)
+            logger.info(
+                f"The {service.server.model_name} model on {key[1]} is still unavailable, "
+                f"next attempt in {delay:.0f} s"
+            )
+            return False
+        if self.pending.get(key) is not service:
+            # the service was removed while connecting
+            await client.close_connection()
+            return False
+        del self.pending[key]
+        if not self.on_connected(service.server, client):
+            # the service is already connected, e.g. by a request
+            await client.close_connection()
+        return True
+
+    async def start(self):
+        """Start the connection attempts in background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the connection attempts."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            due = [service for service in self.pending.values() if service.next_attempt <= now]
+            if due:
+                await asyncio.gather(*(self.attempt(service) for service in due))
+                continue
+            timeout = min(
+                (service.next_attempt - now for service in self.pending.values()), default=None
+            )
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
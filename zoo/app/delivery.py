@@ -0,0 +1,157 @@
+"""The module with the delivery of predictions to the platform.
+
+The chunks that were not delivered after all retries are appended to the
+dead-letter file. They are sent again by the command
+
+    python -m app.delivery replay [--config config/config.yml]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import httpx
+import orjson
+import yaml
+
+from app.metrics import DELIVERY_FAILURES, DELIVERY_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# the status codes worth to retry, others are the errors of the payload
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class PlatformDelivery:
+    """Pooled HTTP client sending predictions with retries and exponential backoff."""
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        dead_letter_path: str | None = "dead_letter.jsonl",
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        """Init.
+
+        Args:
+            max_retries (int, optional): The number of retries after the first
+            attempt. Defaults to 5.
+            backoff (float, optional): The delay in seconds before the first
+            retry, it doubles with every next one. Defaults to 0.5.
+            max_backoff (float, optional): The max delay in seconds. Defaults to 30.0.
+            dead_letter_path (str | None, optional): The file for undelivered
+            chunks, None to drop them. Defaults to "dead_letter.jsonl".
+            transport (httpx.AsyncBaseTransport | None, optional): The custom
+            transport, used in tests. Defaults to None.
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.dead_letter_path = dead_letter_path
+        self.sess = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=5.0), transport=transport
+        )
+
+    async def send(self, url: str, payload: dict) -> bool:
+        """Send the payload, retrying on network errors and server failures.
+
+        Args:
+            url (str): The platform endpoint.
+            payload (dict): The JSON payload.
+
+        Returns:
+            bool: True if delivered, False if the payload went to the dead-letter file.
+        """
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+                await asyncio.sleep(delay * random.uniform(0.9, 1.1))
+            start = time.perf_counter()
+            try:
+                response = await self.sess.post(
+                    url, content=orjson.dumps(payload), headers={"Content-Type": "application/json"}
+                )
+            except httpx.TransportError as e:
+                DELIVERY_FAILURES.inc("network")
+                error = repr(e)
+                continue
+            DELIVERY_LATENCY.observe(value=time.perf_counter() - start)
+            if response.is_success:
+                return True
+            DELIVERY_FAILURES.inc("http")
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+        logger.error(f"Failed to deliver predictions to {url}: {error}")
+        DELIVERY_FAILURES.inc("undelivered")
+        if self.dead_letter_path is not None:
+            await asyncio.to_thread(self._write_dead_letter, url, payload, error)
+        return False
+
+    def _write_dead_letter(self, url: str, payload: dict, error: str):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as file:
+            record = {"url": url, "payload": payload, "error": error, "time": time.time()}
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def replay_dead_letters(self) -> tuple[int, int]:
+        """Send the undelivered payloads again, the failed ones are appended to the file again.
+
+        The file is renamed before the replay, so the payloads written by a
+        running Zoo meanwhile go to a new file. The renamed file is removed
+        when all its payloads are sent. A replay interrupted by a crash is
+        continued by the next one, the payloads sent before the crash are
+        sent again then.
+
+        Returns:
+            tuple[int, int]: The number of delivered and failed payloads.
+        """
+        replay_path = self.dead_letter_path + ".replay"
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self.dead_letter_path):
+                return 0, 0
+            os.replace(self.dead_letter_path, replay_path)
+        with open(replay_path, "r", encoding="utf-8") as file:
+            records = [json.loads(line) for line in file if line.strip()]
+        delivered = 0
+        for record in records:
+            delivered += await self.send(record["url"], record["payload"])
+        os.remove(replay_path)
+        return delivered, len(records) - delivered
+
+    async def close(self):
+        """Close the connection pool."""
+        await self.sess.aclose()
+
+
+async def _replay(config: dict):
+    delivery = PlatformDelivery(
+        config.get("delivery_max_retries", 5),
+        config.get("delivery_backoff_s", 0.5),
+        dead_letter_path=config["dead_letter_path"],
+    )
+    delivered, failed = await delivery.replay_dead_letters()
+    await delivery.close()
+    print(f"Delivered {delivered} chunks, {failed} chunks are left in {config['dead_letter_path']}")
+
+
+def main():
+    """Command line interface of the delivery."""
+    parser = argparse.ArgumentParser(description="Maintain the Zoo delivery to the platform.")
+    parser.add_argument("command", choices=["replay"])
+    parser.add_argument("--config", default="config/config.yml", help="The Zoo config file.")
+    args = parser.parse_args()
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+    if not config.get("dead_letter_path"):
+        parser.error("dead_letter_path is not set in the config")
+    asyncio.run(_replay(config))
+
+
+if __name__ == "__main__":
+    main()
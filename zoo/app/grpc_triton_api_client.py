@@ -0,0 +1,159 @@
+"""The module with GrpcTritonApiClient.
+
+The client speaks the KServe v2 gRPC protocol. All the models of one
+Triton server share one persistent channel, and the calls are multiplexed
+over its HTTP/2 connection, which is cheaper than HTTP/1.1 requests for
+many small batches. The texts are sent as raw BYTES tensors.
+
+It needs the optional `tritonclient[grpc]` package for the protocol stubs.
+"""
+import logging
+import re
+
+import httpx
+
+from app.async_triton_api_client import AsyncTritonApiClient, _version_key
+from app.binary_tensor import deserialize_bytes_tensor, serialize_bytes_tensor
+
+try:
+    import grpc
+    from tritonclient.grpc import service_pb2, service_pb2_grpc
+except ImportError:  # pragma: no cover - depends on the environment
+    grpc = None
+
+logger = logging.getLogger(__name__)
+
+HTTP = "http"
+GRPC = "grpc"
+PROTOCOLS = (HTTP, GRPC)
+
+# the timeout of the calls made on connect, the inference has none like the HTTP client
+CONNECT_TIMEOUT = 5.0
+
+_channels: dict[str, "grpc.aio.Channel"] = {}
+_channel_users: dict[str, int] = {}
+
+
+def grpc_target(base: str, port: int) -> str:
+    """Get the gRPC target of the service, the scheme of the url is dropped.
+
+    Args:
+        base (str): Url base, e.g. "http://triton".
+        port (int): Port of the gRPC service.
+
+    Returns:
+        str: The target, e.g. "triton:8001".
+    """
+    return f"{re.sub(r'^[a-z]+://', '', base)}:{port}"
+
+
+def acquire_channel(target: str) -> "grpc.aio.Channel":
+    """Get the persistent channel to the Triton server.
+
+    Args:
+        target (str): The host and the port of the gRPC service.
+
+    Returns:
+        grpc.aio.Channel: The shared channel.
+    """
+    if grpc is None:
+        raise ImportError("The gRPC protocol needs the tritonclient[grpc] package")
+    if target not in _channels:
+        _channels[target] = grpc.aio.insecure_channel(
+            target,
+            options=[
+                ("grpc.max_send_message_length", -1),
+                ("grpc.max_receive_message_length", -1),
+                ("grpc.keepalive_time_ms", 30_000),
+            ],
+        )
+        _channel_users[target] = 0
+    _channel_users[target] += 1
+    return _channels[target]
+
+
+async def release_channel(target: str):
+    """Release the channel, it's closed when the last user is gone.
+
+    Args:
+        target (str): The host and the port of the gRPC service.
+    """
+    if target not in _channels:
+        return
+    _channel_users[target] -= 1
+    if _channel_users[target] == 0:
+        del _channel_users[target]
+        await _channels.pop(target).close()
+
+
+class GrpcTritonApiClient(AsyncTritonApiClient):
+    """Asyncio gRPC client for Triton inference server.
+
+    It has the same interface as AsyncTritonApiClient and should be created
+    by `GrpcTritonApiClient.create` too. The `pool_size`, `binary_data` and
+    `transport` arguments have no effect: one channel serves all the calls
+    and the tensors are always binary.
+    """
+
+    def _open_session(self, pool_size: int, transport: httpx.AsyncBaseTransport | None):
+        self.target = grpc_target(self.url, self.port)
+        self.stub = service_pb2_grpc.GRPCInferenceServiceStub(acquire_channel(self.target))
+        return self.stub
+
+    async def _close_session(self):
+        await release_channel(self.target)
+
+    async def connect(self):
+        """Check the service and read the model config and metadata.
+
+        The metadata is optional, if it's unavailable `model_version` stays empty.
+        """
+        await self.stub.ServerMetadata(service_pb2.ServerMetadataRequest(), timeout=CONNECT_TIMEOUT)
+        logger.info(f"Connection establisshed to the Triton model {self.model_name} over gRPC")
+        response = await self.stub.ModelConfig(
+            service_pb2.ModelConfigRequest(name=self.model_name), timeout=CONNECT_TIMEOUT
+        )
+        self.max_batch_size = response.config.max_batch_size
+        self._create_batch_sizing()
+        try:
+            metadata = await self.stub.ModelMetadata(
+                service_pb2.ModelMetadataRequest(name=self.model_name), timeout=CONNECT_TIMEOUT
+            )
+        except grpc.aio.AioRpcError:
+            return
+        self.model_version = max(metadata.versions or [""], key=_version_key)
+
+    async def is_ready(self) -> bool:
+        """Check if service ready to receive requests.
+
+        Returns:
+            bool: True if yes, False otherwise.
+        """
+        try:
+            response = await self.stub.ServerReady(service_pb2.ServerReadyRequest())
+        except grpc.aio.AioRpcError:
+            return False
+        return response.ready
+
+    async def _infer(self, batch: list[str]) -> list[str]:
+        """Send one inference request.
+
+        Args:
+            batch (list[str]): A list of texts.
+
+        Returns:
+            list[str]: A list of predictions.
+        """
+        request = service_pb2.ModelInferRequest(
+            model_name=self.model_name,
+            inputs=[
+                service_pb2.ModelInferRequest.InferInputTensor(
+                    name="text_input", datatype="BYTES", shape=[len(batch), 1]
+                )
+            ],
+            raw_input_contents=[serialize_bytes_tensor(batch)],
+        )
+        response = await self.stub.ModelInfer(request, timeout=self.request_timeout)
+        if response.raw_output_contents:
+            return deserialize_bytes_tensor(response.raw_output_contents[0])
+        return [pred.decode("utf-8") for pred in response.outputs[0].contents.bytes_contents]
@@ -0,0 +1,206 @@
+"""The module with the health monitoring of the Triton models.
+
+Every model has a circuit breaker. It's healthy until a request or a health
+check fails, degraded after the first failures and open after
+`failure_threshold` failures in a row. The models with an open circuit are
+skipped by requests. After `reset_timeout` the circuit is half-open: one
+request is let through, and its result closes or opens the circuit again.
+The health checks probe the open circuits too, so a model that is back is
+closed by the next check even if no request comes.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable
+
+from app.async_triton_api_client import AsyncTritonApiClient
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+OPEN = "open"
+
+
+class CircuitBreaker:
+    """The circuit breaker of one model."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0):
+        """Init.
+
+        Args:
+            failure_threshold (int, optional): The number of failures in a row
+            that opens the circuit. Defaults to 3.
+            reset_timeout (float, optional): The time in seconds before a trial
+            request to the open circuit. Defaults to 10.0.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = HEALTHY
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+
+    def allow_request(self) -> bool:
+        """Check if the model can be requested.
+
+        Returns:
+            bool: True unless the circuit is open. The first call after
+            `reset_timeout` is the half-open trial and returns True.
+        """
+        if self.state != OPEN:
+            return True
+        if not self._trial and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._trial = True
+            return True
+        return False
+
+    def abandon_trial(self):
+        """Let another trial through after `reset_timeout`, the current one gave no result.
+
+        The trial request can be cancelled or cut off by the deadline of the
+        caller, then neither success nor failure is recorded for it.
+        """
+        if self._trial:
+            self._trial = False
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        """Close the circuit."""
+        self.state = HEALTHY
+        self.failures = 0
+        self._trial = False
+
+    def record_failure(self):
+        """Count the failure, the circuit is opened after `failure_threshold` ones."""
+        self.failures += 1
+        self._trial = False
+        if self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        else:
+            self.state = DEGRADED
+
+
+class HealthMonitor:
+    """Background checker of the models keeping a circuit breaker per model."""
+
+    def __init__(
+        self,
+        interval: float = 5.0,
+        failure_threshold: int = 3,
+        reset_timeout: float = 10.0,
+        timeout: float = 2.0,
+    ):
+        """Init.
+
+        Args:
+            interval (float, optional): The time in seconds between health
+            checks. Defaults to 5.0.
+            failure_threshold (int, optional): The number of failures in a row
+            that opens the circuit. Defaults to 3.
+            reset_timeout (float, optional): The time in seconds before a trial
+            request to the open circuit. Defaults to 10.0.
+            timeout (float, optional): The timeout of a health check in
+            seconds. Defaults to 2.0.
+        """
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timeout = timeout
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self._task: asyncio.Task | None = None
+
+    def breaker(self, model_name: str) -> CircuitBreaker:
+        """Get the circuit breaker of the model, a new model is healthy.
+
+        Args:
+            model_name (str): The model name.
+
+        Returns:
+            CircuitBreaker: The circuit breaker.
+        """
+        if model_name not in self.breakers:
+            self.breakers[model_name] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self.breakers[model_name]
+
+    def remove(self, model_name: str):
+        """Forget the state of the disconnected model.
+
+        Args:
+            model_name (str): The model name.
+        """
+        self.breakers.pop(model_name, None)
+
+    def record(self, model_name: str, success: bool):
+        """Update the model state with the result of a request or a check.
+
+        Args:
+            model_name (str): The model name.
+            success (bool): Whether the model answered.
+        """
+        breaker = self.breaker(model_name)
+        old_state = breaker.state
+        if success:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        if breaker.state != old_state:
+            logger.warning(f"The model {model_name} is {breaker.state}")
+
+    def abandon(self, model_name: str):
+        """Release the half-open trial of the model that was cut off without a result.
+
+        Args:
+            model_name (str): The model name.
+        """
+        if model_name in self.breakers:
+            self.breakers[model_name].abandon_trial()
+
+    def states(self) -> dict[str, str]:
+        """Get the states of the models.
+
+        Returns:
+            dict[str, str]: The state per model name.
+        """
+        return {name: breaker.state for name, breaker in self.breakers.items()}
+
+    async def check(self, clients: list[AsyncTritonApiClient]):
+        """Check all the models at once.
+
+        Args:
+            clients (list[AsyncTritonApiClient]): The clients of the models.
+        """
+        await asyncio.gather(*(self._check_one(client) for client in clients))
+
+    async def _check_one(self, client: AsyncTritonApiClient):
+        # an open circuit is probed as well, it doesn't take the trial of the requests
+        try:
+            ready = await asyncio.wait_for(client.is_ready(), self.timeout)
+        except Exception:
+            ready = False
+        self.record(client.model_name, ready)
+
+    async def start(self, get_clients: Callable[[], list[AsyncTritonApiClient]]):
+        """Start the checks in background.
+
+        Args:
+            get_clients (Callable[[], list[AsyncTritonApiClient]]): The function
+            returning the currently connected clients.
+        """
+        self._task = asyncio.create_task(self._run(get_clients))
+
+    async def stop(self):
+        """Stop the checks."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, get_clients: Callable[[], list[AsyncTritonApiClient]]):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check(list(get_clients()))
+            except Exception:
+                logger.exception("Health check failed")
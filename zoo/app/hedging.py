@@ -0,0 +1,193 @@
+"""The module with the hedged requests to Triton models.
+
+A CPU Triton service sometimes stalls on a single batch, and the whole
+request waits for it. A hedged batch is sent again if it didn't return
+by a high quantile of the observed latency, the first answer is taken and
+the other request is cancelled. The budget bounds the extra load, so a
+slow model is not flooded with duplicates.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from app.metrics import HEDGE_WINS, HEDGED_BATCHES
+
+
+class LatencyWindow:
+    """The latencies of the recent batches."""
+
+    def __init__(self, size: int = 200):
+        """Init.
+
+        Args:
+            size (int, optional): The number of kept latencies. Defaults to 200.
+        """
+        self.values: deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, latency: float):
+        """Add the latency of a finished batch.
+
+        Args:
+            latency (float): The latency in seconds.
+        """
+        self.values.append(latency)
+
+    def quantile(self, q: float) -> float:
+        """Get the quantile of the kept latencies.
+
+        Args:
+            q (float): The quantile, e.g. 0.95.
+
+        Returns:
+            float: The latency in seconds.
+        """
+        values = sorted(self.values)
+        return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class HedgeBudget:
+    """The tokens of the hedged batches.
+
+    Every batch adds `ratio` of a token and a hedged batch takes a whole
+    one, so at most `ratio` of the batches are sent twice in the long run.
+    The tokens are capped by `burst`.
+    """
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        """Init.
+
+        Args:
+            ratio (float): The max share of the hedged batches.
+            burst (float, optional): The max number of saved tokens. Defaults to 10.0.
+        """
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+
+    def deposit(self):
+        """Add the tokens of a batch."""
+        self.tokens = min(self.tokens + self.ratio, self.burst)
+
+    def withdraw(self) -> bool:
+        """Take the token of a hedged batch.
+
+        Returns:
+            bool: True if there was a token.
+        """
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Hedger:
+    """The hedging of the batches of one model."""
+
+    def __init__(
+        self,
+        model_name: str,
+        quantile: float = 0.95,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        """Init.
+
+        Args:
+            model_name (str): The model name.
+            quantile (float, optional): The quantile of the latency after which
+            a batch is hedged. Defaults to 0.95.
+            budget (float, optional): The max share of the hedged batches. Defaults to 0.05.
+            min_samples (int, optional): The number of batches observed before
+            the first hedge. Defaults to 20.
+            window (int, optional): The number of recent batches the quantile is
+            computed over. Defaults to 200.
+        """
+        self.model_name = model_name
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.latency = LatencyWindow(window)
+        self.budget = HedgeBudget(budget)
+        self.batches = 0
+        self.hedged = 0
+        self.won = 0
+
+    def delay(self) -> float | None:
+        """The time after which a batch is hedged.
+
+        Returns:
+            float | None: The delay in seconds, None until enough batches are observed.
+        """
+        if len(self.latency) < self.min_samples:
+            return None
+        return self.latency.quantile(self.quantile)
+
+    async def _timed(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Make the call and observe its latency if it succeeds."""
+        start = time.perf_counter()
+        result = await call()
+        self.latency.add(time.perf_counter() - start)
+        return result
+
+    async def run(
+        self, primary: Callable[[], Awaitable[Any]], backup: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Make the call, hedged by the backup one if it's slow.
+
+        If one of the calls fails, the other one is still waited for.
+
+        Args:
+            primary (Callable[[], Awaitable[Any]]): The function making the call.
+            backup (Callable[[], Awaitable[Any]]): The function making the hedged call.
+
+        Returns:
+            Any: The result of the call answered first.
+        """
+        self.batches += 1
+        self.budget.deposit()
+        delay = self.delay()
+        first = asyncio.ensure_future(self._timed(primary))
+        attempts = [first]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(attempts, timeout=delay)
+                if not done and self.budget.withdraw():
+                    self.hedged += 1
+                    HEDGED_BATCHES.inc(self.model_name)
+                    attempts.append(asyncio.ensure_future(self._timed(backup)))
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                failed = [task for task in done if task.exception() is not None]
+                winner = next((task for task in done if task not in failed), None)
+                if winner is not None:
+                    if winner is not first:
+                        self.won += 1
+                        HEDGE_WINS.inc(self.model_name)
+                    return winner.result()
+                error = error or failed[0].exception()
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def stats(self) -> dict:
+        """Show the hedging of the model.
+
+        Returns:
+            dict: The number of batches, hedged ones and the ones the hedge
+            answered first, the hedge rate and the current delay in milliseconds.
+        """
+        delay = self.delay()
+        return {
+            "batches": self.batches,
+            "hedged": self.hedged,
+            "won": self.won,
+            "hedge_rate": self.hedged / self.batches if self.batches else 0.0,
+            "delay_ms": None if delay is None else 1000 * delay,
+        }
@@ -0,0 +1,408 @@
+"""The module with the persistent queue of batch prediction jobs."""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable
+
+import httpx
+from fastapi import HTTPException
+
+from app.delivery import RETRY_STATUS_CODES
+from app.models import JobInfo, ServiceInput, TextToPredict
+from app.scheduler import DeadlineExceeded, ModelsUnavailable
+from app.sqlite_file import SQLiteFile
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+UNFINISHED = (QUEUED, RUNNING)
+
+# the columns added after the first release, the old files get them on opening
+_ADDED_COLUMNS = {
+    "owner": "TEXT",
+    "lease_until": "REAL",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "retry_at": "REAL NOT NULL DEFAULT 0",
+}
+
+
+def is_transient(error: Exception) -> bool:
+    """Check if the chunk may succeed later, e.g. after the restart of a Triton service.
+
+    Args:
+        error (Exception): The error of the chunk.
+
+    Returns:
+        bool: True for unavailable models, timeouts, network errors and
+        the status codes worth to retry.
+    """
+    if isinstance(error, (ModelsUnavailable, DeadlineExceeded, TimeoutError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, (httpx.TransportError, ConnectionError)):
+        return True
+    if isinstance(error, HTTPException):
+        return error.status_code in RETRY_STATUS_CODES
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRY_STATUS_CODES
+    return False
+
+
+class JobQueue(SQLiteFile):
+    """Queue of batch jobs stored in SQLite and processed by a fixed pool of workers.
+
+    A job is processed in chunks of `chunk_size` texts, the progress is
+    saved after every chunk. The unfinished jobs are resumed from the last
+    saved chunk when the queue is started again.
+
+    Several Zoo workers can share one file. A worker claims a job in one
+    UPDATE, taking it only if it's queued or the lease of its owner has
+    expired, and renews the lease after every chunk, so a job is processed
+    by one worker at a time and the job of a crashed worker is taken over.
+    The workers poll the file for the jobs submitted to the others.
+
+    A chunk failed by a transient error, e.g. all the models are down
+    during a Triton restart, is retried with exponential backoff, the job
+    stays queued meanwhile. Only the other errors fail the job.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        handler: Callable[[ServiceInput], Awaitable[None]],
+        n_workers: int = 2,
+        chunk_size: int = 256,
+        lease: float = 300.0,
+        poll_interval: float = 1.0,
+        retry_backoff: float = 1.0,
+        max_retry_backoff: float = 60.0,
+    ):
+        """Init.
+
+        Args:
+            path (str): The path to the SQLite file, ":memory:" for a volatile queue.
+            handler (Callable[[ServiceInput], Awaitable[None]]): The coroutine
+            processing one chunk of a job.
+            n_workers (int, optional): The number of jobs processed at the same
+            time. Defaults to 2.
+            chunk_size (int, optional): The number of texts in one chunk.
+            Defaults to 256.
+            lease (float, optional): The time in seconds a claimed job is kept
+            by the worker without progress, one chunk must be processed in it.
+            Defaults to 300.0.
+            poll_interval (float, optional): The time in seconds between the
+            checks for the jobs submitted to other workers. Defaults to 1.0.
+            retry_backoff (float, optional): The delay in seconds before the first
+            retry of a job after a transient error, it doubles with every next
+            one. Defaults to 1.0.
+            max_retry_backoff (float, optional): The max delay in seconds. Defaults to 60.0.
+        """
+        self.handler = handler
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.owner = uuid.uuid4().hex
+        super().__init__(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                owner TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                retry_at REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, column_type in _ADDED_COLUMNS.items():
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS job_texts (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                text_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            )
+            """
+        )
+        # the unfinished jobs are counted on every batch admission
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._queue: asyncio.Queue[str] | None = None
+        self._queued: set[str] = set()
+        self._workers: list[asyncio.Task] = []
+        self._poller: asyncio.Task | None = None
+
+    def _set_status(self, job_id: str, status: str, error: str | None = None) -> bool:
+        """Change the status of an unfinished job, finished ones are not changed.
+
+        Returns:
+            bool: True if the status was changed.
+        """
+        with self._lock, self._transaction():
+            changed = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE id = ? AND status IN (?, ?)",
+                (status, error, time.time(), job_id, *UNFINISHED),
+            ).rowcount
+            if changed and status not in UNFINISHED:
+                self._conn.execute("DELETE FROM job_texts WHERE job_id = ?", (job_id,))
+        return bool(changed)
+
+    def _claim(self, job_id: str) -> bool:
+        """Take the job if it's queued or its lease has expired.
+
+        Returns:
+            bool: True if the job is claimed by this queue.
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            changed = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND ((status = ? AND retry_at <= ?) OR (status = ? AND lease_until < ?))",
+                (RUNNING, self.owner, now + self.lease, now, job_id, QUEUED, now, RUNNING, now),
+            ).rowcount
+        return bool(changed)
+
+    def _claimable(self) -> list[str]:
+        """Find the jobs that can be claimed, the oldest first."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE (status = ? AND retry_at <= ?) "
+                "OR (status = ? AND lease_until < ?) ORDER BY created_at",
+                (QUEUED, now, RUNNING, now),
+            ).fetchall()
+        return [job_id for (job_id,) in rows]
+
+    def _release(self):
+        """Put the running jobs of this queue back, so they are resumed without waiting for the lease."""
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL "
+                "WHERE owner = ? AND status = ?",
+                (QUEUED, self.owner, RUNNING),
+            )
+
+    def _retry_later(self, job_id: str, error: str) -> float:
+        """Put the job of this queue back to be retried after the backoff.
+
+        Returns:
+            float: The delay before the retry in seconds.
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            row = self._conn.execute(
+                "SELECT attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            attempts = row[0] if row else 0
+            delay = min(self.retry_backoff * 2 ** attempts, self.max_retry_backoff)
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, attempts = ?, "
+                "retry_at = ?, error = ?, updated_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (QUEUED, attempts + 1, now + delay, error, now, job_id, self.owner, RUNNING),
+            )
+        return delay
+
+    def _insert(
+        self,
+        job_id: str,
+        texts: list[TextToPredict],
+        check: Callable[[int, int], None] | None = None,
+    ):
+        now = time.time()
+        with self._lock, self._transaction():
+            if check is not None:
+                (pending,) = self._conn.execute(
+                    "SELECT COALESCE(SUM(total - done), 0) FROM jobs WHERE status IN (?, ?)",
+                    UNFINISHED,
+                ).fetchone()
+                check(pending, len(texts))
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, len(texts), now, now),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_texts VALUES (?, ?, ?, ?)",
+                ((job_id, i, t.text_id, t.text) for i, t in enumerate(texts)),
+            )
+
+    def _load_chunk(self, job_id: str) -> tuple[int, list[TextToPredict]]:
+        with self._lock:
+            (done,) = self._conn.execute("SELECT done FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            rows = self._conn.execute(
+                "SELECT text_id, text FROM job_texts WHERE job_id = ? AND idx >= ? "
+                "ORDER BY idx LIMIT ?",
+                (job_id, done, self.chunk_size),
+            ).fetchall()
+        return done, [TextToPredict(text_id=text_id, text=text) for text_id, text in rows]
+
+    def _save_progress(self, job_id: str, done: int) -> bool:
+        """Save the progress and renew the lease of the job.
+
+        Returns:
+            bool: False if the job is not running under this queue anymore.
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            changed = self._conn.execute(
+                "UPDATE jobs SET done = ?, lease_until = ?, attempts = 0, error = NULL, "
+                "updated_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (done, now + self.lease, now, job_id, self.owner, RUNNING),
+            ).rowcount
+            if changed:
+                self._conn.execute(
+                    "DELETE FROM job_texts WHERE job_id = ? AND idx < ?", (job_id, done)
+                )
+        return bool(changed)
+
+    def get(self, job_id: str) -> JobInfo | None:
+        """Get the job status and progress.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            JobInfo | None: The job info, None if there is no such job.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, done, total, error FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return JobInfo(job_id=row[0], status=row[1], done=row[2], total=row[3], error=row[4])
+
+    def pending_texts(self) -> int:
+        """Count the texts of unfinished jobs that are not processed yet.
+
+        Returns:
+            int: The number of texts.
+        """
+        with self._lock:
+            (n,) = self._conn.execute(
+                "SELECT COALESCE(SUM(total - done), 0) FROM jobs WHERE status IN (?, ?)",
+                UNFINISHED,
+            ).fetchone()
+        return n
+
+    async def submit(
+        self, data: ServiceInput, check: Callable[[int, int], None] | None = None
+    ) -> str:
+        """Store the job and put it into the queue.
+
+        Args:
+            data (ServiceInput): The texts of the job.
+            check (Callable[[int, int], None] | None, optional): The function
+            called with the number of pending texts and the texts of the job in
+            the transaction of the insert, so concurrent jobs can't overshoot
+            the limit it checks. It raises to reject the job. Defaults to None.
+
+        Returns:
+            str: The job id.
+        """
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._insert, job_id, data.texts, check)
+        self._enqueue(job_id)
+        return job_id
+
+    def _enqueue(self, job_id: str):
+        """Put the job into the local queue unless it's already there."""
+        if self._queue is not None and job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel the job, a running job stops after the current chunk.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            bool: True if the job was cancelled, False if it's absent or finished.
+        """
+        return await asyncio.to_thread(self._set_status, job_id, CANCELLED)
+
+    async def start(self):
+        """Resume the unfinished jobs, start the workers and the polling of the file."""
+        self._queue = asyncio.Queue()
+        job_ids = await asyncio.to_thread(self._claimable)
+        for job_id in job_ids:
+            self._enqueue(job_id)
+        if job_ids:
+            logger.info(f"Resuming {len(job_ids)} unfinished batch jobs")
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.n_workers)]
+        self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        """Stop the workers, the running jobs are resumed on the next start."""
+        tasks = [*self._workers, *([self._poller] if self._poller is not None else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(self._release)
+        self._workers = []
+        self._poller = None
+        self._queue = None
+        self._queued.clear()
+
+    async def _poll(self):
+        """Queue the jobs submitted to other workers and the ones left by crashed workers."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                for job_id in await asyncio.to_thread(self._claimable):
+                    self._enqueue(job_id)
+            except Exception:
+                logger.exception("Polling of the batch jobs failed")
+
+    async def _work(self):
+        """Take the jobs from the queue one by one."""
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if is_transient(e):
+                    delay = await asyncio.to_thread(self._retry_later, job_id, str(e))
+                    logger.warning(f"Batch job {job_id} is retried in {delay:.1f} s: {e!r}")
+                    continue
+                logger.exception(f"Batch job {job_id} failed")
+                await asyncio.to_thread(self._set_status, job_id, FAILED, str(e))
+
+    async def _run(self, job_id: str):
+        """Process the job chunk by chunk from the saved progress.
+
+        Args:
+            job_id (str): The job id.
+        """
+        if not await asyncio.to_thread(self._claim, job_id):
+            return
+        while True:
+            done, chunk = await asyncio.to_thread(self._load_chunk, job_id)
+            if not chunk:
+                break
+            await self.handler(ServiceInput(texts=chunk))
+            # the job could be cancelled or taken over while the chunk was processed
+            if not await asyncio.to_thread(self._save_progress, job_id, done + len(chunk)):
+                return
+        await asyncio.to_thread(self._set_status, job_id, DONE)
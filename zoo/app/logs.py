@@ -0,0 +1,120 @@
+"""The module with the logging setup of the Zoo.
+
+The records are put into a queue by the caller and written to the output
+by the thread of the queue listener, so a slow stdout or disk doesn't
+block the event loop. The records are JSON lines with the fields passed
+in `extra`, e.g. the number of texts and the time of every model.
+
+The predictions are not logged by default, they are too large to be
+written for every chunk. The payload of a sampled share of chunks can be
+logged truncated with `sample_payload`.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, TextIO
+
+JSON = "json"
+TEXT = "text"
+FORMATS = (JSON, TEXT)
+
+TEXT_FORMAT = "%(name)s %(asctime)s %(levelname)s %(message)s"
+
+# the attributes every record has, the others are the fields from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format the record as a JSON line with its `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(
+    log_format: str = JSON,
+    level: int | str = logging.INFO,
+    stream: TextIO | None = None,
+    filename: str | None = None,
+) -> QueueListener:
+    """Send the records of all the loggers through the queue to the output.
+
+    The previous setup is replaced. The listener is stopped at exit, so the
+    queued records are written.
+
+    Args:
+        log_format (str, optional): "json" or "text". Defaults to "json".
+        level (int | str, optional): The level of the root logger. Defaults to logging.INFO.
+        stream (TextIO | None, optional): The output stream, stdout if None
+        and no file is given. Defaults to None.
+        filename (str | None, optional): The file to write to instead of the
+        stream. Defaults to None.
+
+    Returns:
+        QueueListener: The started listener writing the records.
+    """
+    global _listener
+    if log_format not in FORMATS:
+        raise ValueError(f"Unknown log format '{log_format}', expected one of {FORMATS}")
+    if filename is not None:
+        handler = logging.FileHandler(filename, encoding="utf-8")
+    else:
+        handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if log_format == JSON else logging.Formatter(TEXT_FORMAT))
+    if _listener is not None:
+        _listener.stop()
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level)
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def sample_payload(
+    items: list[Any], sample_rate: float, max_items: int = 10, max_chars: int = 2000
+) -> str | None:
+    """Get the truncated payload to log for a sampled share of calls.
+
+    Only the first `max_items` items are serialized, so a large payload
+    costs as much as a small one.
+
+    Args:
+        items (list[Any]): The items of the payload, e.g. the predicted texts.
+        sample_rate (float): The share of calls the payload is logged for, 0 disables it.
+        max_items (int, optional): The max number of logged items. Defaults to 10.
+        max_chars (int, optional): The max length of the logged payload. Defaults to 2000.
+
+    Returns:
+        str | None: The JSON of the first items, None if the call is not sampled.
+    """
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    payload = json.dumps(items[:max_items], ensure_ascii=False, default=str)
+    if len(payload) > max_chars:
+        payload = payload[:max_chars] + "..."
+    return payload
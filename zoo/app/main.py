@@ -1,37 +1,66 @@
 """The main file of FastAPI app"""
-from fastapi import FastAPI, BackgroundTasks
-import requests
-from app.models import TextList, ServiceInput, TritonServerAddr
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from app.models import JobInfo, TextList, ServiceInput, TritonServerAddr
 
 import yaml
-from app.utils import init_triton_connections, normalize_predictions
-from app.triton_api_client import TritonApiClient
+from app.utils import create_triton_client, init_triton_connections, normalize_predictions, parse_services
+from app.postprocessing import get_postprocessor
+from app.streaming import PredictionStreamResponse, StreamItem
+from app.scheduler import DeadlineExceeded, predict_with_available_models, predict_with_models
+from app.batcher import MicroBatcher
+from app.cache import CachedPredictor, PredictionCache, Predictor
+from app.store import PredictionStore, StoredPredictor
+from app.jobs import JobQueue
+from app.delivery import PlatformDelivery
+from app.admission import AdmissionController, BodySizeLimitMiddleware
+from app.health import OPEN, HealthMonitor
+from app.connections import Reconnector, service_key
+from app.registry import RegistryWatcher, ServiceRegistry
+from app.metrics import (
+    BATCH_SIZE_LIMIT,
+    IN_FLIGHT_TEXTS,
+    PREDICTED_TEXTS,
+    QUEUED_TEXTS,
+    REGISTRY,
+    MetricsMiddleware,
+)
+from app.async_triton_api_client import AsyncTritonApiClient
+from app.replicas import LEAST_OUTSTANDING, ReplicaGroup
+from app.serialization import render, request_body, service_input_body, text_list_body
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+
+from app.logs import sample_payload, setup_logging
 
+import asyncio
 import logging
-import sys
+import time
 
 
-stream_handler = logging.StreamHandler(sys.stdout)
-logging.basicConfig(
-    level=logging.INFO,
-    handlers=[stream_handler],
-    format="%(name)s %(asctime)s %(levelname)s %(message)s",
-)
 logger = logging.getLogger(__name__)
+# httpx logs every request to Triton on INFO level
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 
-def collect_predictions(
+async def collect_predictions(
     input_texts: ServiceInput,
     label_mapping: dict[str, tuple[str, str]],
     irrelevant_class_name: str,
     separator: str,
     url_to_send: str | None = None,
+    delivery: PlatformDelivery | None = None,
+    chunk_size: int = 256,
 ):
     """Collect predictions from model servies and send them to the platform BD.
 
-    This is a background task executed by "/predict_on_batch".
+    This is executed by the job queue for every chunk of "/predict_on_batch" texts.
+    The texts are processed in chunks of `chunk_size`, every chunk is sent
+    to the platform as soon as it's predicted. Every model must answer, the
+    predictions without a skipped model would be stored by the platform as
+    complete ones. The predictions are logged
+    only for the sampled chunks if it's enabled in the config.
 
     Args:
         input_texts (ServiceInput): The text to be predicted.
@@ -40,26 +69,455 @@ def collect_predictions(
         separator (str): A multilabel class separator.
         irrelevant_class_name (str): A name for irrelevant class.
         url_to_send (str | None, optional): The endpoint url to send to. Defaults to None.
+        delivery (PlatformDelivery | None, optional): The client sending the predictions,
+        the app one if None. Defaults to None.
+        chunk_size (int, optional): The number of texts in a chunk. Defaults to 256.
+
+    Raises:
+        ModelsUnavailable: If any model can't answer now, nothing is sent for the chunk.
     """
-    texts = [f.text for f in input_texts.texts]
-    ids = [f.text_id for f in input_texts.texts]
-    preds = process_text(TextList(text_list=texts))
-    normalized_preds = normalize_predictions(preds, label_mapping, separator, irrelevant_class_name)
-    output = {
-        "texts": [
-            {"id": str(idx), "predictions": pred}
-            for idx, pred in zip(ids, normalized_preds)
-        ]
+    delivery = delivery or app.state.delivery
+    for start in range(0, len(input_texts.texts), chunk_size):
+        chunk = input_texts.texts[start : start + chunk_size]
+        predict_start = time.perf_counter()
+        preds = await predict_all([f.text for f in chunk])
+        predict_ms = 1000 * (time.perf_counter() - predict_start)
+        normalized_preds = normalize_predictions(preds, label_mapping, separator, irrelevant_class_name)
+        output = {
+            "texts": [
+                {"id": str(f.text_id), "predictions": pred}
+                for f, pred in zip(chunk, normalized_preds)
+            ]
+        }
+        fields = {"texts": len(chunk), "predict_ms": round(predict_ms, 1), "sent": url_to_send is not None}
+        payload = sample_payload(
+            output["texts"],
+            app.state.config.get("log_payload_sample_rate", 0),
+            app.state.config.get("log_payload_max_texts", 10),
+            app.state.config.get("log_payload_max_chars", 2000),
+        )
+        if payload is not None:
+            fields["payload"] = payload
+        logger.info("Predicted a chunk of batch texts", extra=fields)
+        if url_to_send is not None:
+            await delivery.send(url_to_send, output)
+
+
+async def process_batch_chunk(data: ServiceInput):
+    """Collect predictions for a chunk of a batch job with the current settings.
+
+    Args:
+        data (ServiceInput): The chunk of texts.
+    """
+    await collect_predictions(
+        data,
+        app.state.label_mapping,
+        IRRELEVANT_CLASS_NAME,
+        app.state.config["separator"],
+        app.state.config["endpoint_to_send_preds"],
+    )
+
+
+def get_client_kwargs() -> dict:
+    """Get the arguments for Triton clients from the config.
+
+    Returns:
+        dict: The keyword arguments for AsyncTritonApiClient.
+    """
+    target_batch_latency = app.state.config.get("target_batch_latency_ms")
+    return {
+        "max_concurrency": app.state.config.get("model_concurrency", 1),
+        "pool_size": app.state.config.get("connection_pool_size", 100),
+        "binary_data": app.state.config.get("binary_data", False),
+        "batching": app.state.config.get("batching", "arrival"),
+        "max_batch_chars": app.state.config.get("max_batch_chars"),
+        "adaptive_batching": app.state.config.get("adaptive_batching"),
+        "target_batch_latency": target_batch_latency / 1000 if target_batch_latency else None,
+        "request_timeout": app.state.config.get("triton_request_timeout_s"),
     }
+
+
+def make_job_queue() -> JobQueue:
+    """Open the queue of the batch jobs from the config.
+
+    Returns:
+        JobQueue: The queue, in memory if `jobs_path` is null.
+    """
+    return JobQueue(
+        app.state.config.get("jobs_path") or ":memory:",
+        process_batch_chunk,
+        app.state.config.get("job_workers", 2),
+        app.state.config.get("job_chunk_size", 256),
+        app.state.config.get("job_lease_s", 300),
+        app.state.config.get("job_poll_interval_s", 1),
+        app.state.config.get("job_retry_backoff_s", 1),
+        app.state.config.get("job_retry_max_backoff_s", 60),
+    )
+
+
+def get_group_kwargs() -> dict:
+    """Get the arguments for the replica groups of models from the config.
+
+    Returns:
+        dict: The keyword arguments for ReplicaGroup.
+    """
+    return {
+        "balancing": app.state.config.get("replica_balancing", LEAST_OUTSTANDING),
+        "hedge_quantile": app.state.config.get("hedge_quantile"),
+        "hedge_budget": app.state.config.get("hedge_budget", 0.05),
+        "eject_time": app.state.config.get("replica_eject_s", 10),
+    }
+
+
+def get_micro_batchers() -> list[MicroBatcher]:
+    """Get the micro-batchers for the connected models, in the models order.
+
+    The batchers are created on demand and recreated if the model was reconnected.
+
+    Returns:
+        list[MicroBatcher]: The batchers.
+    """
+    max_wait = app.state.config.get("batching_max_wait_ms", 5) / 1000
+    batchers = []
+    for tr in app.state.triton_model_list:
+        batcher = app.state.micro_batchers.get(tr.model_name)
+        if batcher is None or batcher.client is not tr:
+            batcher = MicroBatcher(tr, max_wait)
+            app.state.micro_batchers[tr.model_name] = batcher
+        batchers.append(batcher)
+    return batchers
+
+
+def get_predictors(micro_batching: bool = False) -> list[Predictor]:
+    """Get the predictors for the connected models, in the models order.
+
+    Args:
+        micro_batching (bool, optional): Whether to gather the texts
+        with concurrent requests. Defaults to False.
+
+    Returns:
+        list[Predictor]: The clients or batchers, behind the persistent
+        store and the prediction cache if they are enabled.
+    """
+    models = app.state.triton_model_list
+    predictors = get_micro_batchers() if micro_batching else list(models)
+    if app.state.prediction_store is not None:
+        predictors = [
+            StoredPredictor(app.state.prediction_store, predictor, (tr.model_name, tr.model_version))
+            for tr, predictor in zip(models, predictors)
+        ]
+    if app.state.prediction_cache is not None:
+        predictors = [
+            CachedPredictor(app.state.prediction_cache, predictor, (tr.model_name, tr.model_version))
+            for tr, predictor in zip(models, predictors)
+        ]
+    return predictors
+
+
+async def admit_texts(texts: TextList = Depends(text_list_body)):
+    """Admit the request texts, holding the in-flight slots of the models until it's done.
+
+    Args:
+        texts (TextList): The list of texts to be predicted.
+    """
+    admission = app.state.admission
+    admission.check_request_size(len(texts.text_list))
+    model_names = [tr.model_name for tr in app.state.triton_model_list]
+    with admission.model_slots(model_names, len(texts.text_list)):
+        yield
+
+
+def request_timeout(request: Request | None) -> float | None:
+    """Get the deadline of the request: the `X-Request-Timeout` header or the config default.
+
+    Args:
+        request (Request | None): The request, None if the endpoint is called
+        as a function, e.g. by a batch job, then there is no deadline.
+
+    Raises:
+        HTTPException: 400 if the header is not a positive number.
+
+    Returns:
+        float | None: The timeout in seconds, None for no deadline.
+    """
+    if request is None:
+        return None
+    header = request.headers.get("x-request-timeout")
+    if header is None:
+        return app.state.config.get("request_timeout_s")
+    try:
+        timeout = float(header)
+    except ValueError:
+        timeout = 0.0
+    # also false for NaN
+    if not timeout > 0:
+        raise HTTPException(
+            status_code=400, detail="X-Request-Timeout should be a positive number of seconds"
+        )
+    return timeout
+
+
+async def predict_available(
+    text_list: list[str], micro_batching: bool = False, timeout: float | None = None
+) -> tuple[list[list[str]], list[str]]:
+    """Collect predictions from the available models.
+
+    Args:
+        text_list (list[str]): The texts to be predicted.
+        micro_batching (bool, optional): Whether to gather the texts
+        with concurrent requests. Defaults to False.
+        timeout (float | None, optional): The deadline in seconds, the models
+        that didn't answer in time are skipped. Defaults to None.
+
+    Raises:
+        HTTPException: 503 if all the models were skipped, 504 if no model
+        answered before the deadline.
+
+    Returns:
+        tuple[list[list[str]], list[str]]: The predicted classes of the
+        answered models and the names of the skipped models.
+    """
+    try:
+        preds, skipped = await predict_with_available_models(
+            get_predictors(micro_batching), text_list, app.state.health, timeout
+        )
+    except DeadlineExceeded as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=504, detail=f"No model answered in {timeout} s")
+    PREDICTED_TEXTS.inc(value=len(text_list))
+    if skipped:
+        logger.warning(f"The models {skipped} were skipped")
+        if len(skipped) == len(app.state.triton_model_list):
+            raise HTTPException(
+                status_code=503,
+                detail="All the models are unavailable",
+                headers={"Retry-After": str(app.state.admission.retry_after)},
+            )
+    return preds, skipped
+
+
+async def predict_all(text_list: list[str]) -> list[list[str]]:
+    """Collect predictions from every connected model, for the batch jobs.
+
+    Args:
+        text_list (list[str]): The texts to be predicted.
+
+    Raises:
+        ModelsUnavailable: If any model is unavailable or fails.
+
+    Returns:
+        list[list[str]]: The predicted classes of all the models.
+    """
+    preds = await predict_with_models(get_predictors(), text_list, app.state.health)
+    PREDICTED_TEXTS.inc(value=len(text_list))
+    return preds
+
+
+async def predict_texts(
+    text_list: list[str],
+    response: Response | None = None,
+    micro_batching: bool = False,
+    timeout: float | None = None,
+) -> list[list[str]]:
+    """Collect predictions from the available models.
+
+    The names of the skipped models are put into the `X-Skipped-Models`
+    header of the response, and the predictions are marked as incomplete
+    by the `X-Incomplete` header.
+
+    Args:
+        text_list (list[str]): The texts to be predicted.
+        response (Response | None, optional): The response of the endpoint. Defaults to None.
+        micro_batching (bool, optional): Whether to gather the texts
+        with concurrent requests. Defaults to False.
+        timeout (float | None, optional): The deadline in seconds. Defaults to None.
+
+    Returns:
+        list[list[str]]: The predicted classes of the answered models.
+    """
+    preds, skipped = await predict_available(text_list, micro_batching, timeout)
+    if skipped and response is not None:
+        response.headers["X-Skipped-Models"] = ",".join(skipped)
+        response.headers["X-Incomplete"] = "true"
+    return preds
+
+
+def invalidate_model_cache(model_name: str):
+    """Drop everything stored for the model.
+
+    Args:
+        model_name (str): The model name.
+    """
+    app.state.micro_batchers.pop(model_name, None)
+    if app.state.prediction_cache is not None:
+        app.state.prediction_cache.invalidate(model_name)
+
+
+async def connect_service(server: TritonServerAddr) -> AsyncTritonApiClient:
+    """Create the connected client of the service with the client settings of the config.
+
+    Args:
+        server (TritonServerAddr): The address of the service.
+
+    Returns:
+        AsyncTritonApiClient: The client.
+    """
+    return await create_triton_client(
+        server.url, server.port, server.model_name, server.protocol, **get_client_kwargs()
+    )
+
+
+def register_replica(server: TritonServerAddr, client: AsyncTritonApiClient) -> bool:
+    """Add the connected client to its model, a new model is created if needed.
+
+    Args:
+        server (TritonServerAddr): The address of the service.
+        client (AsyncTritonApiClient): The connected client.
+
+    Returns:
+        bool: True if it's added, False if the replica is already connected,
+        e.g. by a concurrent request, then the client should be closed.
+    """
+    group = find_model(server.model_name)
+    if group is not None and group.find(service_key(server)[1]) is not None:
+        return False
+    if group is None:
+        group = ReplicaGroup(server.model_name, **get_group_kwargs())
+        invalidate_model_cache(server.model_name)
+        app.state.health.remove(server.model_name)
+        app.state.triton_model_list.append(group)
+    group.add(client, server.weight)
     logger.info(
-            output
+        f"Connected the {server.model_name} model on {server.url}:{server.port}, "
+        f"{len(group)} replicas"
+    )
+    return True
+
+
+async def disconnect_replicas(model_name: str, base: str | None = None) -> bool:
+    """Disconnect the replicas of the model and stop connecting its pending services.
+
+    Args:
+        model_name (str): The model name.
+        base (str | None, optional): The base url of the replica, all the
+        replicas of the model if None. Defaults to None.
+
+    Returns:
+        bool: True if any replica was connected or pending.
+    """
+    was_pending = app.state.reconnector.remove(model_name, base)
+    group = find_model(model_name)
+    if group is None:
+        return was_pending
+    if base is None:
+        replicas = list(group.replicas)
+    else:
+        replica = group.find(base)
+        if replica is None:
+            return was_pending
+        replicas = [replica]
+    for replica in replicas:
+        group.remove(replica)
+        await replica.close_connection()
+        logger.info(f"Disconnected the {model_name} model on {replica.base}")
+    if len(group) == 0:
+        app.state.triton_model_list.remove(group)
+        invalidate_model_cache(model_name)
+        app.state.health.remove(model_name)
+    return True
+
+
+async def apply_registry(services: list[TritonServerAddr], settings: dict):
+    """Make the connected models and the settings of the worker match the shared registry.
+
+    The services absent in the registry are disconnected. The new ones are
+    connected at the same time, the ones that failed are pending.
+
+    Args:
+        services (list[TritonServerAddr]): The services of the registry.
+        settings (dict): The settings of the registry, e.g. the platform endpoint.
+    """
+    app.state.config.update(settings)
+    wanted = {service_key(server): server for server in services}
+    for group in list(app.state.triton_model_list):
+        for replica in list(group.replicas):
+            if (group.model_name, replica.base) not in wanted:
+                await disconnect_replicas(group.model_name, replica.base)
+    for model_name, base in list(app.state.reconnector.pending):
+        if (model_name, base) not in wanted:
+            app.state.reconnector.remove(model_name, base)
+    new = [
+        server for (model_name, base), server in wanted.items()
+        if (model_name, base) not in app.state.reconnector.pending
+        and (find_model(model_name) is None or find_model(model_name).find(base) is None)
+    ]
+    clients = await asyncio.gather(
+        *(
+            asyncio.wait_for(connect_service(server), app.state.config.get("connect_timeout_s", 5))
+            for server in new
+        ),
+        return_exceptions=True,
+    )
+    for server, client in zip(new, clients):
+        if isinstance(client, BaseException):
+            logger.error(f"Failed to connect the {server.model_name} model: {client!r}")
+            app.state.reconnector.add(server, repr(client))
+        elif not register_replica(server, client):
+            await client.close_connection()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect the Triton services on startup and disconnect them on shutdown.
+
+    The services are connected at the same time with a timeout, the ones
+    that failed are pending and connected in background. With the shared
+    registry the services and settings are taken from it, the config fills
+    it on the first start only.
+    """
+    with open("config/triton_services.yml", "r") as file:
+        services = parse_services(yaml.safe_load(file))
+    registry_version = None
+    if app.state.registry is not None:
+        await asyncio.to_thread(
+            app.state.registry.seed,
+            services,
+            {"endpoint_to_send_preds": app.state.config.get("endpoint_to_send_preds")},
         )
-    if url_to_send is not None:
-        response = requests.post(url_to_send, json=output)
-        response.raise_for_status()
+        registry_version, services, settings = await asyncio.to_thread(app.state.registry.snapshot)
+        app.state.config.update(settings)
+    app.state.job_queue = make_job_queue()
+    app.state.triton_model_list, failed = await init_triton_connections(
+        services,
+        timeout=app.state.config.get("connect_timeout_s", 5),
+        **get_group_kwargs(),
+        **get_client_kwargs(),
+    )
+    for server, error in failed:
+        app.state.reconnector.add(server, error)
+    if len(app.state.triton_model_list) == 0:
+        logger.warning("No Triton models are connected to the Zoo")
+    await app.state.job_queue.start()
+    await app.state.health.start(lambda: app.state.triton_model_list)
+    await app.state.reconnector.start()
+    if app.state.registry is not None:
+        await app.state.registry_watcher.start(registry_version)
+    yield
+    if app.state.registry is not None:
+        await app.state.registry_watcher.stop()
+        app.state.registry.close()
+    await app.state.reconnector.stop()
+    await app.state.health.stop()
+    await app.state.job_queue.stop()
+    app.state.job_queue.close()
+    await app.state.delivery.close()
+    for tr in app.state.triton_model_list:
+        await tr.close_connection()
+    if app.state.prediction_store is not None:
+        app.state.prediction_store.close()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 origins = ["*"]
 
@@ -71,8 +529,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-with open("config/triton_services.yml", "r") as file:
-    app.state.triton_model_list = init_triton_connections(yaml.safe_load(file))
+app.state.triton_model_list = []
+app.state.micro_batchers = {}
 
 with open("config/mapping.yml", "r") as file:
     app.state.label_mapping = yaml.safe_load(file)
@@ -80,60 +538,141 @@ with open("config/mapping.yml", "r") as file:
 with open("config/config.yml", "r") as file:
     app.state.config = yaml.safe_load(file)
 
+setup_logging(app.state.config.get("log_format", "json"), app.state.config.get("log_level", "INFO"))
+
 IRRELEVANT_CLASS_NAME = app.state.config["irrelevant_class_name"]
 
-if IRRELEVANT_CLASS_NAME not in app.state.label_mapping:
-    raise ValueError(f"The irrelevant class name '{IRRELEVANT_CLASS_NAME}' is not in label mapping")
+if app.state.config.get("cache_max_size", 0) > 0:
+    app.state.prediction_cache = PredictionCache(
+        app.state.config["cache_max_size"], app.state.config.get("cache_ttl_s", 86400)
+    )
+else:
+    app.state.prediction_cache = None
+
+if app.state.config.get("store_path"):
+    app.state.prediction_store = PredictionStore(
+        app.state.config["store_path"], app.state.config.get("store_max_entries", 1_000_000)
+    )
+else:
+    app.state.prediction_store = None
+
+app.state.delivery = PlatformDelivery(
+    app.state.config.get("delivery_max_retries", 5),
+    app.state.config.get("delivery_backoff_s", 0.5),
+    dead_letter_path=app.state.config.get("dead_letter_path"),
+)
+
+# the file of the queue is opened on startup, so importing the app doesn't touch it
+app.state.job_queue = None
+
+app.state.admission = AdmissionController(
+    app.state.config.get("max_queued_texts", 1_000_000),
+    app.state.config.get("max_texts_per_request", 50_000),
+    app.state.config.get("max_model_in_flight_texts", 10_000),
+    app.state.config.get("retry_after_s", 5),
+)
+
+app.state.health = HealthMonitor(
+    app.state.config.get("health_check_interval_s", 5),
+    app.state.config.get("circuit_failure_threshold", 3),
+    app.state.config.get("circuit_reset_timeout_s", 10),
+)
+
+app.state.reconnector = Reconnector(
+    connect_service,
+    register_replica,
+    app.state.config.get("reconnect_interval_s", 5),
+    app.state.config.get("reconnect_max_interval_s", 60),
+    app.state.config.get("connect_timeout_s", 5),
+)
+
+if app.state.config.get("registry_path"):
+    app.state.registry = ServiceRegistry(app.state.config["registry_path"])
+    app.state.registry_watcher = RegistryWatcher(
+        app.state.registry, apply_registry, app.state.config.get("registry_poll_interval_s", 1)
+    )
+else:
+    app.state.registry = None
+    app.state.registry_watcher = None
+
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_bytes=app.state.config.get("max_request_body_bytes", 0),
+    # a stream is read and predicted chunk by chunk, so it's not cut by the total limit
+    path_limits={"/predict_stream": app.state.config.get("max_stream_body_bytes", 0)},
+)
+
+# the outermost middleware, so the rejected requests are counted too
+app.add_middleware(MetricsMiddleware)
+
+# compiled once on startup, it also checks that the irrelevant class is in the mapping
+get_postprocessor(app.state.label_mapping, app.state.config["separator"], IRRELEVANT_CLASS_NAME)
+
+def find_model(model_name: str) -> ReplicaGroup | None:
+    """Find the connected model by name.
+
+    Args:
+        model_name (str): The model name.
+
+    Returns:
+        ReplicaGroup | None: The replicas of the model, None if it's not connected.
+    """
+    return next((x for x in app.state.triton_model_list if x.model_name == model_name), None)
 
-if len(app.state.triton_model_list) == 0:
-    logger.warning("No Triton models are connected to the Zoo")
 
 @app.post("/connect_server")
-def connect_server(server: TritonServerAddr) -> int:
+async def connect_server(server: TritonServerAddr) -> int:
     """Perform a conntection to the Triton model services.
 
+    A service with the name of a connected model is added as its replica.
+    With the shared registry it's added there too, so the other workers
+    connect it.
+
     Args:
         server (TritonServerAddr): The address of the service.
 
     Returns:
         int: Status code. 200 if success, 400 otherwise.
     """
-    if any(
-        True for x in app.state.triton_model_list if x.model_name == server.model_name
-    ):
+    group = find_model(server.model_name)
+    if group is not None and group.find(service_key(server)[1]) is not None:
         return 400
     try:
-        cl = TritonApiClient(server.url, server.port, server.model_name)
-        logger.info(
-            f"Connected the {server.model_name} model on {server.url}:{server.port}"
-        )
-        app.state.triton_model_list.append(cl)
+        cl = await connect_service(server)
     except Exception as e:
-        print(e)
+        logger.error(f"Failed to connect the {server.model_name} model: {e}")
         return 400
+    app.state.reconnector.remove(*service_key(server))
+    if not register_replica(server, cl):
+        # the pending service was connected by the reconnector meanwhile
+        await cl.close_connection()
+    if app.state.registry is not None:
+        await asyncio.to_thread(app.state.registry.add_service, server)
     return 200
 
 
 @app.delete("/disconnect_server")
-def disconnect_server(model_name: str) -> int:
+async def disconnect_server(model_name: str, url: str | None = None, port: str | None = None) -> int:
     """Disconnect the Triton model service from the Zoo.
 
+    With the shared registry it's removed there too, so the other workers
+    disconnect it.
+
     Args:
         model_name (str): Name of the registered model in Zoo.
+        url (str | None, optional): The base url of the replica to disconnect,
+        all the replicas if None. Defaults to None.
+        port (str | None, optional): The port of the replica. Defaults to None.
 
     Returns:
         int: Status code. 200 if success, 400 otherwise.
     """
-    if not any(
-        True for x in app.state.triton_model_list if x.model_name == model_name
-    ):
-        return 400
-    for i, tr in enumerate(app.state.triton_model_list):
-        if tr.model_name == model_name:
-            tr.close_connection()
-            app.state.triton_model_list.pop(i)
-            logger.info(f"Disconnected the {tr.model_name} model on {tr.base}")
-            return 200
+    base = None if url is None else f"{url}:{port}/v2"
+    registered = False
+    if app.state.registry is not None:
+        registered = await asyncio.to_thread(app.state.registry.remove_services, model_name, base)
+    disconnected = await disconnect_replicas(model_name, base)
+    return 200 if registered or disconnected else 400
 
 
 @app.get("/show_services")
@@ -142,20 +681,148 @@ def show_services() -> list[dict[str, str]]:
 
     Returns:
         list[dict[str,srr]]: The list of objects with model names and
-        corresponding url.
+        corresponding url, one per replica.
     """
     output_data = []
     for tr in app.state.triton_model_list:
-        output_data.append({"url": tr.base, "model_name": tr.model_name})
+        for replica in tr.replicas:
+            output_data.append({"url": replica.base, "model_name": tr.model_name})
     return output_data
 
 
+@app.get("/models_health")
+def models_health() -> dict[str, str]:
+    """Show the states of the models: healthy, degraded or open.
+
+    The requests skip the models with an open circuit.
+
+    Returns:
+        dict[str, str]: The state per model name.
+    """
+    return {
+        tr.model_name: app.state.health.breaker(tr.model_name).state
+        for tr in app.state.triton_model_list
+    }
+
+
+@app.get("/batch_sizes")
+def batch_sizes() -> dict[str, list[dict]]:
+    """Show the batch sizes used for the models.
+
+    Returns:
+        dict[str, list[dict]]: Per model a list with an object per replica:
+        the url, the max and the used batch size and, with adaptive batching,
+        the average latency in milliseconds per batch size.
+    """
+    output = {}
+    for tr in app.state.triton_model_list:
+        output[tr.model_name] = [
+            {"url": replica.base, "max_batch_size": replica.max_batch_size, "batch_size": replica.batch_size}
+            if replica.batch_sizing is None
+            else {"url": replica.base, **replica.batch_sizing.stats()}
+            for replica in tr.replicas
+        ]
+    return output
+
+
+@app.get("/hedge_stats")
+def hedge_stats() -> dict[str, dict]:
+    """Show the hedging of the batches per model, if it's enabled.
+
+    Returns:
+        dict[str, dict]: The number of batches, hedged ones and the ones the
+        hedge answered first, the hedge rate and the current delay in
+        milliseconds per model.
+    """
+    return {
+        tr.model_name: tr.hedger.stats()
+        for tr in app.state.triton_model_list
+        if tr.hedger is not None
+    }
+
+
+@app.get("/ready")
+def readiness(response: Response) -> dict:
+    """Show whether the Zoo is ready to predict and the state of every model.
+
+    A model is "live" if it's connected and answers, "unavailable" if it's
+    connected but skipped by the open circuit, and "pending" if none of its
+    services are connected yet. The status code is 503 if no model is live.
+
+    Args:
+        response (Response): The response, set by FastAPI.
+
+    Returns:
+        dict: The readiness, the state per model and the pending services.
+    """
+    models = {
+        tr.model_name: "unavailable" if app.state.health.breaker(tr.model_name).state == OPEN else "live"
+        for tr in app.state.triton_model_list
+    }
+    for model_name in app.state.reconnector.model_names():
+        models.setdefault(model_name, "pending")
+    ready = "live" in models.values()
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "models": models,
+        "pending_services": [service.info() for service in app.state.reconnector.pending.values()],
+    }
+
+
+@app.get("/cache_stats")
+def cache_stats() -> dict[str, int]:
+    """Show the counters of the prediction cache.
+
+    Returns:
+        dict[str, int]: Hits, misses, coalesced texts and the cache size.
+        Empty if the cache is disabled.
+    """
+    if app.state.prediction_cache is None:
+        return {}
+    return app.state.prediction_cache.stats()
+
+
+@app.get("/queue_depth")
+async def queue_depth() -> dict:
+    """Show the load of the Zoo.
+
+    Returns:
+        dict: The number of unprocessed texts in batch jobs and the number
+        of texts in flight per model.
+    """
+    return {
+        "queued_texts": await asyncio.to_thread(app.state.job_queue.pending_texts),
+        "max_queued_texts": app.state.admission.max_queued_texts,
+        "in_flight_texts": dict(app.state.admission.in_flight),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """Show the metrics of the Zoo in Prometheus text format.
+
+    Returns:
+        str: The metrics: the requests per endpoint, the Triton requests per
+        model, the predicted texts, the queue depth and the platform delivery.
+    """
+    QUEUED_TEXTS.set(value=await asyncio.to_thread(app.state.job_queue.pending_texts))
+    IN_FLIGHT_TEXTS.clear()
+    BATCH_SIZE_LIMIT.clear()
+    for tr in app.state.triton_model_list:
+        IN_FLIGHT_TEXTS.set(tr.model_name, value=app.state.admission.in_flight[tr.model_name])
+        for replica in tr.replicas:
+            BATCH_SIZE_LIMIT.set(tr.model_name, replica.base, value=replica.batch_size)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.put("/update_platform_endpoint")
 def update_platform_endpoint(new_endpoint: str) -> int:
     """Update the platform endpoint where the prediction results should be send.
 
     It's intended to be an endpoint that takes predictions and store then
-    into a platform BD.
+    into a platform BD. With the shared registry the other workers use it too.
 
     Args:
         new_endpoint (str): The url of a new endpoint.
@@ -166,84 +833,180 @@ def update_platform_endpoint(new_endpoint: str) -> int:
     if new_endpoint == "":
         new_endpoint = None
     app.state.config["endpoint_to_send_preds"] = new_endpoint
+    if app.state.registry is not None:
+        app.state.registry.set_setting("endpoint_to_send_preds", new_endpoint)
     logger.info(f"Platform endpoint updated on {new_endpoint}")
     return 200
 
 
-@app.post("/predict_on_batch", status_code=202)
-def predict_on_batch(data: ServiceInput, background_tasks: BackgroundTasks) -> dict[str, str]:
-    """Takes texts to be predicted and create a background task.
+@app.post("/predict_on_batch", status_code=202, openapi_extra=request_body(ServiceInput))
+async def predict_on_batch(
+    data: ServiceInput = Depends(service_input_body), request: Request = None
+) -> dict[str, str]:
+    """Takes texts to be predicted and create a batch job.
 
-    The background task is for for prediction collection and sending the result to the platform.
+    The job is for prediction collection and sending the result to the platform.
+    It's stored in the persistent queue and processed by the job workers.
+    The batch is rejected with 503 if the queue is full. The body and the
+    response are JSON or msgpack.
 
     Args:
         data (ServiceInput): Data from the platform to be predicted.
-        background_tasks (BackgroundTasks): The dependency of background task.
+        request (Request, optional): The request, set by FastAPI. Defaults to None.
 
     Returns:
-        dict[str, str]: The object with accept message.
+        dict[str, str]: The object with accept message and the job id.
     """
-    logger.debug(f"New batch of len={len(data.texts)} received")
-    background_tasks.add_task(
-        collect_predictions,
-        data,
-        app.state.label_mapping,
-        IRRELEVANT_CLASS_NAME,
-        app.state.config["separator"],
-        app.state.config["endpoint_to_send_preds"],
-    )
-    return {"status": "texts received"}
+    admission = app.state.admission
+    admission.check_request_size(len(data.texts))
+    job_id = await app.state.job_queue.submit(data, admission.check_queue)
+    logger.debug(f"New batch of len={len(data.texts)} received as the job {job_id}")
+    return render(request, {"status": "texts received", "job_id": job_id}, status_code=202)
+
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> JobInfo:
+    """Show the status and progress of the batch job.
 
-@app.post("/predict")
-def process_text(texts: TextList) -> list[list[str]]:
+    Args:
+        job_id (str): The job id.
+
+    Returns:
+        JobInfo: The job status, the number of processed and all texts.
+    """
+    job = await asyncio.to_thread(app.state.job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str) -> JobInfo:
+    """Cancel the batch job. A running job stops after the current chunk.
+
+    Args:
+        job_id (str): The job id.
+
+    Returns:
+        JobInfo: The job status after cancellation. A finished job is not changed.
+    """
+    await app.state.job_queue.cancel(job_id)
+    return await get_job(job_id)
+
+
+@app.post("/predict", dependencies=[Depends(admit_texts)], openapi_extra=request_body(TextList))
+async def process_text(
+    texts: TextList = Depends(text_list_body), response: Response = None, request: Request = None
+) -> list[list[str]]:
     """Collect predictions for the text list.
 
     This is a simple function that doesn't perform any postprocessing.
     Only collect the predictions from the registered Triton services.
+    All models are requested concurrently, each one gets the texts
+    in chunks of its `max_batch_size`. The unavailable models are skipped
+    and listed in the `X-Skipped-Models` header. The models that didn't
+    answer before the deadline, set by the `X-Request-Timeout` header in
+    seconds or the config, are skipped too, or it's 504 if none answered.
+    The body and the response are JSON or msgpack.
 
     Args:
         texts (TextList): The list of texts to be predicted.
+        response (Response, optional): The response, set by FastAPI. Defaults to None.
+        request (Request, optional): The request, set by FastAPI. Defaults to None.
 
     Returns:
         list[list[str]]: The predicted classes.
     """
-    result = []
-    for t in texts.text_list:
-        preds = []
-        for tr in app.state.triton_model_list:
-            preds.extend(tr.make_prediction([t]))
-        result.append(preds)
-    return result
+    preds = await predict_texts(texts.text_list, response, timeout=request_timeout(request))
+    return render(request, preds, response)
 
 
-@app.post("/predict_on_text")
-def process_text_list(texts: TextList):
+@app.post("/predict_on_text", dependencies=[Depends(admit_texts)], openapi_extra=request_body(TextList))
+async def process_text_list(
+    request: Request, response: Response, texts: TextList = Depends(text_list_body)
+) -> list[list[str]]:
     """Collect predictions and format them by class mapping.
 
     This is a modification of the `predict` method that performs
     a post-processing that includes mapping of class names and
-    normalizing lists of predictions.
+    normalizing lists of predictions. The texts of concurrent
+    requests are gathered into shared batches per model. The deadline
+    works as for `predict`.
 
     Args:
+        request (Request): The request, set by FastAPI.
+        response (Response): The response, set by FastAPI.
         texts (TextList): The list of texts to be predicted.
 
     Returns:
         list[list[str]]: The predicted classes.
     """
-    res = process_text(texts)
-    mapped_predictions = []
-    label_mapping = {x: y[0] for x, y in app.state.label_mapping.items()}
-    for pred_line in res:
-        pred_line = [
-            label_mapping[x]
-            for y in pred_line
-            for x in y.split(";")
-            if x in label_mapping
-        ]
-        # we dont need "irrelevant" prediction if there exist any relevant one
-        pred_line = [x for x in pred_line if x != IRRELEVANT_CLASS_NAME]
-        if len(pred_line) == 0:
-            pred_line = [label_mapping[IRRELEVANT_CLASS_NAME]]
-        mapped_predictions.append(pred_line)
-    return mapped_predictions
+    res = await predict_texts(
+        texts.text_list, response, micro_batching=True, timeout=request_timeout(request)
+    )
+    postprocessor = get_postprocessor(
+        app.state.label_mapping, app.state.config.get("separator", ";"), IRRELEVANT_CLASS_NAME
+    )
+    return render(request, postprocessor.class_names(res), response)
+
+
+async def predict_stream_chunk(items: list[StreamItem], start: int, raw: bool) -> list[dict]:
+    """Make the lines of the prediction stream for a chunk of texts.
+
+    The chunk is admitted like a request: the texts of the stream so far
+    are counted toward `max_texts_per_request`, and the chunk holds the
+    in-flight slots of the models while it's predicted.
+
+    Args:
+        items (list[StreamItem]): The text ids and the texts.
+        start (int): The index of the first text in the request.
+        raw (bool): Whether to send the raw predictions of the models.
+
+    Returns:
+        list[dict]: A line per text with its index, predictions and id if it's given.
+    """
+    admission = app.state.admission
+    admission.check_request_size(start + len(items))
+    model_names = [tr.model_name for tr in app.state.triton_model_list]
+    with admission.model_slots(model_names, len(items)):
+        preds, skipped = await predict_available([text for _, text in items], micro_batching=True)
+    if not raw:
+        preds = get_postprocessor(
+            app.state.label_mapping, app.state.config.get("separator", ";"), IRRELEVANT_CLASS_NAME
+        ).class_names(preds)
+    lines = []
+    for i, ((text_id, _), pred) in enumerate(zip(items, preds)):
+        line = {"index": start + i, "predictions": pred}
+        if text_id is not None:
+            line["text_id"] = text_id
+        if skipped:
+            line["skipped_models"] = skipped
+        lines.append(line)
+    return lines
+
+
+@app.post("/predict_stream")
+async def predict_stream(request: Request, raw: bool = False) -> PredictionStreamResponse:
+    """Stream the predictions as NDJSON, one line per text in the order of texts.
+
+    The request body is NDJSON with a JSON string or an object with "text"
+    and optional "text_id" per line, or a JSON `TextList` with the
+    "application/json" content type. The body may be streamed, the texts are
+    predicted in chunks as they arrive. Every response line has "index" of
+    the text, "predictions" and "text_id" if it was given. An error stops
+    the stream with an {"error": ...} line.
+
+    Args:
+        request (Request): The request.
+        raw (bool, optional): Send the raw predictions of the models instead
+        of the mapped class names. Defaults to False.
+
+    Returns:
+        PredictionStreamResponse: The NDJSON stream.
+    """
+    return PredictionStreamResponse(
+        request.headers.get("content-type", ""),
+        lambda items, start: predict_stream_chunk(items, start, raw),
+        app.state.config.get("stream_chunk_size", 64),
+        app.state.config.get("stream_max_in_flight_chunks", 4),
+    )
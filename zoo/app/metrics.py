@@ -0,0 +1,261 @@
+"""The module with the metrics of the Zoo in Prometheus text format.
+
+The metrics are plain counters in memory updated from the event loop, so
+they are cheap enough to be always on. They are rendered by `/metrics`.
+Texts per second is `rate(zoo_predicted_texts_total[1m])`.
+"""
+import bisect
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """The base of the metrics with the values per label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        """Init.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple[str, ...], optional): The label names. Defaults to ().
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def clear(self):
+        """Drop all the values."""
+        self.values.clear()
+
+    def render(self) -> list[str]:
+        """Render the metric in Prometheus text format.
+
+        Returns:
+            list[str]: The lines.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    """The monotonically increasing value."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, value: float = 1):
+        """Increase the counter.
+
+        Args:
+            *labels (str): The label values in the order of `labelnames`.
+            value (float, optional): The increment. Defaults to 1.
+        """
+        self.values[labels] = self.values.get(labels, 0) + value
+
+
+class Gauge(Metric):
+    """The value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        """Set the value.
+
+        Args:
+            *labels (str): The label values in the order of `labelnames`.
+            value (float): The value.
+        """
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    """The distribution of observed values over the buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        """Init.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple[str, ...], optional): The label names. Defaults to ().
+            buckets (tuple[float, ...], optional): The upper bounds of the
+            buckets, ascending. Defaults to LATENCY_BUCKETS.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # per label values: the counts per bucket (the last one is +Inf) and the sum
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, *labels: str, value: float):
+        """Count the observed value.
+
+        Args:
+            *labels (str): The label values in the order of `labelnames`.
+            value (float): The value.
+        """
+        if labels not in self.values:
+            self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self.values[labels]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def count(self, *labels: str) -> int:
+        """Get the number of observed values.
+
+        Args:
+            *labels (str): The label values in the order of `labelnames`.
+
+        Returns:
+            int: The number of values.
+        """
+        return sum(self.values[labels][0]) if labels in self.values else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total[0]}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The collection of the metrics rendered together."""
+
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Add the metric.
+
+        Args:
+            metric (Metric): The metric.
+
+        Returns:
+            Metric: The same metric.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render all the metrics in Prometheus text format.
+
+        Returns:
+            str: The exposition text.
+        """
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "zoo_http_requests_total", "The number of HTTP requests.", ("endpoint", "method", "status")
+))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "zoo_http_request_duration_seconds", "The latency of HTTP requests.", ("endpoint",)
+))
+MODEL_LATENCY = REGISTRY.register(Histogram(
+    "zoo_model_request_duration_seconds", "The latency of Triton inference requests.", ("model",)
+))
+MODEL_BATCH_SIZE = REGISTRY.register(Histogram(
+    "zoo_model_batch_size", "The number of texts in Triton inference requests.", ("model",),
+    buckets=BATCH_SIZE_BUCKETS,
+))
+MODEL_ERRORS = REGISTRY.register(Counter(
+    "zoo_model_errors_total", "The number of failed Triton inference requests.", ("model",)
+))
+MODEL_TIMEOUTS = REGISTRY.register(Counter(
+    "zoo_model_timeouts_total", "The number of model requests cut off by the request deadline.", ("model",)
+))
+HEDGED_BATCHES = REGISTRY.register(Counter(
+    "zoo_model_hedged_batches_total", "The number of batches sent again to cut the tail latency.", ("model",)
+))
+HEDGE_WINS = REGISTRY.register(Counter(
+    "zoo_model_hedge_wins_total", "The number of hedged batches answered first by the hedge.", ("model",)
+))
+PREDICTED_TEXTS = REGISTRY.register(Counter(
+    "zoo_predicted_texts_total", "The number of predicted texts."
+))
+QUEUED_TEXTS = REGISTRY.register(Gauge(
+    "zoo_batch_queue_texts", "The number of unprocessed texts in batch jobs."
+))
+IN_FLIGHT_TEXTS = REGISTRY.register(Gauge(
+    "zoo_in_flight_texts", "The number of texts of requests predicted by a model.", ("model",)
+))
+BATCH_SIZE_LIMIT = REGISTRY.register(Gauge(
+    "zoo_model_batch_size_limit", "The batch size used for a model replica.", ("model", "replica")
+))
+DELIVERY_LATENCY = REGISTRY.register(Histogram(
+    "zoo_platform_delivery_duration_seconds", "The latency of requests to the platform."
+))
+DELIVERY_FAILURES = REGISTRY.register(Counter(
+    "zoo_platform_delivery_failures_total",
+    "The number of failed requests to the platform by the kind of failure.", ("kind",)
+))
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting the requests and their latency per endpoint."""
+
+    def __init__(self, app: ASGIApp):
+        """Init.
+
+        Args:
+            app (ASGIApp): The wrapped app.
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the route template keeps the number of label values bounded
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.inc(endpoint, scope["method"], str(status))
+            HTTP_LATENCY.observe(endpoint, value=time.perf_counter() - start)
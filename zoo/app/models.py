@@ -1,5 +1,7 @@
 """The module with Pydantic data models."""
-from pydantic import BaseModel
+from typing import Literal, NamedTuple
+
+from pydantic import BaseModel, Field
 
 
 class TextList(BaseModel):
@@ -17,6 +19,12 @@ class TextToPredict(BaseModel):
     text: str
 
 
+class TextItem(NamedTuple):
+    """The lightweight text of a bulk request with the fields of TextToPredict."""
+    text_id: str
+    text: str
+
+
 class ServiceInput(BaseModel):
     """Expected input from the platform"""
     texts: list[TextToPredict]
@@ -28,7 +36,27 @@ class TritonServerAddr(BaseModel):
     url - base url.
     port - port of the service.
     model_name - model name that Triton has.
+    weight - the share of requests of this replica if the model has several ones.
+    protocol - http or grpc, the port must be the one of the protocol.
     """
     url: str
     port: str
     model_name: str
+    weight: int = Field(default=1, ge=1)
+    protocol: Literal["http", "grpc"] = "http"
+
+
+class JobInfo(BaseModel):
+    """The status of a batch prediction job.
+
+    job_id - id of the job.
+    status - one of queued, running, done, failed, cancelled.
+    done - the number of processed texts.
+    total - the number of texts in the job.
+    error - the error message of a failed job.
+    """
+    job_id: str
+    status: str
+    done: int
+    total: int
+    error: str | None = None
@@ -0,0 +1,166 @@
+"""The module with the post-processing of model predictions.
+
+The label mapping is compiled once into a `PostProcessor`. Models emit a
+small closed set of raw strings, so the split and mapped labels are
+memoized per raw string, and the prediction objects are shared between
+texts. The objects are immutable, so sharing them is safe.
+"""
+from typing import Iterable
+
+# the memo is dropped when it grows over this size, models emitting free text can't exhaust memory
+MAX_MEMO_SIZE = 100_000
+
+
+class PredictionObject(dict):
+    """The immutable prediction object for the platform: prediction and color."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("The prediction objects are shared and can't be changed")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+    __ior__ = _immutable
+
+    def __hash__(self):
+        return hash((self["prediction"], self["color"]))
+
+
+class PostProcessor:
+    """The label mapping of raw predictions shared by all the endpoints.
+
+    A raw prediction is split by the separator into class names, and the
+    names absent in the mapping are dropped. The irrelevant class is dropped
+    if there is any relevant one, and it's the only class if there are none.
+    """
+
+    def __init__(
+        self,
+        label_mapping: dict[str, tuple[str, str]],
+        separator: str = ";",
+        irrelevant_class_name: str = "нерелевантный",
+    ):
+        """Init.
+
+        Args:
+            label_mapping (dict[str, tuple[str, str]]): The mapping of class names,
+            the values are new class name and color hex code.
+            separator (str, optional): Separator for multilabel classes. Defaults to ";".
+            irrelevant_class_name (str, optional): The irrelevant class name.
+            Defaults to "нерелевантный".
+        """
+        if irrelevant_class_name not in label_mapping:
+            raise ValueError(f"The irrelevant class name '{irrelevant_class_name}' is not in label mapping")
+        self.label_mapping = label_mapping
+        self.separator = separator
+        self.irrelevant_class_name = irrelevant_class_name
+        self._objects = {
+            name: PredictionObject(prediction=new_name, color=color)
+            for name, (new_name, color) in label_mapping.items()
+        }
+        self._irrelevant = (self._objects[irrelevant_class_name],)
+        self._memo: dict[str, tuple[PredictionObject, ...]] = {}
+
+    def compiled_from(
+        self, label_mapping: dict[str, tuple[str, str]], separator: str, irrelevant_class_name: str
+    ) -> bool:
+        """Check if the post-processor is compiled from these settings.
+
+        Returns:
+            bool: True if it's the same mapping object and the same parameters.
+        """
+        return (
+            self.label_mapping is label_mapping
+            and self.separator == separator
+            and self.irrelevant_class_name == irrelevant_class_name
+        )
+
+    def map_raw(self, raw: str) -> tuple[PredictionObject, ...]:
+        """Split and map one raw prediction.
+
+        Args:
+            raw (str): The prediction of a model, e.g. "класс1;класс2".
+
+        Returns:
+            tuple[PredictionObject, ...]: The relevant mapped classes.
+        """
+        mapped = self._memo.get(raw)
+        if mapped is None:
+            mapped = tuple(
+                self._objects[name]
+                for name in raw.split(self.separator)
+                if name in self._objects and self._objects[name]["prediction"] != self.irrelevant_class_name
+            )
+            if len(self._memo) >= MAX_MEMO_SIZE:
+                self._memo.clear()
+            self._memo[raw] = mapped
+        return mapped
+
+    def normalize_line(self, pred_line: Iterable[str]) -> list[PredictionObject]:
+        """Map the predictions of all the models for one text.
+
+        Args:
+            pred_line (Iterable[str]): The raw predictions of one text.
+
+        Returns:
+            list[PredictionObject]: The mapped classes, the irrelevant class if
+            there are no relevant ones.
+        """
+        objects = [obj for raw in pred_line for obj in self.map_raw(raw)]
+        return objects or list(self._irrelevant)
+
+    def normalize(self, predictions: Iterable[Iterable[str]]) -> list[list[PredictionObject]]:
+        """Normalize the predictions of many texts.
+
+        Args:
+            predictions (Iterable[Iterable[str]]): A prediction list per each text.
+
+        Returns:
+            list[list[PredictionObject]]: The prediction objects per each text.
+        """
+        return [self.normalize_line(pred_line) for pred_line in predictions]
+
+    def normalize_columns(self, model_predictions: list[list[str]]) -> list[list[PredictionObject]]:
+        """Normalize the predictions given per model instead of per text.
+
+        Args:
+            model_predictions (list[list[str]]): A prediction list per each
+            model, every list is in the order of texts.
+
+        Returns:
+            list[list[PredictionObject]]: The prediction objects per each text.
+        """
+        return self.normalize(zip(*model_predictions))
+
+    def class_names(self, predictions: Iterable[Iterable[str]]) -> list[list[str]]:
+        """Normalize the predictions of many texts into class names only.
+
+        Args:
+            predictions (Iterable[Iterable[str]]): A prediction list per each text.
+
+        Returns:
+            list[list[str]]: The mapped class names per each text.
+        """
+        return [[obj["prediction"] for obj in self.normalize_line(line)] for line in predictions]
+
+
+_last_compiled: PostProcessor | None = None
+
+
+def get_postprocessor(
+    label_mapping: dict[str, tuple[str, str]], separator: str, irrelevant_class_name: str
+) -> PostProcessor:
+    """Get the post-processor for the settings, it's compiled again only when they change.
+
+    Args:
+        label_mapping (dict[str, tuple[str, str]]): The mapping of class names.
+        separator (str): Separator for multilabel classes.
+        irrelevant_class_name (str): The irrelevant class name.
+
+    Returns:
+        PostProcessor: The compiled post-processor.
+    """
+    global _last_compiled
+    if _last_compiled is None or not _last_compiled.compiled_from(
+        label_mapping, separator, irrelevant_class_name
+    ):
+        _last_compiled = PostProcessor(label_mapping, separator, irrelevant_class_name)
+    return _last_compiled
@@ -0,0 +1,226 @@
+"""The module with the registry of Triton services shared by the Zoo workers.
+
+The services and the settings changed by the API, e.g. the platform
+endpoint, are kept in a SQLite file. Every change increments the version
+of the registry in the same transaction. Every worker polls the version
+and makes its connected models match the registry when it changes, so
+the workers of one host, or the containers sharing the file, don't drift
+apart.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable
+
+from app.connections import service_key
+from app.models import TritonServerAddr
+from app.sqlite_file import SQLiteFile
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry(SQLiteFile):
+    """SQLite registry of Triton services and settings with a version."""
+
+    def __init__(self, path: str):
+        """Init.
+
+        Args:
+            path (str): The path to the SQLite file.
+        """
+        super().__init__(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS services (
+                model_name TEXT NOT NULL,
+                base TEXT NOT NULL,
+                url TEXT NOT NULL,
+                port TEXT NOT NULL,
+                weight INTEGER NOT NULL,
+                protocol TEXT NOT NULL,
+                PRIMARY KEY (model_name, base)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS version (version INTEGER NOT NULL)")
+        with self._lock, self._transaction():
+            if self._conn.execute("SELECT COUNT(*) FROM version").fetchone()[0] == 0:
+                self._conn.execute("INSERT INTO version VALUES (0)")
+
+    def _bump(self):
+        """Increment the version, in the transaction of the change."""
+        self._conn.execute("UPDATE version SET version = version + 1")
+
+    def version(self) -> int:
+        """Get the version of the registry.
+
+        Returns:
+            int: The number of changes made.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT version FROM version").fetchone()[0]
+
+    def seed(self, services: list[TritonServerAddr], settings: dict[str, Any]) -> bool:
+        """Fill the registry on the first start, a filled one is not changed.
+
+        Args:
+            services (list[TritonServerAddr]): The services from the config.
+            settings (dict[str, Any]): The settings from the config.
+
+        Returns:
+            bool: True if the registry was empty and is filled now.
+        """
+        with self._lock, self._transaction():
+            if self._conn.execute("SELECT version FROM version").fetchone()[0] > 0:
+                return False
+            self._insert_services(services)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO settings VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in settings.items()],
+            )
+            self._bump()
+        return True
+
+    def _insert_services(self, services: list[TritonServerAddr]) -> int:
+        """Insert the absent services, the lock and the transaction must be held."""
+        changes = self._conn.total_changes
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO services VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (*service_key(server), server.url, server.port, server.weight, server.protocol)
+                for server in services
+            ],
+        )
+        return self._conn.total_changes - changes
+
+    def add_service(self, server: TritonServerAddr) -> bool:
+        """Add the service.
+
+        Args:
+            server (TritonServerAddr): The address of the service.
+
+        Returns:
+            bool: True if it's added, False if it's already registered.
+        """
+        with self._lock, self._transaction():
+            added = self._insert_services([server]) > 0
+            if added:
+                self._bump()
+        return added
+
+    def remove_services(self, model_name: str, base: str | None = None) -> bool:
+        """Remove the services of the model.
+
+        Args:
+            model_name (str): The model name.
+            base (str | None, optional): The base url of the replica, all the
+            replicas of the model if None. Defaults to None.
+
+        Returns:
+            bool: True if any service was removed.
+        """
+        with self._lock, self._transaction():
+            if base is None:
+                cursor = self._conn.execute("DELETE FROM services WHERE model_name = ?", (model_name,))
+            else:
+                cursor = self._conn.execute(
+                    "DELETE FROM services WHERE model_name = ? AND base = ?", (model_name, base)
+                )
+            if cursor.rowcount > 0:
+                self._bump()
+        return cursor.rowcount > 0
+
+    def set_setting(self, key: str, value: Any):
+        """Change the setting.
+
+        Args:
+            key (str): The name of the setting, e.g. "endpoint_to_send_preds".
+            value (Any): The JSON value.
+        """
+        with self._lock, self._transaction():
+            self._conn.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (key, json.dumps(value)))
+            self._bump()
+
+    def snapshot(self) -> tuple[int, list[TritonServerAddr], dict[str, Any]]:
+        """Read the whole registry at once.
+
+        Returns:
+            tuple[int, list[TritonServerAddr], dict[str, Any]]: The version,
+            the services in the order they were added and the settings.
+        """
+        with self._lock, self._transaction():
+            version = self._conn.execute("SELECT version FROM version").fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT url, port, model_name, weight, protocol FROM services ORDER BY rowid"
+            ).fetchall()
+            settings = self._conn.execute("SELECT key, value FROM settings").fetchall()
+        services = [
+            TritonServerAddr(url=url, port=port, model_name=model_name, weight=weight, protocol=protocol)
+            for url, port, model_name, weight, protocol in rows
+        ]
+        return version, services, {key: json.loads(value) for key, value in settings}
+
+class RegistryWatcher:
+    """Background check of the registry version, the changes are applied by the callback."""
+
+    def __init__(
+        self,
+        registry: ServiceRegistry,
+        apply: Callable[[list[TritonServerAddr], dict[str, Any]], Awaitable[None]],
+        interval: float = 1.0,
+    ):
+        """Init.
+
+        Args:
+            registry (ServiceRegistry): The registry.
+            apply (Callable[[list[TritonServerAddr], dict[str, Any]], Awaitable[None]]):
+            The coroutine function making the worker match the services and settings.
+            interval (float, optional): The time between checks in seconds. Defaults to 1.0.
+        """
+        self.registry = registry
+        self.apply = apply
+        self.interval = interval
+        self.version: int | None = None
+        self._task: asyncio.Task | None = None
+
+    async def check(self) -> bool:
+        """Apply the registry if its version changed since the last check.
+
+        Returns:
+            bool: True if the registry was applied.
+        """
+        version = await asyncio.to_thread(self.registry.version)
+        if version == self.version:
+            return False
+        version, services, settings = await asyncio.to_thread(self.registry.snapshot)
+        await self.apply(services, settings)
+        self.version = version
+        logger.info(f"Applied the registry version {version}")
+        return True
+
+    async def start(self, version: int | None = None):
+        """Start the checks.
+
+        Args:
+            version (int | None, optional): The version already applied. Defaults to None.
+        """
+        self.version = version
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the checks."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Registry check failed")
@@ -0,0 +1,281 @@
+"""The module with the replica groups of Triton models.
+
+A replica group is one logical model served by several Triton services.
+It has the same interface as the client, so the rest of the Zoo treats
+it as one model, while the batches are dispatched across the replicas.
+"""
+import asyncio
+import logging
+import time
+
+from app.async_triton_api_client import AsyncTritonApiClient
+from app.hedging import Hedger
+from app.triton_api_client import LENGTH, batch_end, length_order, restore_order
+
+LEAST_OUTSTANDING = "least_outstanding"
+ROUND_ROBIN = "round_robin"
+BALANCING = (LEAST_OUTSTANDING, ROUND_ROBIN)
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaGroup:
+    """The Triton services of one model with load balancing between them.
+
+    With "least_outstanding" balancing a batch goes to the replica with the
+    fewest batches in flight per unit of weight. With "round_robin" the
+    batches are spread in proportion to the weights (smooth weighted
+    round robin). Every replica gets batches of its own `batch_size`
+    and `max_batch_chars`, the batching strategy is the one of the replicas.
+
+    With hedging a batch that didn't return by the `hedge_quantile` of the
+    model latency is sent again, to the least loaded other replica or to the
+    same one if it's alone, and the first answer is taken.
+
+    A replica that failed a batch is ejected for `eject_time`, it gets no
+    batches meanwhile unless all the replicas are ejected. The failed batch
+    is sent once more to another replica before the model fails.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        balancing: str = LEAST_OUTSTANDING,
+        hedge_quantile: float | None = None,
+        hedge_budget: float = 0.05,
+        eject_time: float = 10.0,
+    ):
+        """Init.
+
+        Args:
+            model_name (str): The model name.
+            balancing (str, optional): "least_outstanding" or "round_robin".
+            Defaults to "least_outstanding".
+            hedge_quantile (float | None, optional): The quantile of the batch
+            latency after which a batch is hedged, None disables hedging.
+            Defaults to None.
+            hedge_budget (float, optional): The max share of the hedged batches.
+            Defaults to 0.05.
+            eject_time (float, optional): The time in seconds a failed replica
+            gets no batches. Defaults to 10.0.
+        """
+        if balancing not in BALANCING:
+            raise ValueError(f"Unknown balancing '{balancing}', expected one of {BALANCING}")
+        self.model_name = model_name
+        self.balancing = balancing
+        self.replicas: list[AsyncTritonApiClient] = []
+        self.weights: list[int] = []
+        self.outstanding: list[int] = []
+        self.ejected_until: list[float] = []
+        self.eject_time = eject_time
+        self._current: list[int] = []
+        self._next = 0
+        self.hedger = Hedger(model_name, hedge_quantile, hedge_budget) if hedge_quantile else None
+
+    @property
+    def model_version(self) -> str:
+        """The version of the model, the replicas are expected to serve the same one."""
+        return self.replicas[0].model_version if self.replicas else ""
+
+    @property
+    def max_batch_size(self) -> int:
+        """The largest batch one replica takes."""
+        return max(replica.max_batch_size for replica in self.replicas)
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def add(self, replica: AsyncTritonApiClient, weight: int = 1):
+        """Add the replica.
+
+        Args:
+            replica (AsyncTritonApiClient): The connected client.
+            weight (int, optional): The share of batches relative to other
+            replicas. Defaults to 1.
+        """
+        self.replicas.append(replica)
+        self.weights.append(weight)
+        self.outstanding.append(0)
+        self.ejected_until.append(0.0)
+        self._current.append(0)
+
+    def find(self, base: str) -> AsyncTritonApiClient | None:
+        """Find the replica by its base url.
+
+        Args:
+            base (str): The base url of the client, e.g. "http://host:8000/v2".
+
+        Returns:
+            AsyncTritonApiClient | None: The replica, None if there is no such one.
+        """
+        return next((replica for replica in self.replicas if replica.base == base), None)
+
+    def remove(self, replica: AsyncTritonApiClient):
+        """Remove the replica, its batches in flight are finished.
+
+        Args:
+            replica (AsyncTritonApiClient): The replica of the group.
+        """
+        i = self.replicas.index(replica)
+        for values in (self.replicas, self.weights, self.outstanding, self.ejected_until, self._current):
+            values.pop(i)
+
+    def _available(self) -> list[int]:
+        """Get the indices of the replicas that are not ejected, all of them if every one is."""
+        now = time.monotonic()
+        available = [i for i in range(len(self.replicas)) if self.ejected_until[i] <= now]
+        return available or list(range(len(self.replicas)))
+
+    def _eject(self, replica: AsyncTritonApiClient):
+        """Stop sending batches to the failed replica for `eject_time`."""
+        if replica in self.replicas:
+            self.ejected_until[self.replicas.index(replica)] = time.monotonic() + self.eject_time
+
+    def _pick(self) -> AsyncTritonApiClient:
+        """Choose the replica for the next batch."""
+        n = len(self.replicas)
+        available = self._available()
+        if self.balancing == ROUND_ROBIN:
+            for i in available:
+                self._current[i] += self.weights[i]
+            best = max(available, key=lambda i: self._current[i])
+            self._current[best] -= sum(self.weights[i] for i in available)
+        else:
+            # the scan starts from the next replica each time to spread the ties
+            order = [(self._next + i) % n for i in range(n)]
+            best = min(
+                (i for i in order if i in available),
+                key=lambda i: self.outstanding[i] / self.weights[i],
+            )
+            self._next = (best + 1) % n
+        return self.replicas[best]
+
+    def _pick_other(
+        self, replica: AsyncTritonApiClient, batch: list[str]
+    ) -> AsyncTritonApiClient | None:
+        """Choose the least loaded available replica other than `replica` taking the batch."""
+        others = [
+            i for i in self._available()
+            if self.replicas[i] is not replica and self.replicas[i].max_batch_size >= len(batch)
+        ]
+        if not others:
+            return None
+        return self.replicas[min(others, key=lambda i: self.outstanding[i] / self.weights[i])]
+
+    def _pick_backup(self, replica: AsyncTritonApiClient, batch: list[str]) -> AsyncTritonApiClient:
+        """Choose the replica for the hedge of the batch sent to `replica`."""
+        return self._pick_other(replica, batch) or replica
+
+    def _send(self, replica: AsyncTritonApiClient, batch: list[str]) -> asyncio.Task:
+        """Send the batch to the replica, it's counted as outstanding until it's finished.
+
+        Args:
+            replica (AsyncTritonApiClient): The replica.
+            batch (list[str]): The texts of the batch.
+
+        Returns:
+            asyncio.Task: The task of the batch.
+        """
+        self.outstanding[self.replicas.index(replica)] += 1
+
+        def done(_):
+            if replica in self.replicas:
+                self.outstanding[self.replicas.index(replica)] -= 1
+
+        task = asyncio.ensure_future(replica.make_prediction_on_batch(batch))
+        task.add_done_callback(done)
+        return task
+
+    async def _send_with_retry(self, replica: AsyncTritonApiClient, batch: list[str]) -> list[str]:
+        """Send the batch to the replica, and once more to another one if it fails.
+
+        Args:
+            replica (AsyncTritonApiClient): The replica.
+            batch (list[str]): The texts of the batch.
+
+        Returns:
+            list[str]: The predictions of the batch.
+        """
+        try:
+            return await self._send(replica, batch)
+        except Exception as e:
+            self._eject(replica)
+            other = self._pick_other(replica, batch)
+            if other is None:
+                raise
+            logger.warning(
+                f"The replica {replica.base} of the model {self.model_name} failed: {e!r}, "
+                f"the batch is sent to {other.base}"
+            )
+        try:
+            return await self._send(other, batch)
+        except Exception:
+            self._eject(other)
+            raise
+
+    def _dispatch(self, texts: list[str], start: int) -> tuple[asyncio.Task, int]:
+        """Send the next batch of the texts to the chosen replica, hedged if it's enabled.
+
+        Args:
+            texts (list[str]): All the texts.
+            start (int): The index of the first text of the batch.
+
+        Returns:
+            tuple[asyncio.Task, int]: The task of the batch and the batch end index.
+        """
+        replica = self._pick()
+        end = batch_end(texts, start, replica.batch_size, replica.max_batch_chars)
+        batch = texts[start:end]
+        if self.hedger is None:
+            return asyncio.ensure_future(self._send_with_retry(replica, batch)), end
+        task = asyncio.ensure_future(self.hedger.run(
+            lambda: self._send_with_retry(replica, batch),
+            lambda: self._send_with_retry(self._pick_backup(replica, batch), batch),
+        ))
+        return task, end
+
+    async def make_prediction(self, texts: list[str]) -> list[str]:
+        """Request the predictions, spreading the batches across the replicas.
+
+        Args:
+            texts (list[str]): The list of texts with arbitrary length.
+
+        Returns:
+            list[str]: A list of predictions.
+        """
+        if not self.replicas:
+            raise RuntimeError(f"The model {self.model_name} has no replicas")
+        if len(self.replicas) == 1 and self.hedger is None:
+            return await self.replicas[0].make_prediction(texts)
+        order = length_order(texts) if self.replicas[0].batching == LENGTH else None
+        if order is not None:
+            texts = [texts[i] for i in order]
+        tasks = []
+        start = 0
+        while start < len(texts):
+            task, start = self._dispatch(texts, start)
+            tasks.append(task)
+        try:
+            chunks = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        preds = [pred for chunk in chunks for pred in chunk]
+        return preds if order is None else restore_order(preds, order)
+
+    async def is_ready(self) -> bool:
+        """Check if any replica is ready to receive requests.
+
+        Returns:
+            bool: True if yes, False otherwise.
+        """
+        results = await asyncio.gather(
+            *(replica.is_ready() for replica in self.replicas), return_exceptions=True
+        )
+        return any(result is True for result in results)
+
+    async def close_connection(self):
+        """Close the connections of all the replicas."""
+        for replica in self.replicas:
+            await replica.close_connection()
@@ -0,0 +1,158 @@
+"""The module with the scheduler of prediction requests to Triton models."""
+import asyncio
+import logging
+import time
+
+from app.cache import Predictor
+from app.health import HealthMonitor
+from app.metrics import MODEL_TIMEOUTS
+from app.utils import merge_model_predictions
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """No model answered before the deadline of the request."""
+
+
+class ModelsUnavailable(Exception):
+    """Some model can't answer now, the texts should be predicted again later."""
+
+
+async def predict_with_models(
+    models: list[Predictor], texts: list[str], health: HealthMonitor
+) -> list[list[str]]:
+    """Collect predictions from all the models concurrently, every model must answer.
+
+    It's for the batch jobs, the predictions sent to the platform can't
+    miss a model. Each model gets the texts in chunks of its
+    `max_batch_size`, and the number of chunks in flight per model is
+    bounded by the model client. The results are recorded in the health
+    monitor.
+
+    Args:
+        models (list[Predictor]): The predictors of the models.
+        texts (list[str]): The texts to be predicted.
+        health (HealthMonitor): The monitor keeping the model states.
+
+    Raises:
+        ModelsUnavailable: If there are no models, a model has an open circuit
+        or fails. The requests to the other models are cancelled then.
+
+    Returns:
+        list[list[str]]: A prediction list per each text, predictions are in
+        the order of models.
+    """
+    if not models:
+        raise ModelsUnavailable("No models are connected")
+    allowed = [tr for tr in models if health.breaker(tr.model_name).allow_request()]
+    if len(allowed) < len(models):
+        for tr in allowed:
+            health.abandon(tr.model_name)
+        down = [tr.model_name for tr in models if tr not in allowed]
+        raise ModelsUnavailable(f"The models {down} are unavailable")
+    tasks = [asyncio.ensure_future(tr.make_prediction(texts)) for tr in models]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    except BaseException:
+        for tr, task in zip(models, tasks):
+            task.cancel()
+            health.abandon(tr.model_name)
+        raise
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    error = None
+    for tr, task in zip(models, tasks):
+        if task in pending:
+            health.abandon(tr.model_name)
+        elif task.cancelled():
+            raise asyncio.CancelledError()
+        elif task.exception() is not None:
+            health.record(tr.model_name, False)
+            error = error or ModelsUnavailable(f"The model {tr.model_name} failed: {task.exception()!r}")
+        else:
+            health.record(tr.model_name, True)
+    if error is not None:
+        raise error
+    return merge_model_predictions([task.result() for task in tasks], len(texts))
+
+
+async def predict_with_available_models(
+    models: list[Predictor], texts: list[str], health: HealthMonitor, timeout: float | None = None
+) -> tuple[list[list[str]], list[str]]:
+    """Collect predictions from the models that are not known to be down.
+
+    The models with an open circuit are skipped. A model failing on the
+    request is skipped too, its failure is recorded in the health monitor,
+    so the predictions of the other models are still returned.
+
+    The models that didn't answer within `timeout` are cancelled, so their
+    remaining batches are not sent, and skipped. It's not recorded as a
+    failure, since the timeout is set by the caller, but the half-open trial
+    of such a model is released, so the circuit is tried again later.
+
+    Args:
+        models (list[Predictor]): The predictors of the models.
+        texts (list[str]): The texts to be predicted.
+        health (HealthMonitor): The monitor keeping the model states.
+        timeout (float | None, optional): The deadline of the request in seconds,
+        None for no deadline. Defaults to None.
+
+    Raises:
+        DeadlineExceeded: If no model answered and some were cut off by the deadline.
+
+    Returns:
+        tuple[list[list[str]], list[str]]: A prediction list per each text in
+        the order of the answered models, and the names of the skipped models.
+    """
+    available = [tr for tr in models if health.breaker(tr.model_name).allow_request()]
+    skipped = [tr.model_name for tr in models if tr not in available]
+    start = time.perf_counter()
+    model_ms = {}
+    tasks = []
+    for tr in available:
+        task = asyncio.ensure_future(tr.make_prediction(texts))
+        task.add_done_callback(
+            lambda _, name=tr.model_name: model_ms.setdefault(
+                name, round(1000 * (time.perf_counter() - start), 1)
+            )
+        )
+        tasks.append(task)
+    pending = set()
+    if tasks:
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+        except BaseException:
+            for tr, task in zip(available, tasks):
+                task.cancel()
+                health.abandon(tr.model_name)
+            raise
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    model_predictions = []
+    timed_out = []
+    for tr, task in zip(available, tasks):
+        if task in pending:
+            logger.warning(f"The model {tr.model_name} didn't answer in {timeout} s")
+            MODEL_TIMEOUTS.inc(tr.model_name)
+            health.abandon(tr.model_name)
+            timed_out.append(tr.model_name)
+            skipped.append(tr.model_name)
+        elif task.cancelled():
+            raise asyncio.CancelledError()
+        elif task.exception() is not None:
+            logger.error(f"The model {tr.model_name} failed: {task.exception()!r}")
+            health.record(tr.model_name, False)
+            skipped.append(tr.model_name)
+        else:
+            health.record(tr.model_name, True)
+            model_predictions.append(task.result())
+    logger.info(
+        f"Predicted {len(texts)} texts",
+        extra={"texts": len(texts), "model_ms": model_ms, "skipped_models": skipped},
+    )
+    if timed_out and not model_predictions:
+        raise DeadlineExceeded(f"The models {timed_out} didn't answer in {timeout} s")
+    return merge_model_predictions(model_predictions, len(texts)), skipped
@@ -0,0 +1,183 @@
+"""The module with the fast serialization of the bulk requests and responses.
+
+The bodies are parsed and rendered with orjson. The bulk payloads are
+checked by plain type checks instead of building a Pydantic object per
+text, the slow Pydantic validation runs only for invalid payloads to
+report the same errors as before. Internal callers can send and accept
+msgpack with the "application/x-msgpack" content type.
+"""
+import json
+from typing import Any
+
+import msgpack
+import orjson
+from fastapi import Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ValidationError
+
+from app.models import ServiceInput, TextItem, TextList
+
+JSON = "application/json"
+MSGPACK = "application/x-msgpack"
+
+
+class MsgpackResponse(Response):
+    """The response with msgpack body."""
+
+    media_type = MSGPACK
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content)
+
+
+async def read_body(request: Request) -> Any:
+    """Parse the request body by its content type, JSON by default.
+
+    Args:
+        request (Request): The request.
+
+    Raises:
+        RequestValidationError: If the body can't be parsed, as FastAPI does.
+
+    Returns:
+        Any: The parsed body.
+    """
+    body = await request.body()
+    if not body:
+        raise RequestValidationError([{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}])
+    if request.headers.get("content-type", "").startswith(MSGPACK):
+        try:
+            return msgpack.unpackb(body)
+        except Exception as e:
+            raise RequestValidationError([
+                {"type": "msgpack_invalid", "loc": ("body",), "msg": "msgpack decode error",
+                 "input": {}, "ctx": {"error": str(e)}}
+            ])
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError:
+        pass
+    # the standard parser is only used for the error message FastAPI gives
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise RequestValidationError([
+            {"type": "json_invalid", "loc": ("body", getattr(e, "pos", 0)), "msg": "JSON decode error",
+             "input": {}, "ctx": {"error": getattr(e, "msg", str(e))}}
+        ])
+
+
+def _validate(model: type[BaseModel], data: Any) -> BaseModel:
+    """Validate the payload by the model, the errors are the usual errors of FastAPI."""
+    try:
+        return model.model_validate(data, from_attributes=True)
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+
+
+def parse_text_list(data: Any) -> TextList:
+    """Check the body of a text list request.
+
+    Args:
+        data (Any): The parsed body.
+
+    Raises:
+        RequestValidationError: If the body is not a `TextList`.
+
+    Returns:
+        TextList: The texts.
+    """
+    texts = data.get("text_list") if type(data) is dict else None
+    if type(texts) is list and all(type(text) is str for text in texts):
+        return TextList.model_construct(text_list=texts)
+    return _validate(TextList, data)
+
+
+def parse_service_input(data: Any) -> ServiceInput:
+    """Check the body of a batch request.
+
+    The texts are `TextItem` tuples, they have the same fields as
+    `TextToPredict` and are much cheaper to create for 10k+ texts.
+
+    Args:
+        data (Any): The parsed body.
+
+    Raises:
+        RequestValidationError: If the body is not a `ServiceInput`.
+
+    Returns:
+        ServiceInput: The texts.
+    """
+    items = data.get("texts") if type(data) is dict else None
+    if type(items) is list and all(
+        type(item) is dict and type(item.get("text_id")) is str and type(item.get("text")) is str
+        for item in items
+    ):
+        return ServiceInput.model_construct(
+            texts=[TextItem(item["text_id"], item["text"]) for item in items]
+        )
+    return _validate(ServiceInput, data)
+
+
+async def text_list_body(request: Request) -> TextList:
+    """The dependency parsing the `TextList` body of the request."""
+    return parse_text_list(await read_body(request))
+
+
+async def service_input_body(request: Request) -> ServiceInput:
+    """The dependency parsing the `ServiceInput` body of the request."""
+    return parse_service_input(await read_body(request))
+
+
+def render(
+    request: Request | None, content: Any, response: Response | None = None, status_code: int = 200
+) -> Response | Any:
+    """Render the content in the format the client accepts.
+
+    Args:
+        request (Request | None): The request, None if the endpoint is called
+        as a function, then the content is returned as is.
+        content (Any): The content.
+        response (Response | None, optional): The response of the endpoint set
+        by FastAPI, its headers are copied. Defaults to None.
+        status_code (int, optional): The status code. Defaults to 200.
+
+    Returns:
+        Response | Any: The msgpack response if the client accepts it, the JSON one otherwise.
+    """
+    if request is None:
+        return content
+    headers = dict(response.headers) if response is not None else None
+    if headers is not None:
+        # the length is computed again for the new body
+        headers.pop("content-length", None)
+    response_class = MsgpackResponse if MSGPACK in request.headers.get("accept", "") else ORJSONResponse
+    return response_class(content, status_code=status_code, headers=headers)
+
+
+def _inline_refs(schema: Any, defs: dict) -> Any:
+    """Replace the references to the nested models by their schemas."""
+    if isinstance(schema, dict):
+        if "$ref" in schema:
+            return _inline_refs(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+        return {key: _inline_refs(value, defs) for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [_inline_refs(value, defs) for value in schema]
+    return schema
+
+
+def request_body(model: type[BaseModel]) -> dict:
+    """Describe the request body parsed by a dependency for OpenAPI.
+
+    Args:
+        model (type[BaseModel]): The model of the body.
+
+    Returns:
+        dict: The `openapi_extra` of the route.
+    """
+    schema = model.model_json_schema()
+    content = {"schema": _inline_refs(schema, schema.pop("$defs", {}))}
+    return {"requestBody": {"required": True, "content": {JSON: content, MSGPACK: content}}}
@@ -0,0 +1,48 @@
+"""The module with the base of the SQLite files shared by the Zoo workers."""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteFile:
+    """SQLite connection used by the threads of one worker.
+
+    The file is opened in WAL mode, so the readers of other workers are not
+    blocked by a writer. The statements of this worker are serialized by
+    `_lock`, which must be held around every use of `_conn`.
+    """
+
+    def __init__(self, path: str):
+        """Init.
+
+        Args:
+            path (str): The path to the SQLite file, its directory is created
+            if needed. ":memory:" for a database in memory.
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    @contextmanager
+    def _transaction(self):
+        """Run the statements in one transaction, the lock must be held.
+
+        The write lock of the file is taken at once, so the workers writing
+        at the same time wait for each other instead of failing.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def close(self):
+        """Close the SQLite connection."""
+        with self._lock:
+            self._conn.close()
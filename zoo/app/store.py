@@ -0,0 +1,207 @@
+"""The module with the persistent on-disk store of model predictions.
+
+The store is a SQLite file that survives Zoo restarts. It's compacted by
+the command
+
+    python -m app.store compact [--config config/config.yml]
+"""
+import argparse
+import asyncio
+import time
+
+import yaml
+
+from app.cache import Predictor, hash_text
+from app.sqlite_file import SQLiteFile
+from app.utils import check_predictions_count
+
+# SQLite limits the number of query parameters
+_QUERY_CHUNK = 500
+
+
+class PredictionStore(SQLiteFile):
+    """SQLite store of raw predictions keyed by model identity and text hash.
+
+    When the store grows over `max_entries`, the least recently used
+    predictions are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1_000_000):
+        """Init.
+
+        Args:
+            path (str): The path to the SQLite file.
+            max_entries (int, optional): The max number of stored predictions.
+            Defaults to 1_000_000.
+        """
+        super().__init__(path)
+        self.max_entries = max_entries
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS predictions (
+                model_name TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                prediction TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model_name, model_version, text_hash)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used)"
+        )
+        # the size is kept in the file by triggers, so it's shared by the workers
+        self._conn.execute("CREATE TABLE IF NOT EXISTS store_size (size INTEGER NOT NULL)")
+        with self._lock, self._transaction():
+            if self._conn.execute("SELECT COUNT(*) FROM store_size").fetchone()[0] == 0:
+                self._conn.execute("INSERT INTO store_size SELECT COUNT(*) FROM predictions")
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS predictions_insert AFTER INSERT ON predictions "
+                "BEGIN UPDATE store_size SET size = size + 1; END"
+            )
+            self._conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS predictions_delete AFTER DELETE ON predictions "
+                "BEGIN UPDATE store_size SET size = size - 1; END"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._get_size()
+
+    def _get_size(self) -> int:
+        """Get the number of stored predictions, the lock must be held."""
+        return self._conn.execute("SELECT size FROM store_size").fetchone()[0]
+
+    def get_many(self, model_id: tuple[str, str], hashes: list[bytes]) -> dict[bytes, str]:
+        """Get the stored predictions and mark them as used.
+
+        Args:
+            model_id (tuple[str, str]): The model name and version.
+            hashes (list[bytes]): The text hashes.
+
+        Returns:
+            dict[bytes, str]: The predictions of found hashes.
+        """
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), _QUERY_CHUNK):
+                chunk = hashes[i : i + _QUERY_CHUNK]
+                rows = self._conn.execute(
+                    "SELECT text_hash, prediction FROM predictions "
+                    "WHERE model_name = ? AND model_version = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    (*model_id, *chunk),
+                )
+                found.update(rows)
+            if found:
+                now = time.time()
+                with self._transaction():
+                    self._conn.executemany(
+                        "UPDATE predictions SET last_used = ? "
+                        "WHERE model_name = ? AND model_version = ? AND text_hash = ?",
+                        [(now, *model_id, h) for h in found],
+                    )
+        return found
+
+    def put_many(self, model_id: tuple[str, str], items: dict[bytes, str]):
+        """Store the predictions, evict the oldest ones if the store is full.
+
+        Args:
+            model_id (tuple[str, str]): The model name and version.
+            items (dict[bytes, str]): The predictions by text hashes.
+        """
+        now = time.time()
+        with self._lock:
+            with self._transaction():
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                    [(*model_id, h, pred, now) for h, pred in items.items()],
+                )
+                # the size includes the predictions stored by other workers
+                size = self._get_size()
+                if size > self.max_entries:
+                    self._evict(size - self.max_entries)
+
+    def _evict(self, n: int):
+        """Delete the least recently used predictions.
+
+        Args:
+            n (int): The number of predictions to delete.
+        """
+        self._conn.execute(
+            "DELETE FROM predictions WHERE rowid IN "
+            "(SELECT rowid FROM predictions ORDER BY last_used LIMIT ?)",
+            (n,),
+        )
+
+    def compact(self):
+        """Evict the predictions over the limit and shrink the file."""
+        with self._lock:
+            with self._transaction():
+                size = self._get_size()
+                if size > self.max_entries:
+                    self._evict(size - self.max_entries)
+            self._conn.execute("VACUUM")
+
+
+class StoredPredictor:
+    """The predictor behind the persistent store.
+
+    The store is read in a thread, so the event loop isn't blocked by the
+    file. The missing predictions are stored after they are predicted.
+    """
+
+    def __init__(self, store: PredictionStore, predictor: Predictor, model_id: tuple[str, str]):
+        """Init.
+
+        Args:
+            store (PredictionStore): The store.
+            predictor (Predictor): The predictor for missing texts.
+            model_id (tuple[str, str]): The model name and version.
+        """
+        self.store = store
+        self.predictor = predictor
+        self.model_name = predictor.model_name
+        self.model_id = model_id
+
+    async def make_prediction(self, texts: list[str]) -> list[str]:
+        """Get the predictions from the store, predict and store the missing ones.
+
+        Args:
+            texts (list[str]): The texts.
+
+        Returns:
+            list[str]: The predictions.
+        """
+        hashes = [hash_text(text) for text in texts]
+        found = await asyncio.to_thread(self.store.get_many, self.model_id, hashes)
+        missing = [i for i, h in enumerate(hashes) if h not in found]
+        if missing:
+            preds = await self.predictor.make_prediction([texts[i] for i in missing])
+            check_predictions_count(preds, len(missing))
+            new_items = {hashes[i]: pred for i, pred in zip(missing, preds)}
+            await asyncio.to_thread(self.store.put_many, self.model_id, new_items)
+            found.update(new_items)
+        return [found[h] for h in hashes]
+
+
+def main():
+    """Command line interface of the store."""
+    parser = argparse.ArgumentParser(description="Maintain the Zoo prediction store.")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--config", default="config/config.yml", help="The Zoo config file.")
+    args = parser.parse_args()
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+    if not config.get("store_path"):
+        parser.error("store_path is not set in the config")
+    store = PredictionStore(config["store_path"], config.get("store_max_entries", 1_000_000))
+    store.compact()
+    print(f"The store {config['store_path']} is compacted, {len(store)} predictions left")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
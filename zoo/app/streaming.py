@@ -0,0 +1,224 @@
+"""The module with the streaming of predictions as NDJSON.
+
+The request body is read as it arrives, the texts are predicted in chunks,
+and one JSON line per text is sent as soon as its chunk is predicted. The
+memory is bounded: only `max_buffered` parts of the body and
+`max_in_flight` chunks are kept at once, a slow client slows the reading
+of the body. When the client disconnects, the chunks in flight are
+cancelled.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.models import TextList
+
+logger = logging.getLogger(__name__)
+
+# a text with an optional id, the id is sent back with its predictions
+StreamItem = tuple[str | None, str]
+PredictChunk = Callable[[list[StreamItem], int], Awaitable[list[dict]]]
+
+
+class StreamError(Exception):
+    """The error reported to the client in the last line of the stream."""
+
+
+def parse_line(line: bytes) -> StreamItem | None:
+    """Parse a line of the NDJSON request body.
+
+    A line is either a JSON string with the text or an object with "text"
+    and optional "text_id".
+
+    Args:
+        line (bytes): The line.
+
+    Raises:
+        StreamError: If the line is not a text.
+
+    Returns:
+        StreamItem | None: The text id and the text, None for an empty line.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        raise StreamError(f"Invalid JSON line: {e}")
+    if isinstance(item, str):
+        return None, item
+    if isinstance(item, dict) and isinstance(item.get("text"), str):
+        text_id = item.get("text_id")
+        return (None if text_id is None else str(text_id)), item["text"]
+    raise StreamError("A line must be a JSON string or an object with \"text\"")
+
+
+class PredictionStreamResponse(Response):
+    """The response predicting the texts of the request body chunk by chunk.
+
+    The body is NDJSON of texts, or a JSON `TextList` if the content type
+    is "application/json". The lines of the response are made by
+    `predict_chunk` and sent in the order of the texts.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def __init__(
+        self,
+        content_type: str,
+        predict_chunk: PredictChunk,
+        chunk_size: int = 64,
+        max_in_flight: int = 4,
+        max_buffered: int = 16,
+    ):
+        """Init.
+
+        Args:
+            content_type (str): The content type of the request.
+            predict_chunk (PredictChunk): The coroutine function making the
+            response lines for a chunk of texts and the index of its first text.
+            chunk_size (int, optional): The max number of texts in a chunk. Defaults to 64.
+            max_in_flight (int, optional): The max number of chunks predicted
+            at the same time. Defaults to 4.
+            max_buffered (int, optional): The max number of request body parts
+            read ahead. Defaults to 16.
+        """
+        super().__init__(media_type=self.media_type)
+        self.content_type = content_type
+        self.predict_chunk = predict_chunk
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.max_buffered = max_buffered
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        body: asyncio.Queue[bytes | Exception | None] = asyncio.Queue(self.max_buffered)
+        stream = asyncio.create_task(self._stream(body, send))
+        reader = asyncio.create_task(self._read(receive, body))
+        await asyncio.wait({stream, reader}, return_when=asyncio.FIRST_COMPLETED)
+        if not stream.done():
+            # the reader returns only when the client is gone
+            logger.info("The client disconnected, the prediction stream is stopped")
+            stream.cancel()
+        reader.cancel()
+        await asyncio.gather(stream, reader, return_exceptions=True)
+
+    async def _read(self, receive: Receive, body: asyncio.Queue):
+        """Put the request body parts into the queue until the client disconnects."""
+        more_body = True
+        while True:
+            try:
+                message = await receive()
+            except Exception as e:
+                # e.g. the body size limit, it's reported in the stream
+                await body.put(e)
+                return
+            if message["type"] == "http.disconnect":
+                return
+            if message["type"] == "http.request" and more_body:
+                await body.put(message.get("body", b""))
+                more_body = message.get("more_body", False)
+                if not more_body:
+                    await body.put(None)
+
+    async def _iter_chunks(self, body: asyncio.Queue) -> AsyncIterator[list[StreamItem]]:
+        """Parse the request body into chunks of texts.
+
+        A chunk is yielded when it's full or when no more of the body has arrived yet.
+        """
+        if self.content_type.startswith("application/json"):
+            parts = []
+            while (part := await body.get()) is not None:
+                if isinstance(part, Exception):
+                    raise StreamError(getattr(part, "detail", str(part)))
+                parts.append(part)
+            try:
+                texts = TextList.model_validate_json(b"".join(parts)).text_list
+            except ValueError as e:
+                raise StreamError(f"Invalid request body: {e}")
+            for start in range(0, len(texts), self.chunk_size):
+                yield [(None, text) for text in texts[start : start + self.chunk_size]]
+            return
+
+        buffer = b""
+        chunk = []
+        while True:
+            part = await body.get()
+            if isinstance(part, Exception):
+                raise StreamError(getattr(part, "detail", str(part)))
+            if part is None:
+                break
+            buffer += part
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                item = parse_line(line)
+                if item is not None:
+                    chunk.append(item)
+                if len(chunk) == self.chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk and body.empty():
+                yield chunk
+                chunk = []
+        item = parse_line(buffer)
+        if item is not None:
+            chunk.append(item)
+        if chunk:
+            yield chunk
+
+    async def _stream(self, body: asyncio.Queue, send: Send):
+        """Predict the chunks and send their lines in the order of texts."""
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", self.media_type.encode())],
+        })
+        chunks = self._iter_chunks(body)
+        next_chunk: asyncio.Task | None = asyncio.ensure_future(anext(chunks, None))
+        pending: deque[asyncio.Task] = deque()
+        index = 0
+        input_error = None
+        try:
+            while next_chunk is not None or pending:
+                wait_for = {pending[0]} if pending else set()
+                if next_chunk is not None and len(pending) < self.max_in_flight:
+                    wait_for.add(next_chunk)
+                await asyncio.wait(wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if pending and pending[0].done():
+                    lines = pending.popleft().result()
+                    data = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+                    await send({"type": "http.response.body", "body": data.encode(), "more_body": True})
+                elif next_chunk is not None and next_chunk.done():
+                    try:
+                        chunk = next_chunk.result()
+                    except StreamError as e:
+                        # the texts before the invalid line are still predicted
+                        input_error, chunk = e, None
+                    next_chunk = None
+                    if chunk is not None:
+                        pending.append(asyncio.ensure_future(self.predict_chunk(chunk, index)))
+                        index += len(chunk)
+                        next_chunk = asyncio.ensure_future(anext(chunks, None))
+            if input_error is not None:
+                raise input_error
+        except OSError:
+            # the client is gone, uvicorn reports it on sending
+            return
+        except Exception as e:
+            if not isinstance(e, StreamError):
+                logger.exception("The prediction stream failed")
+            error = getattr(e, "detail", str(e))
+            line = json.dumps({"error": error}, ensure_ascii=False) + "\n"
+            await send({"type": "http.response.body", "body": line.encode(), "more_body": True})
+        finally:
+            for task in (next_chunk, *pending):
+                if task is not None:
+                    task.cancel()
+            await asyncio.gather(*(t for t in (next_chunk, *pending) if t is not None), return_exceptions=True)
+            await chunks.aclose()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -1,6 +1,137 @@
 """The module with TritonApiClient."""
+import logging
+
 import requests
 
+logger = logging.getLogger(__name__)
+
+
+def make_infer_request(text_list: list[str]) -> dict:
+    """Make an inference request object by Triton specification
+
+    Args:
+        text_list (list[str]): Texts to be predicted.
+
+    Returns:
+        dict: The complete object for requests.
+    """
+    return {
+        "inputs": [
+            {
+                "name": "text_input",
+                "shape": [len(text_list), 1],
+                "datatype": "BYTES",
+                "data": text_list,
+            }
+        ]
+    }
+
+
+def split_into_chunks(n_texts: int, chunk_size: int) -> list[tuple[int, int]]:
+    """Split the range of text indices into chunks.
+
+    Args:
+        n_texts (int): The number of texts.
+        chunk_size (int): The max size of one chunk.
+
+    Returns:
+        list[tuple[int, int]]: The list of chunk borders (start, end).
+    """
+    return [
+        (start, min(start + chunk_size, n_texts))
+        for start in range(0, n_texts, chunk_size)
+    ]
+
+
+# the texts are batched in the order they came
+ARRIVAL = "arrival"
+# the texts are sorted by length before batching, so a batch has texts of similar length
+LENGTH = "length"
+BATCHING = (ARRIVAL, LENGTH)
+
+
+def split_into_batches(
+    texts: list[str], max_batch_size: int, max_batch_chars: int | None = None
+) -> list[tuple[int, int]]:
+    """Split the texts into batches limited by the number of texts and characters.
+
+    A text longer than `max_batch_chars` makes a batch on its own.
+
+    Args:
+        texts (list[str]): The texts.
+        max_batch_size (int): The max number of texts in one batch.
+        max_batch_chars (int | None, optional): The max total number of
+        characters in one batch, None for no limit. Defaults to None.
+
+    Returns:
+        list[tuple[int, int]]: The list of batch borders (start, end).
+    """
+    if not max_batch_chars:
+        return split_into_chunks(len(texts), max_batch_size)
+    batches = []
+    start = 0
+    while start < len(texts):
+        end = batch_end(texts, start, max_batch_size, max_batch_chars)
+        batches.append((start, end))
+        start = end
+    return batches
+
+
+def batch_end(texts: list[str], start: int, max_batch_size: int, max_batch_chars: int | None = None) -> int:
+    """Get the end of the batch starting at `start`.
+
+    Args:
+        texts (list[str]): The texts.
+        start (int): The index of the first text of the batch.
+        max_batch_size (int): The max number of texts in one batch.
+        max_batch_chars (int | None, optional): The max total number of
+        characters in one batch, None for no limit. Defaults to None.
+
+    Returns:
+        int: The index after the last text of the batch.
+    """
+    end = min(start + max_batch_size, len(texts))
+    if not max_batch_chars:
+        return end
+    chars = len(texts[start])
+    for i in range(start + 1, end):
+        chars += len(texts[i])
+        if chars > max_batch_chars:
+            return i
+    return end
+
+
+def length_order(texts: list[str]) -> list[int]:
+    """Get the indices of the texts sorted by length.
+
+    The models pad a batch to its longest text, so batches of texts of
+    similar length waste less compute. The number of characters is a cheap
+    estimate of the number of tokens.
+
+    Args:
+        texts (list[str]): The texts.
+
+    Returns:
+        list[int]: The indices from the shortest text to the longest one.
+    """
+    return sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+
+def restore_order(preds: list[str], order: list[int]) -> list[str]:
+    """Put the predictions made in `order` back in the order of the texts.
+
+    Args:
+        preds (list[str]): The predictions of the texts taken in `order`.
+        order (list[int]): The indices of the texts.
+
+    Returns:
+        list[str]: The predictions in the original order.
+    """
+    restored = [None] * len(order)
+    for i, pred in zip(order, preds):
+        restored[i] = pred
+    return restored
+
 
 class TritonApiClient:
     """Simple Api client for Triton inference server
@@ -25,7 +156,7 @@ class TritonApiClient:
         res = self.sess.get(self.base)
         if res.status_code != 200:
             res.raise_for_status()
-        print(f"Connection establisshed to the Triton model {model_name}")
+        logger.info(f"Connection establisshed to the Triton model {model_name}")
         model_config = self.sess.get(f"{self.base}/models/{model_name}/config").json()
         self.max_batch_size = model_config["max_batch_size"]
 
@@ -50,16 +181,7 @@ class TritonApiClient:
         Returns:
             dict: The complete object for requests.
         """
-        return {
-            "inputs": [
-                {
-                    "name": "text_input",
-                    "shape": [len(text_list), 1],
-                    "datatype": "BYTES",
-                    "data": text_list,
-                }
-            ]
-        }
+        return make_infer_request(text_list)
 
     def make_prediction_on_batch(self, batch: list[str]) -> list[str]:
         """Request the predictions from Triton services for one batch.
@@ -95,10 +217,8 @@ class TritonApiClient:
             list[str]: A list of predictions.
         """
         all_preds = []
-        for i in range(0, len(texts), self.max_batch_size):
-            all_preds.extend(
-                self.make_prediction_on_batch(texts[i : i + self.max_batch_size])
-            )
+        for start, end in split_into_chunks(len(texts), self.max_batch_size):
+            all_preds.extend(self.make_prediction_on_batch(texts[start:end]))
         return all_preds
 
     def close_connection(self):
@@ -1,46 +1,171 @@
-from app.triton_api_client import TritonApiClient
+import asyncio
 
+from app.async_triton_api_client import AsyncTritonApiClient
+from app import grpc_triton_api_client
+from app.grpc_triton_api_client import GRPC, HTTP, PROTOCOLS, GrpcTritonApiClient
+from app.models import TritonServerAddr
+from app.postprocessing import get_postprocessor
+from app.replicas import LEAST_OUTSTANDING, ReplicaGroup
 
-def init_triton_connections(
-    config: list[tuple[str, str, str]]
-) -> list[TritonApiClient]:
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def create_triton_client(
+    url: str, port: str, model_name: str, protocol: str = HTTP, **client_kwargs
+) -> AsyncTritonApiClient:
+    """Create the client of the Triton model by the protocol of the service.
+
+    Args:
+        url (str): Url base.
+        port (str): Port of the service.
+        model_name (str): Model name in Triton service.
+        protocol (str, optional): "http" or "grpc". Defaults to "http".
+        **client_kwargs: Extra arguments for the client, e.g. `max_concurrency`.
+
+    Returns:
+        AsyncTritonApiClient: The connected client.
+    """
+    if protocol not in PROTOCOLS:
+        raise ValueError(f"Unknown protocol '{protocol}', expected one of {PROTOCOLS}")
+    client_class = GrpcTritonApiClient if protocol == GRPC else AsyncTritonApiClient
+    return await client_class.create(url, port, model_name, **client_kwargs)
+
+
+def parse_services(config: list[list[str]] | None) -> list[TritonServerAddr]:
+    """Parse the list of Triton services from triton_services.yml.
+
+    Args:
+        config (list[list[str]] | None): The list of Triton services with base url,
+        port, model name, optional replica weight and optional protocol.
+
+    Raises:
+        ValueError: If a gRPC service is listed, but the gRPC package is not installed.
+
+    Returns:
+        list[TritonServerAddr]: The addresses of the services.
+    """
+    services = []
+    for url, port, model_name, *extra in config or []:
+        services.append(TritonServerAddr(
+            url=url,
+            port=str(port),
+            model_name=model_name,
+            weight=int(extra[0]) if extra else 1,
+            protocol=extra[1] if len(extra) > 1 else HTTP,
+        ))
+    # otherwise the service would stay pending, failing to connect forever
+    if grpc_triton_api_client.grpc is None and any(s.protocol == GRPC for s in services):
+        raise ValueError("The gRPC services need the tritonclient[grpc] package")
+    return services
+
+
+async def init_triton_connections(
+    services: list[TritonServerAddr],
+    balancing: str = LEAST_OUTSTANDING,
+    timeout: float | None = None,
+    hedge_quantile: float | None = None,
+    hedge_budget: float = 0.05,
+    eject_time: float = 10.0,
+    **client_kwargs,
+) -> tuple[list[ReplicaGroup], list[tuple[TritonServerAddr, str]]]:
     """Init Triton connections by the list of addresses.
 
+    The services are connected at the same time, so a slow one doesn't delay
+    the others. The services with the same model name are the replicas of
+    one model.
+
     Args:
-        config (list[tuple[str, str, str]]): The list of Triton services 
-        with base url, port and model name.
+        services (list[TritonServerAddr]): The addresses of the services.
+        balancing (str, optional): The balancing between replicas,
+        "least_outstanding" or "round_robin". Defaults to "least_outstanding".
+        timeout (float | None, optional): The timeout of connecting one service
+        in seconds, None for no timeout. Defaults to None.
+        hedge_quantile (float | None, optional): The quantile of the batch latency
+        after which a batch is hedged, None disables hedging. Defaults to None.
+        hedge_budget (float, optional): The max share of the hedged batches.
+        Defaults to 0.05.
+        eject_time (float, optional): The time in seconds a failed replica gets
+        no batches. Defaults to 10.0.
+        **client_kwargs: Extra arguments for the client, e.g. `max_concurrency`.
 
     Returns:
-        list[TritonApiClient]: The list with Triton client objects.
+        tuple[list[ReplicaGroup], list[tuple[TritonServerAddr, str]]]: The list
+        with a replica group per connected model and the services that failed
+        to connect with the errors.
     """
-    trtion_api_list = []
-    for params in config:
-        try:
-            trtion_api_list.append(TritonApiClient(*params))
-        except Exception as e:
-            print(e)
-    return trtion_api_list
+    results = await asyncio.gather(
+        *(
+            asyncio.wait_for(
+                create_triton_client(
+                    server.url, server.port, server.model_name, server.protocol, **client_kwargs
+                ),
+                timeout,
+            )
+            for server in services
+        ),
+        return_exceptions=True,
+    )
+    groups: dict[str, ReplicaGroup] = {}
+    failed = []
+    for server, client in zip(services, results):
+        if isinstance(client, BaseException):
+            logger.error(
+                f"Failed to connect the Triton model {server.model_name} on "
+                f"{server.url}:{server.port}: {client!r}"
+            )
+            failed.append((server, repr(client)))
+            continue
+        if server.model_name not in groups:
+            groups[server.model_name] = ReplicaGroup(
+                server.model_name, balancing, hedge_quantile, hedge_budget, eject_time
+            )
+        groups[server.model_name].add(client, server.weight)
+    return list(groups.values()), failed
 
 
-def make_normalized_pred_obj(pred: str, color: str) -> dict[str, str]:
-    """Make an object for the plaftorm.
+def check_predictions_count(preds: list[str], n_texts: int):
+    """Check that the model returned a prediction for every text.
 
     Args:
-        pred (str): The prediction value.
-        color (str): The color hex-code.
+        preds (list[str]): The predictions of the model.
+        n_texts (int): The number of predicted texts.
+
+    Raises:
+        ValueError: If the number of predictions is wrong.
+    """
+    if len(preds) != n_texts:
+        raise ValueError(f"Expected {n_texts} predictions from the model, got {len(preds)}")
+
+
+def merge_model_predictions(
+    model_predictions: list[list[str]], n_texts: int
+) -> list[list[str]]:
+    """Transpose per model predictions into per text predictions.
+
+    Args:
+        model_predictions (list[list[str]]): A prediction list per each model,
+        every list is in the order of input texts.
+        n_texts (int): The number of predicted texts.
+
+    Raises:
+        ValueError: If a model returned wrong number of predictions.
 
     Returns:
-        dict[str, str]: A complete object.
+        list[list[str]]: A prediction list per each text, the model order is kept.
     """
-    return {"prediction": pred, "color": color}
+    for preds in model_predictions:
+        check_predictions_count(preds, n_texts)
+    return [[preds[i] for preds in model_predictions] for i in range(n_texts)]
 
 
 def normalize_predictions(
     predictions: list[list[str]],
     label_mapping: dict[str, tuple[str, str]],
-    separator: str,
-    irrelevant_class_name: str,
-):
+    separator: str = ";",
+    irrelevant_class_name: str = "нерелевантный",
+) -> list[list[dict[str, str]]]:
     """Normalize collected predictions fom Triton models into one format.
 
     It performs label mapping by provided map. 
@@ -48,30 +173,17 @@ def normalize_predictions(
     If no class left, the irrelevant class will be added.
 
     If irrelevant class will be with any other class, it will be filtered.
+    The mapping is compiled once and reused while the arguments are the same.
 
     Args:
         predictions (list[list[str]]): A prediction list per each text.
         label_mapping (dict[str, tuple[str, str]]): The mapping for classes.
         The values are new class name and color hex code.
-        separator (str): Separator for multilabel classes.
-        irrelevant_class_name (str): The irrelevant class name.
+        separator (str, optional): Separator for multilabel classes. Defaults to ";".
+        irrelevant_class_name (str, optional): The irrelevant class name.
+        Defaults to "нерелевантный".
 
     Returns:
-        list[list[str]]: A normalized collection of predictions.
+        list[list[dict[str, str]]]: A normalized collection of predictions.
     """
-
-    mapped_predictions = []
-    for pred_line in predictions:
-        pred_line = [
-            label_mapping[x]
-            for y in pred_line
-            for x in y.split(separator)
-            if x in label_mapping
-        ]
-        # we dont need "irrelevant" prediction if there exist any relevant one
-        pred_line = [x for x in pred_line if x[0] != irrelevant_class_name]
-        if len(pred_line) == 0:
-            pred_line = [label_mapping[irrelevant_class_name]]
-        pred_line = [make_normalized_pred_obj(*x) for x in pred_line]
-        mapped_predictions.append(pred_line)
-    return mapped_predictions
+    return get_postprocessor(label_mapping, separator, irrelevant_class_name).normalize(predictions)
@@ -0,0 +1,311 @@
+"""The benchmark of the Zoo with local stand-in Triton servers.
+
+It starts a stub KServe v2 server per model, runs the Zoo with uvicorn in
+a subprocess connected to them, and drives `/predict`, `/predict_on_text`
+and `/predict_on_batch` at the given concurrency levels. The throughput,
+the latency percentiles and the peak RSS of the Zoo are written into a
+JSON file together with the microbenchmarks of the post-processing.
+
+Run it from the zoo directory:
+
+    python -m test.benchmark --concurrency 1 8 32 --output benchmark_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from contextlib import ExitStack
+
+import httpx
+import yaml
+
+from test.triton_stub import TritonStub
+
+ZOO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ("/predict", "/predict_on_text", "/predict_on_batch")
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Get the percentile by the nearest rank.
+
+    Args:
+        values (list[float]): The values.
+        q (float): The percentile from 0 to 100.
+
+    Returns:
+        float: The value, 0 for no values.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(int(round(q / 100 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    """Read the peak resident memory of the process, Linux only.
+
+    Args:
+        pid (int): The process id.
+
+    Returns:
+        float | None: The peak RSS in MiB, None if it's unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_zoo_dir(path: str, stubs: list[TritonStub], args: argparse.Namespace):
+    """Write the Zoo configs for the stubs into `path`/config."""
+    os.makedirs(os.path.join(path, "config"))
+    shutil.copy(os.path.join(ZOO_DIR, "config", "mapping.yml"), os.path.join(path, "config"))
+    with open(os.path.join(ZOO_DIR, "config", "config.yml")) as file:
+        config = yaml.safe_load(file)
+    config.update(
+        endpoint_to_send_preds=f"{stubs[0].url}:{stubs[0].port}/platform",
+        jobs_path=os.path.join(path, "jobs.sqlite"),
+        dead_letter_path=os.path.join(path, "dead_letter.jsonl"),
+        store_path=None,
+        # every request has new texts anyway, the cache would only measure itself
+        cache_max_size=args.cache_size,
+        max_request_body_bytes=0,
+        batching=args.batching,
+        max_batch_chars=args.max_batch_chars,
+    )
+    with open(os.path.join(path, "config", "config.yml"), "w") as file:
+        yaml.safe_dump(config, file, allow_unicode=True)
+    services = [[stub.url, str(stub.port), f"model{i}"] for i, stub in enumerate(stubs)]
+    with open(os.path.join(path, "config", "triton_services.yml"), "w") as file:
+        yaml.safe_dump(services, file)
+
+
+def start_zoo(path: str, port: int, n_models: int) -> subprocess.Popen:
+    """Run the Zoo in `path` and wait until all the models are connected."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=path,
+        env={**os.environ, "PYTHONPATH": ZOO_DIR},
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The Zoo exited on startup")
+        try:
+            if len(httpx.get(f"http://127.0.0.1:{port}/show_services").json()) == n_models:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("The Zoo didn't connect the models in 30 seconds")
+
+
+def make_payload(endpoint: str, request_id: int, n_texts: int, uneven: bool = False) -> dict:
+    # uneven texts are mostly short with a long one in every 16, like the posts of social networks
+    texts = [
+        f"benchmark text {request_id} {i} " * (200 if uneven and i % 16 == 0 else 8)
+        for i in range(n_texts)
+    ]
+    if endpoint == "/predict_on_batch":
+        return {"texts": [{"text_id": str(i), "text": t} for i, t in enumerate(texts)]}
+    return {"text_list": texts}
+
+
+async def wait_for_jobs(client: httpx.AsyncClient, timeout: float = 600):
+    """Wait until the batch queue of the Zoo is empty."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if (await client.get("/queue_depth")).json()["queued_texts"] == 0:
+            return
+        await asyncio.sleep(0.05)
+    raise TimeoutError("The batch jobs are not finished")
+
+
+async def run_scenario(
+    base_url: str, endpoint: str, concurrency: int, n_requests: int, n_texts: int, uneven: bool = False
+) -> dict:
+    """Send `n_requests` requests by `concurrency` clients at the same time.
+
+    Returns:
+        dict: The scenario results.
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(n_requests))
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+
+        async def worker():
+            nonlocal errors
+            for request_id in counter:
+                payload = make_payload(endpoint, request_id, n_texts, uneven)
+                start = time.perf_counter()
+                try:
+                    response = await client.post(endpoint, json=payload)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        result = {}
+        if endpoint == "/predict_on_batch":
+            # the texts are only accepted by the requests, the predictions are made by the jobs
+            await wait_for_jobs(client)
+            result["jobs_texts_per_s"] = n_requests * n_texts / (time.perf_counter() - start)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "texts_per_request": n_texts,
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "texts_per_s": len(latencies) * n_texts / elapsed,
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": 1000 * percentile(latencies, 50),
+            "p95": 1000 * percentile(latencies, 95),
+            "p99": 1000 * percentile(latencies, 99),
+        },
+        **result,
+    }
+
+
+def run_microbenchmarks(n_texts: int = 1000, repeat: int = 5) -> dict:
+    """Measure the post-processing of predictions in this process.
+
+    Returns:
+        dict: The best time per text in microseconds per case, with the
+        compiled mapping and with the mapping compiled on every call.
+    """
+    from app.utils import normalize_predictions
+
+    with open(os.path.join(ZOO_DIR, "config", "mapping.yml")) as file:
+        mapping = yaml.safe_load(file)
+    with open(os.path.join(ZOO_DIR, "config", "config.yml")) as file:
+        config = yaml.safe_load(file)
+    labels = list(mapping)
+    separator = config["separator"]
+    cases = {
+        "single_label": [[labels[i % len(labels)]] for i in range(n_texts)],
+        "multilabel_3_models": [
+            [separator.join(labels[(i + j) % len(labels)] for j in range(3))] * 3
+            for i in range(n_texts)
+        ],
+        "irrelevant_only": [[config["irrelevant_class_name"]] * 3 for _ in range(n_texts)],
+    }
+    results = {}
+    for name, predictions in cases.items():
+        # a new mapping object makes every call compile the mapping from scratch
+        cold = timeit.Timer(
+            lambda: normalize_predictions(
+                predictions, dict(mapping), separator, config["irrelevant_class_name"]
+            )
+        )
+        warm = timeit.Timer(
+            lambda: normalize_predictions(predictions, mapping, separator, config["irrelevant_class_name"])
+        )
+        results[name] = {
+            "texts": n_texts,
+            "us_per_text": 1e6 * min(warm.repeat(repeat, number=1)) / n_texts,
+            "us_per_text_cold": 1e6 * min(cold.repeat(repeat, number=1)) / n_texts,
+        }
+    return results
+
+
+async def run_scenarios(base_url: str, args: argparse.Namespace, zoo: subprocess.Popen) -> list[dict]:
+    results = []
+    for endpoint in args.endpoints:
+        for concurrency in args.concurrency:
+            result = await run_scenario(
+                base_url, endpoint, concurrency, args.requests, args.texts, args.uneven_texts
+            )
+            result["peak_rss_mb"] = peak_rss_mb(zoo.pid)
+            results.append(result)
+            print(
+                f"{endpoint} c={concurrency}: {result['throughput_rps']:.1f} req/s, "
+                f"p50={result['latency_ms']['p50']:.1f}ms p99={result['latency_ms']['p99']:.1f}ms, "
+                f"errors={result['errors']}"
+            )
+    return results
+
+
+def main():
+    """Command line interface of the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the Zoo with stub Triton servers.")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--texts", type=int, default=16, help="Texts per request.")
+    parser.add_argument("--models", type=int, default=3, help="The number of stub models.")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per inference.")
+    parser.add_argument("--per-text-latency", type=float, default=0.0002, help="Seconds per text.")
+    parser.add_argument(
+        "--per-char-latency", type=float, default=0.0,
+        help="Seconds per character of a batch padded to its longest text.",
+    )
+    parser.add_argument("--uneven-texts", action="store_true", help="Make every 16th text long.")
+    parser.add_argument("--batching", default="arrival", choices=("arrival", "length"))
+    parser.add_argument("--max-batch-chars", type=int, default=None)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of failed inferences.")
+    parser.add_argument("--cache-size", type=int, default=0, help="cache_max_size of the Zoo.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    results = {
+        "settings": vars(args),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "normalize_predictions": run_microbenchmarks(),
+    }
+    with ExitStack() as stack, tempfile.TemporaryDirectory() as path:
+        stubs = [
+            stack.enter_context(TritonStub(
+                max_batch_size=args.max_batch_size,
+                latency=args.latency,
+                per_text_latency=args.per_text_latency,
+                per_char_latency=args.per_char_latency,
+                failure_rate=args.failure_rate,
+                seed=i,
+            ))
+            for i in range(args.models)
+        ]
+        make_zoo_dir(path, stubs, args)
+        port = free_port()
+        zoo = start_zoo(path, port, args.models)
+        try:
+            results["scenarios"] = asyncio.run(run_scenarios(f"http://127.0.0.1:{port}", args, zoo))
+        finally:
+            zoo.terminate()
+            zoo.wait()
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"The results are written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""A local stand-in for Triton gRPC server, speaks KServe v2 protocol.
+
+It serves every requested model with the same `predict` function as the
+HTTP stub. It needs the optional `tritonclient[grpc]` package.
+"""
+import grpc
+from tritonclient.grpc import model_config_pb2, service_pb2, service_pb2_grpc
+
+from app.binary_tensor import deserialize_bytes_tensor, serialize_bytes_tensor
+from test.triton_stub import default_predict
+
+
+class GrpcTritonStub(service_pb2_grpc.GRPCInferenceServiceServicer):
+    """The stand-in server running on the event loop of the test.
+
+    Use it as an async context manager, `url` and `port` are available inside.
+    """
+
+    def __init__(self, max_batch_size=8, predict=default_predict, model_version="1", ready=True):
+        self.max_batch_size = max_batch_size
+        self.predict = predict
+        self.model_version = model_version
+        self.ready = ready
+        self.requests = []
+        self.url = "http://127.0.0.1"
+
+    async def __aenter__(self):
+        self.server = grpc.aio.server()
+        service_pb2_grpc.add_GRPCInferenceServiceServicer_to_server(self, self.server)
+        self.port = self.server.add_insecure_port("127.0.0.1:0")
+        await self.server.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.server.stop(None)
+
+    async def ServerMetadata(self, request, context):
+        return service_pb2.ServerMetadataResponse(name="triton", version="2")
+
+    async def ServerReady(self, request, context):
+        return service_pb2.ServerReadyResponse(ready=self.ready)
+
+    async def ModelConfig(self, request, context):
+        config = model_config_pb2.ModelConfig(name=request.name, max_batch_size=self.max_batch_size)
+        return service_pb2.ModelConfigResponse(config=config)
+
+    async def ModelMetadata(self, request, context):
+        return service_pb2.ModelMetadataResponse(name=request.name, versions=[self.model_version])
+
+    async def ModelInfer(self, request, context):
+        texts = deserialize_bytes_tensor(request.raw_input_contents[0])
+        self.requests.append(texts)
+        if len(texts) > self.max_batch_size:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "the batch is larger than max_batch_size")
+        preds = self.predict(request.model_name, texts)
+        output = service_pb2.ModelInferResponse.InferOutputTensor(
+            name="labels", datatype="BYTES", shape=[len(preds), 1]
+        )
+        return service_pb2.ModelInferResponse(
+            model_name=request.model_name, outputs=[output], raw_output_contents=[serialize_bytes_tensor(preds)]
+        )
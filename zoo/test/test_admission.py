@@ -0,0 +1,98 @@
+import unittest
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController, BodySizeLimitMiddleware
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_request_size(self):
+        admission = AdmissionController(max_texts_per_request=2)
+
+        admission.check_request_size(2)
+        with self.assertRaises(HTTPException) as cm:
+            admission.check_request_size(3)
+        self.assertEqual(cm.exception.status_code, 413)
+
+    def test_queue(self):
+        admission = AdmissionController(max_queued_texts=10, retry_after=3)
+
+        admission.check_queue(8, 2)
+        with self.assertRaises(HTTPException) as cm:
+            admission.check_queue(9, 2)
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertEqual(cm.exception.headers, {"Retry-After": "3"})
+
+    def test_model_slots(self):
+        admission = AdmissionController(max_model_in_flight_texts=4)
+
+        with admission.model_slots(["model1", "model2"], 3):
+            self.assertEqual(admission.in_flight, {"model1": 3, "model2": 3})
+            with self.assertRaises(HTTPException) as cm:
+                with admission.model_slots(["model2"], 2):
+                    pass
+            self.assertEqual(cm.exception.status_code, 429)
+            with admission.model_slots(["model1"], 1):
+                self.assertEqual(admission.in_flight["model1"], 4)
+        self.assertEqual(admission.in_flight, {})
+
+    def test_large_request_on_idle_model(self):
+        admission = AdmissionController(max_model_in_flight_texts=4)
+
+        with admission.model_slots(["model1"], 10):
+            self.assertEqual(admission.in_flight["model1"], 10)
+
+
+class TestBodySizeLimitMiddleware(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.add_middleware(BodySizeLimitMiddleware, max_body_bytes=16, path_limits={"/stream": 0})
+
+        @app.post("/echo")
+        async def echo(data: dict) -> dict:
+            return data
+
+        @app.post("/stream")
+        async def stream(data: dict) -> dict:
+            return data
+
+        self.client = TestClient(app)
+
+    def test_small_body(self):
+        response = self.client.post("/echo", json={"a": 1})
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_large_body(self):
+        response = self.client.post("/echo", json={"a": "x" * 100})
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_large_chunked_body(self):
+        def body():
+            yield b'{"a": "'
+            yield b"x" * 100
+            yield b'"}'
+
+        response = self.client.post(
+            "/echo", content=body(), headers={"Content-Type": "application/json"}
+        )
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_invalid_content_length(self):
+        response = self.client.post(
+            "/echo", content=b"{}", headers={"Content-Type": "application/json", "Content-Length": "x"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_path_limit(self):
+        response = self.client.post("/stream", json={"a": "x" * 100})
+
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import unittest
+
+import httpx
+
+from app.async_triton_api_client import AsyncTritonApiClient, _connection_pools
+from app.metrics import MODEL_ERRORS, MODEL_LATENCY
+
+
+class FakeTriton:
+    """Handler for httpx.MockTransport that imitates Triton HTTP API."""
+
+    def __init__(self, max_batch_size=32, status_code=200, delay=0.0):
+        self.max_batch_size = max_batch_size
+        self.status_code = status_code
+        self.delay = delay
+        self.infer_calls = []
+        self.infer_timeouts = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/config"):
+            return httpx.Response(200, json={"max_batch_size": self.max_batch_size})
+        if path.endswith("/infer"):
+            data = json.loads(request.content)["inputs"][0]["data"]
+            self.infer_calls.append(data)
+            self.infer_timeouts.append(request.extensions.get("timeout", {}).get("read"))
+            if "fail" in data:
+                return httpx.Response(500)
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            await asyncio.sleep(self.delay)
+            self.in_flight -= 1
+            return httpx.Response(200, json={"outputs": [{"data": [f"pred_{t}" for t in data]}]})
+        if "/models/" in path:
+            return httpx.Response(200, json={"name": path.split("/")[-1], "versions": ["2", "10"]})
+        return httpx.Response(self.status_code)
+
+
+class TestAsyncTritonApiClient(unittest.IsolatedAsyncioTestCase):
+    async def create_client(self, triton, **kwargs):
+        client = await AsyncTritonApiClient.create(
+            "http://localhost", 8000, "test_model",
+            transport=httpx.MockTransport(triton), **kwargs
+        )
+        self.addAsyncCleanup(client.close_connection)
+        return client
+
+    async def test_create_success(self):
+        client = await self.create_client(FakeTriton())
+
+        self.assertEqual(client.base, "http://localhost:8000/v2")
+        self.assertEqual(client.model_name, "test_model")
+        self.assertEqual(client.max_batch_size, 32)
+        self.assertEqual(client.model_version, "10")
+
+    async def test_create_failure(self):
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.create_client(FakeTriton(status_code=500))
+        self.assertNotIn("http://localhost:8000/v2", _connection_pools)
+
+    async def test_is_ready(self):
+        triton = FakeTriton()
+        client = await self.create_client(triton)
+
+        self.assertTrue(await client.is_ready())
+        triton.status_code = 503
+        self.assertFalse(await client.is_ready())
+
+    async def test_make_prediction_on_batch(self):
+        triton = FakeTriton()
+        client = await self.create_client(triton)
+
+        result = await client.make_prediction_on_batch(["text1", "text2"])
+
+        self.assertEqual(result, ["pred_text1", "pred_text2"])
+        self.assertEqual(triton.infer_calls, [["text1", "text2"]])
+
+    async def test_request_timeout(self):
+        triton = FakeTriton()
+        client = await self.create_client(triton, request_timeout=2.5)
+
+        await client.make_prediction_on_batch(["text1"])
+
+        self.assertEqual(triton.infer_timeouts, [2.5])
+
+    async def test_metrics(self):
+        client = await self.create_client(FakeTriton())
+        n_batches = MODEL_LATENCY.count("test_model")
+        n_errors = MODEL_ERRORS.values.get(("test_model",), 0)
+
+        await client.make_prediction_on_batch(["text1", "text2"])
+        with self.assertRaises(httpx.HTTPStatusError):
+            await client.make_prediction_on_batch(["fail"])
+
+        # the failed request got a response, so its latency is observed too
+        self.assertEqual(MODEL_LATENCY.count("test_model"), n_batches + 2)
+        self.assertEqual(MODEL_ERRORS.values[("test_model",)], n_errors + 1)
+
+    async def test_make_prediction(self):
+        triton = FakeTriton(max_batch_size=2, delay=0.01)
+        client = await self.create_client(triton, max_concurrency=2)
+        texts = [f"text{i}" for i in range(7)]
+
+        result = await client.make_prediction(texts)
+
+        self.assertEqual(result, [f"pred_{t}" for t in texts])
+        self.assertEqual(len(triton.infer_calls), 4)
+        self.assertEqual(triton.peak_in_flight, 2)
+
+    async def test_failed_batch_cancels_the_rest(self):
+        triton = FakeTriton(max_batch_size=1, delay=0.01)
+        client = await self.create_client(triton, max_concurrency=1)
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            await client.make_prediction(["fail"] + [f"text{i}" for i in range(5)])
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(triton.infer_calls, [["fail"]])
+
+    async def test_make_prediction_by_length(self):
+        triton = FakeTriton(max_batch_size=3)
+        client = await self.create_client(triton, batching="length", max_batch_chars=10)
+        texts = ["a" * 9, "b", "c" * 5, "d", "e" * 4]
+
+        result = await client.make_prediction(texts)
+
+        self.assertEqual(result, [f"pred_{t}" for t in texts])
+        self.assertEqual(sorted(triton.infer_calls), sorted([["b", "d", "eeee"], ["ccccc"], ["a" * 9]]))
+
+    async def test_adaptive_batch_size(self):
+        client = await self.create_client(FakeTriton(max_batch_size=8), adaptive_batching="throughput")
+
+        self.assertEqual(client.batch_size, 8)
+        client.batch_sizing.record(8, 0.1)
+        client.batch_sizing._probe = 2
+        texts = [f"text{i}" for i in range(8)]
+        self.assertEqual(await client.make_prediction(texts), [f"pred_{t}" for t in texts])
+        self.assertIn(4, client.batch_sizing.latency)
+
+    async def test_unknown_batching(self):
+        with self.assertRaises(ValueError):
+            AsyncTritonApiClient("http://localhost", 8000, "test_model", batching="random")
+
+    async def test_shared_connection_pool(self):
+        triton = FakeTriton()
+        client1 = await self.create_client(triton)
+        client2 = await AsyncTritonApiClient.create(
+            "http://localhost", 8000, "other_model", transport=httpx.MockTransport(triton)
+        )
+
+        self.assertIs(client1.sess, client2.sess)
+        await client2.close_connection()
+        self.assertIsNone(client2.sess)
+        self.assertFalse(client1.sess.is_closed)
+
+    async def test_close_connection(self):
+        client = await self.create_client(FakeTriton())
+        sess = client.sess
+
+        await client.close_connection()
+
+        self.assertIsNone(client.sess)
+        self.assertTrue(sess.is_closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
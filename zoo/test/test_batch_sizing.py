@@ -0,0 +1,84 @@
+import unittest
+
+from app.batch_sizing import AdaptiveBatchSize, candidate_sizes
+
+
+def run(controller, latency_of, n_batches):
+    for _ in range(n_batches):
+        size = controller.batch_size
+        controller.record(size, latency_of(size))
+
+
+class TestAdaptiveBatchSize(unittest.TestCase):
+    def test_candidate_sizes(self):
+        self.assertEqual(candidate_sizes(1), [1])
+        self.assertEqual(candidate_sizes(32), [1, 2, 4, 8, 16, 32])
+        self.assertEqual(candidate_sizes(24), [1, 2, 4, 8, 16, 24])
+
+    def test_converges_to_best_throughput(self):
+        controller = AdaptiveBatchSize(64, samples=4, probe_samples=2)
+        # the time per text grows after 16 texts, e.g. the model runs out of the CPU cache
+        latency_of = lambda size: 0.01 + 0.001 * size + (0.002 * (size - 16) if size > 16 else 0)
+
+        run(controller, latency_of, 200)
+
+        self.assertEqual(controller.chosen_size, 16)
+        self.assertEqual(controller.stats()["batch_size"], 16)
+
+    def test_stays_at_max_size_if_it_is_the_best(self):
+        controller = AdaptiveBatchSize(32, samples=4, probe_samples=2)
+
+        run(controller, lambda size: 0.05 + 0.0001 * size, 200)
+
+        self.assertEqual(controller.chosen_size, 32)
+
+    def test_target_latency(self):
+        controller = AdaptiveBatchSize(64, objective="latency", target_latency=0.1, samples=4, probe_samples=2)
+
+        run(controller, lambda size: 0.005 * size, 200)
+
+        # 16 texts take 80 ms, 32 texts take 160 ms
+        self.assertEqual(controller.chosen_size, 16)
+
+    def test_ignores_other_sizes(self):
+        controller = AdaptiveBatchSize(8, samples=1)
+
+        controller.record(3, 1.0)
+
+        self.assertEqual(controller.latency, {})
+        self.assertEqual(controller.batch_size, 8)
+
+    def test_near_full_batches_count(self):
+        controller = AdaptiveBatchSize(8, samples=2)
+
+        controller.record(7, 1.0)
+        controller.record(6, 1.0)
+
+        self.assertEqual(controller.latency, {8: 1.0})
+        self.assertEqual(controller.batch_size, 4)
+
+    def test_unfilled_probe_is_abandoned(self):
+        controller = AdaptiveBatchSize(32, samples=2, probe_samples=2, probe_max_batches=5)
+        latency_of = lambda size: 0.01 if size <= 16 else 1.0
+        # 16 is chosen, 8 is probed, then 32 is probed again
+        run(controller, latency_of, 10)
+        self.assertEqual(controller.stats()["probing"], 32)
+
+        # the traffic fills only 16 texts per batch
+        for _ in range(5):
+            controller.record(16, 0.01)
+
+        self.assertIsNone(controller.stats()["probing"])
+        self.assertEqual(controller.chosen_size, 16)
+        run(controller, latency_of, 2)
+        self.assertEqual(controller.stats()["probing"], 8)
+
+    def test_invalid_objective(self):
+        with self.assertRaises(ValueError):
+            AdaptiveBatchSize(8, objective="speed")
+        with self.assertRaises(ValueError):
+            AdaptiveBatchSize(8, objective="latency")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.batcher import MicroBatcher
+
+
+def make_client(max_batch_size=4):
+    client = MagicMock(model_name="model", max_batch_size=max_batch_size)
+    client.make_prediction = AsyncMock(side_effect=lambda texts: [f"pred_{t}" for t in texts])
+    return client
+
+
+class TestMicroBatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_callers_share_batch(self):
+        client = make_client(max_batch_size=8)
+        batcher = MicroBatcher(client, max_wait=0.01)
+
+        results = await asyncio.gather(
+            batcher.make_prediction(["a"]),
+            batcher.make_prediction(["b", "c"]),
+            batcher.make_prediction(["d"]),
+        )
+
+        self.assertEqual(results, [["pred_a"], ["pred_b", "pred_c"], ["pred_d"]])
+        client.make_prediction.assert_awaited_once_with(["a", "b", "c", "d"])
+
+    async def test_full_batch_is_sent_without_waiting(self):
+        client = make_client(max_batch_size=2)
+        batcher = MicroBatcher(client, max_wait=10)
+
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.make_prediction(["a"]), batcher.make_prediction(["b"])),
+            timeout=1,
+        )
+
+        self.assertEqual(results, [["pred_a"], ["pred_b"]])
+
+    async def test_separate_batches_after_wait(self):
+        client = make_client()
+        batcher = MicroBatcher(client, max_wait=0.001)
+
+        await batcher.make_prediction(["a"])
+        await batcher.make_prediction(["b"])
+
+        self.assertEqual(client.make_prediction.await_count, 2)
+
+    async def test_error_is_passed_to_all_callers(self):
+        client = make_client()
+        client.make_prediction.side_effect = RuntimeError("model is down")
+        batcher = MicroBatcher(client, max_wait=0.001)
+
+        results = await asyncio.gather(
+            batcher.make_prediction(["a"]),
+            batcher.make_prediction(["b"]),
+            return_exceptions=True,
+        )
+
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+    async def test_empty_texts(self):
+        client = make_client()
+        batcher = MicroBatcher(client, max_wait=0.001)
+
+        self.assertEqual(await batcher.make_prediction([]), [])
+        client.make_prediction.assert_not_awaited()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import httpx
+
+from test.benchmark import make_payload, percentile, run_microbenchmarks
+from test.triton_stub import TritonStub
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_payloads(self):
+        self.assertEqual(len(make_payload("/predict", 0, 3)["text_list"]), 3)
+        self.assertEqual(make_payload("/predict_on_batch", 0, 2)["texts"][1]["text_id"], "1")
+        uneven = make_payload("/predict", 0, 17, uneven=True)["text_list"]
+        self.assertGreater(len(uneven[16]), 10 * len(uneven[1]))
+
+    def test_microbenchmarks(self):
+        results = run_microbenchmarks(n_texts=10, repeat=1)
+
+        self.assertEqual(set(results), {"single_label", "multilabel_3_models", "irrelevant_only"})
+        self.assertTrue(all(r["us_per_text"] > 0 for r in results.values()))
+
+    def test_stub_failures_and_batch_limit(self):
+        def infer(stub, texts):
+            body = {"inputs": [{"name": "text_input", "datatype": "BYTES", "shape": [len(texts), 1], "data": texts}]}
+            return httpx.post(f"{stub.url}:{stub.port}/v2/models/m/infer", json=body).status_code
+
+        with TritonStub(max_batch_size=2, failure_rate=1.0) as stub:
+            self.assertEqual(infer(stub, ["t1", "t2", "t3"]), 400)
+            self.assertEqual(infer(stub, ["t1"]), 500)
+        with TritonStub(max_batch_size=2) as stub:
+            self.assertEqual(infer(stub, ["t1"]), 200)
+            self.assertEqual(httpx.post(f"{stub.url}:{stub.port}/platform", json={}).status_code, 200)
+            self.assertEqual(stub.platform_payloads, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
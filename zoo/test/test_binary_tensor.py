@@ -0,0 +1,93 @@
+import json
+import unittest
+
+import httpx
+
+from app.async_triton_api_client import AsyncTritonApiClient
+from app.binary_tensor import (
+    deserialize_bytes_tensor,
+    make_binary_infer_request,
+    parse_infer_response,
+    serialize_bytes_tensor,
+)
+from test.triton_stub import TritonStub
+
+
+class TestBinaryTensor(unittest.TestCase):
+    def test_bytes_tensor_roundtrip(self):
+        texts = ["я люблю жизнь", "", "text \"quoted\"\n"]
+
+        data = serialize_bytes_tensor(texts)
+
+        self.assertEqual(data[:4], len("я люблю жизнь".encode()).to_bytes(4, "little"))
+        self.assertEqual(deserialize_bytes_tensor(data), texts)
+
+    def test_make_binary_infer_request(self):
+        body, header_length = make_binary_infer_request(["привет", "мир"])
+
+        header = json.loads(body[:header_length])
+        self.assertNotIn("data", header["inputs"][0])
+        self.assertEqual(header["inputs"][0]["shape"], [2, 1])
+        self.assertTrue(header["parameters"]["binary_data_output"])
+        self.assertEqual(deserialize_bytes_tensor(body[header_length:]), ["привет", "мир"])
+
+    def test_parse_json_response(self):
+        content = json.dumps({"outputs": [{"data": ["pred1", "pred2"]}]}).encode()
+
+        self.assertEqual(parse_infer_response(content, None), ["pred1", "pred2"])
+
+    def test_parse_binary_response(self):
+        tensor = serialize_bytes_tensor(["класс1", "класс2;класс3"])
+        header = json.dumps(
+            {"outputs": [{"name": "out", "parameters": {"binary_data_size": len(tensor)}}]}
+        ).encode()
+
+        result = parse_infer_response(header + tensor, str(len(header)))
+
+        self.assertEqual(result, ["класс1", "класс2;класс3"])
+
+
+class TestBinaryTritonClient(unittest.IsolatedAsyncioTestCase):
+    async def test_binary_prediction(self):
+        with TritonStub(max_batch_size=2) as stub:
+            client = await AsyncTritonApiClient.create(stub.url, stub.port, "model", binary_data=True)
+            result = await client.make_prediction(["я люблю жизнь", "помогите мне", "тест"])
+            await client.close_connection()
+
+        self.assertEqual(result, ["model:я люблю жизнь", "model:помогите мне", "model:тест"])
+        self.assertEqual([r["binary"] for r in stub.requests], [True, True])
+
+    async def test_fallback_to_json(self):
+        with TritonStub(binary_support=False) as stub:
+            client = await AsyncTritonApiClient.create(stub.url, stub.port, "model", binary_data=True)
+            first = await client.make_prediction_on_batch(["текст"])
+            second = await client.make_prediction_on_batch(["текст2"])
+            await client.close_connection()
+
+        self.assertEqual(first, ["model:текст"])
+        self.assertEqual(second, ["model:текст2"])
+        self.assertFalse(client.binary_data)
+        self.assertEqual([r["binary"] for r in stub.requests], [True, False, False])
+
+    async def test_batch_error_keeps_binary_mode(self):
+        with TritonStub(max_batch_size=1) as stub:
+            client = await AsyncTritonApiClient.create(stub.url, stub.port, "model", binary_data=True)
+            with self.assertRaises(httpx.HTTPStatusError):
+                await client.make_prediction_on_batch(["текст", "текст2"])
+            await client.close_connection()
+
+        self.assertTrue(client.binary_data)
+        self.assertEqual([r["binary"] for r in stub.requests], [True])
+
+    async def test_json_mode_by_default(self):
+        with TritonStub() as stub:
+            client = await AsyncTritonApiClient.create(stub.url, stub.port, "model")
+            result = await client.make_prediction_on_batch(["текст"])
+            await client.close_connection()
+
+        self.assertEqual(result, ["model:текст"])
+        self.assertEqual([r["binary"] for r in stub.requests], [False])
+
+
+if __name__ == '__main__':
+    unittest.main()
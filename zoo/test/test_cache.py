@@ -0,0 +1,136 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.cache import CachedPredictor, PredictionCache, hash_text
+
+MODEL_ID = ("model", "1")
+
+
+def make_predictor(delay=0.0):
+    predictor = MagicMock(model_name="model")
+
+    async def predict(texts):
+        await asyncio.sleep(delay)
+        return [f"pred_{t}" for t in texts]
+
+    predictor.make_prediction = AsyncMock(side_effect=predict)
+    return predictor
+
+
+class TestPredictionCache(unittest.IsolatedAsyncioTestCase):
+    async def test_hits_and_misses(self):
+        cache = PredictionCache()
+        predictor = make_predictor()
+
+        first = await cache.get_or_predict(predictor, MODEL_ID, ["a", "b"])
+        second = await cache.get_or_predict(predictor, MODEL_ID, ["b", "c"])
+
+        self.assertEqual(first, ["pred_a", "pred_b"])
+        self.assertEqual(second, ["pred_b", "pred_c"])
+        self.assertEqual(predictor.make_prediction.await_args_list[1].args, (["c"],))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 3, "coalesced": 0, "size": 3})
+
+    async def test_duplicates_in_batch(self):
+        cache = PredictionCache()
+        predictor = make_predictor()
+
+        result = await cache.get_or_predict(predictor, MODEL_ID, ["a", "b", "a", "a"])
+
+        self.assertEqual(result, ["pred_a", "pred_b", "pred_a", "pred_a"])
+        predictor.make_prediction.assert_awaited_once_with(["a", "b"])
+        self.assertEqual(cache.coalesced, 2)
+
+    async def test_single_flight(self):
+        cache = PredictionCache()
+        predictor = make_predictor(delay=0.01)
+
+        results = await asyncio.gather(
+            cache.get_or_predict(predictor, MODEL_ID, ["a", "b"]),
+            cache.get_or_predict(predictor, MODEL_ID, ["b", "c"]),
+        )
+
+        self.assertEqual(results, [["pred_a", "pred_b"], ["pred_b", "pred_c"]])
+        self.assertEqual(
+            [call.args for call in predictor.make_prediction.await_args_list],
+            [(["a", "b"],), (["c"],)],
+        )
+
+    async def test_error_is_shared_with_waiting_callers(self):
+        cache = PredictionCache()
+        predictor = make_predictor(delay=0.01)
+        predictor.make_prediction.side_effect = RuntimeError("model is down")
+
+        results = await asyncio.gather(
+            cache.get_or_predict(predictor, MODEL_ID, ["a"]),
+            cache.get_or_predict(predictor, MODEL_ID, ["a"]),
+            return_exceptions=True,
+        )
+
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    async def test_cancelled_owner_does_not_cancel_waiting_callers(self):
+        cache = PredictionCache()
+        predictor = make_predictor(delay=0.05)
+
+        owner = asyncio.create_task(cache.get_or_predict(predictor, MODEL_ID, ["a"]))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_predict(predictor, MODEL_ID, ["a", "b"]))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+
+        self.assertEqual(await waiter, ["pred_a", "pred_b"])
+        self.assertTrue(owner.cancelled())
+        self.assertEqual(predictor.make_prediction.await_count, 3)
+
+    async def test_model_versions_are_separated(self):
+        cache = PredictionCache()
+        predictor = make_predictor()
+
+        await cache.get_or_predict(predictor, ("model", "1"), ["a"])
+        await cache.get_or_predict(predictor, ("model", "2"), ["a"])
+
+        self.assertEqual(predictor.make_prediction.await_count, 2)
+
+    async def test_cached_predictor(self):
+        cache = PredictionCache()
+        predictor = CachedPredictor(cache, make_predictor(), MODEL_ID)
+
+        self.assertEqual(predictor.model_name, "model")
+        self.assertEqual(await predictor.make_prediction(["a", "a"]), ["pred_a", "pred_a"])
+
+
+class TestPredictionCacheStorage(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_size=2)
+        cache.put(("m", "1", b"a"), "pa")
+        cache.put(("m", "1", b"b"), "pb")
+        cache.get(("m", "1", b"a"))
+        cache.put(("m", "1", b"c"), "pc")
+
+        self.assertEqual(cache.get(("m", "1", b"a")), "pa")
+        self.assertIsNone(cache.get(("m", "1", b"b")))
+
+    def test_ttl(self):
+        cache = PredictionCache(ttl=10)
+        with patch("app.cache.time.monotonic", return_value=100):
+            cache.put(("m", "1", b"a"), "pa")
+        with patch("app.cache.time.monotonic", return_value=105):
+            self.assertEqual(cache.get(("m", "1", b"a")), "pa")
+        with patch("app.cache.time.monotonic", return_value=111):
+            self.assertIsNone(cache.get(("m", "1", b"a")))
+
+    def test_invalidate(self):
+        cache = PredictionCache()
+        cache.put(("m1", "1", hash_text("a")), "pa")
+        cache.put(("m2", "1", hash_text("a")), "pa")
+
+        cache.invalidate("m1")
+
+        self.assertIsNone(cache.get(("m1", "1", hash_text("a"))))
+        self.assertEqual(cache.get(("m2", "1", hash_text("a"))), "pa")
+
+
+if __name__ == '__main__':
+    unittest.main()
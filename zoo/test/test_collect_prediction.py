@@ -1,9 +1,10 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from app.main import collect_predictions
-from app.models import ServiceInput, TextToPredict, TextList
+from app.models import ServiceInput, TextToPredict
+from app.scheduler import ModelsUnavailable
 
-class TestCollectPredictions(unittest.TestCase):
+class TestCollectPredictions(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         self.label_mapping = {
             "class1": ("mapped_class1", "#FF0000"),
@@ -33,41 +34,32 @@ class TestCollectPredictions(unittest.TestCase):
             ]
         }
 
-    @patch('app.main.process_text')
-    @patch('requests.post')
-    def test_collect_predictions_with_sending(self, mock_post, mock_process_text):
+        self.delivery = MagicMock()
+        self.delivery.send = AsyncMock(return_value=True)
+
+    @patch('app.main.predict_all')
+    async def test_collect_predictions_with_sending(self, mock_process_text):
         mock_process_text.return_value = [["class1"], ["class2"]]
         
-        mock_post.return_value.status_code = 200
-
         endpoint = "http://example.ru/predictions"
-        collect_predictions(self.test_input, self.label_mapping, endpoint)
+        await collect_predictions(self.test_input, self.label_mapping, "нерелевантный", ";", endpoint, self.delivery)
 
-        mock_process_text.assert_called_once_with(
-            TextList(text_list=["text1", "text2"])
-        )
+        mock_process_text.assert_awaited_once_with(["text1", "text2"])
 
-        mock_post.assert_called_once_with(
-            endpoint,
-            json=self.expected_output
-        )
+        self.delivery.send.assert_awaited_once_with(endpoint, self.expected_output)
 
-    @patch('app.main.process_text')
-    @patch('requests.post')
-    def test_collect_predictions_without_sending(self, mock_post, mock_process_text):
+    @patch('app.main.predict_all')
+    async def test_collect_predictions_without_sending(self, mock_process_text):
         mock_process_text.return_value = [["class1"], ["class2"]]
 
-        collect_predictions(self.test_input, self.label_mapping)
+        await collect_predictions(self.test_input, self.label_mapping, "нерелевантный", ";", delivery=self.delivery)
 
-        mock_process_text.assert_called_once_with(
-            TextList(text_list=["text1", "text2"])
-        )
+        mock_process_text.assert_awaited_once_with(["text1", "text2"])
 
-        mock_post.assert_not_called()
+        self.delivery.send.assert_not_awaited()
 
-    @patch('app.main.process_text')
-    @patch('requests.post')
-    def test_collect_predictions(self, mock_post, mock_process_text):
+    @patch('app.main.predict_all')
+    async def test_collect_predictions(self, mock_process_text):
         mock_process_text.return_value = [["нерелевантный"], ["class1"]]
 
         expected_output = {
@@ -88,30 +80,42 @@ class TestCollectPredictions(unittest.TestCase):
         }
 
         endpoint = "http://example.ru/predictions"
-        collect_predictions(self.test_input, self.label_mapping, endpoint)
+        await collect_predictions(self.test_input, self.label_mapping, "нерелевантный", ";", endpoint, self.delivery)
 
-        mock_post.assert_called_once_with(
-            endpoint,
-            json=expected_output
+        self.delivery.send.assert_awaited_once_with(endpoint, expected_output)
+
+    @patch('app.main.predict_all')
+    async def test_collect_predictions_delivery_failure(self, mock_process_text):
+        mock_process_text.side_effect = [[["class1"]], [["class2"]]]
+        self.delivery.send.return_value = False
+
+        endpoint = "http://example.ru/predictions"
+        await collect_predictions(
+            self.test_input, self.label_mapping, "нерелевантный", ";", endpoint, self.delivery, chunk_size=1
         )
 
-    @patch('app.main.process_text')
-    @patch('requests.post')
-    def test_collect_predictions_error_handling(self, mock_post, mock_process_text):
-        mock_process_text.return_value = [["class1"], ["class2"]]
-        
-        mock_post.side_effect = Exception("Connection error")
+        self.assertEqual(self.delivery.send.await_count, 2)
+
+    @patch('app.main.predict_all')
+    async def test_collect_predictions_in_chunks(self, mock_process_text):
+        mock_process_text.side_effect = [[["class1"]], [["class2"]]]
 
         endpoint = "http://example.ru/predictions"
-        
-        with self.assertRaises(Exception) as context:
-            collect_predictions(self.test_input, self.label_mapping, endpoint)
+        await collect_predictions(
+            self.test_input, self.label_mapping, "нерелевантный", ";", endpoint, self.delivery, chunk_size=1
+        )
 
-        self.assertTrue('Connection error' in str(context.exception))
+        self.assertEqual(
+            [call.args for call in mock_process_text.await_args_list],
+            [(["text1"],), (["text2"],)],
+        )
+        self.assertEqual(
+            [call.args[1] for call in self.delivery.send.await_args_list],
+            [{"texts": [text]} for text in self.expected_output["texts"]],
+        )
 
-    @patch('app.main.process_text')
-    @patch('requests.post')
-    def test_collect_predictions_multiple_predictions(self, mock_post, mock_process_text):
+    @patch('app.main.predict_all')
+    async def test_collect_predictions_multiple_predictions(self, mock_process_text):
         mock_process_text.return_value = [["class1;class2"], ["class2;нерелевантный"]]
 
         expected_output = {
@@ -133,12 +137,20 @@ class TestCollectPredictions(unittest.TestCase):
         }
 
         endpoint = "http://example.ru/predictions"
-        collect_predictions(self.test_input, self.label_mapping, endpoint)
+        await collect_predictions(self.test_input, self.label_mapping, "нерелевантный", ";", endpoint, self.delivery)
 
-        mock_post.assert_called_once_with(
-            endpoint,
-            json=expected_output
-        )
+        self.delivery.send.assert_awaited_once_with(endpoint, expected_output)
+
+    @patch('app.main.predict_all')
+    async def test_unavailable_model_sends_nothing(self, mock_process_text):
+        mock_process_text.side_effect = ModelsUnavailable("The model presui failed")
+
+        with self.assertRaises(ModelsUnavailable):
+            await collect_predictions(
+                self.test_input, self.label_mapping, "нерелевантный", ";", "http://example.ru", self.delivery
+            )
+
+        self.delivery.send.assert_not_awaited()
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,157 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.connections import Reconnector
+from app.models import TritonServerAddr
+from app.utils import init_triton_connections, parse_services
+
+
+def make_server(url="http://example1.ru", model_name="model1"):
+    return TritonServerAddr(url=url, port="8000", model_name=model_name)
+
+
+def make_client(url, port, model_name, *args, **kwargs):
+    return MagicMock(base=f"{url}:{port}/v2", model_name=model_name, close_connection=AsyncMock())
+
+
+class TestParseServices(unittest.TestCase):
+    def test_parse_services(self):
+        services = parse_services([
+            ["http://example1.ru", 8000, "model1"],
+            ["http://example2.ru", "8001", "model1", 3, "grpc"],
+        ])
+
+        self.assertEqual(services[0], make_server())
+        self.assertEqual(
+            (services[1].port, services[1].weight, services[1].protocol), ("8001", 3, "grpc")
+        )
+        self.assertEqual(parse_services(None), [])
+
+    @patch("app.grpc_triton_api_client.grpc", None)
+    def test_grpc_without_package(self):
+        with self.assertRaises(ValueError):
+            parse_services([["http://example1.ru", "8001", "model1", 1, "grpc"]])
+        self.assertEqual(len(parse_services([["http://example1.ru", "8000", "model1"]])), 1)
+
+
+class TestInitTritonConnections(unittest.IsolatedAsyncioTestCase):
+    @patch("app.async_triton_api_client.AsyncTritonApiClient.create")
+    async def test_connects_in_parallel_with_timeout(self, mock_create):
+        async def create(url, port, model_name, **kwargs):
+            if url == "http://slow.ru":
+                await asyncio.sleep(10)
+            if url == "http://down.ru":
+                raise ConnectionError("refused")
+            return make_client(url, port, model_name)
+
+        mock_create.side_effect = create
+        services = [
+            make_server("http://example1.ru"),
+            make_server("http://slow.ru"),
+            make_server("http://down.ru", "model2"),
+            make_server("http://example2.ru"),
+        ]
+
+        start = time.monotonic()
+        groups, failed = await init_triton_connections(services, timeout=0.1)
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual([group.model_name for group in groups], ["model1"])
+        self.assertEqual(len(groups[0]), 2)
+        self.assertEqual([server.url for server, _ in failed], ["http://slow.ru", "http://down.ru"])
+        self.assertIn("refused", failed[1][1])
+
+
+class TestReconnector(unittest.IsolatedAsyncioTestCase):
+    def make_reconnector(self, connect, **kwargs):
+        self.connected = []
+        return Reconnector(connect, self.on_connected, **kwargs)
+
+    def on_connected(self, server, client):
+        self.connected.append(client)
+        return True
+
+    async def test_backoff_after_failure(self):
+        connect = AsyncMock(side_effect=ConnectionError("refused"))
+        reconnector = self.make_reconnector(connect, interval=1, max_interval=3)
+        reconnector.add(make_server(), "refused")
+        service = next(iter(reconnector.pending.values()))
+
+        delays = []
+        for _ in range(3):
+            start = time.monotonic()
+            self.assertFalse(await reconnector.attempt(service))
+            delays.append(service.next_attempt - start)
+
+        self.assertEqual(service.attempts, 4)
+        self.assertAlmostEqual(delays[0], 2, delta=0.25)
+        self.assertAlmostEqual(delays[1], 3, delta=0.35)
+        self.assertAlmostEqual(delays[2], 3, delta=0.35)
+        self.assertEqual(self.connected, [])
+
+    async def test_connects_pending_service_in_background(self):
+        attempts = 0
+
+        async def connect(server):
+            nonlocal attempts
+            attempts += 1
+            if attempts < 2:
+                raise ConnectionError("refused")
+            return make_client(server.url, server.port, server.model_name)
+
+        reconnector = self.make_reconnector(connect, interval=0.01, max_interval=0.02)
+        await reconnector.start()
+        reconnector.add(make_server(), "refused")
+        self.assertEqual(reconnector.model_names(), {"model1"})
+
+        for _ in range(100):
+            if self.connected:
+                break
+            await asyncio.sleep(0.01)
+        await reconnector.stop()
+
+        self.assertEqual(attempts, 2)
+        self.assertEqual(len(self.connected), 1)
+        self.assertEqual(reconnector.pending, {})
+
+    async def test_removed_while_connecting(self):
+        reconnector = None
+        client = make_client("http://example1.ru", "8000", "model1")
+
+        async def connect(server):
+            reconnector.remove(server.model_name)
+            return client
+
+        reconnector = self.make_reconnector(connect)
+        reconnector.add(make_server())
+
+        self.assertFalse(await reconnector.attempt(next(iter(reconnector.pending.values()))))
+        self.assertEqual(self.connected, [])
+        client.close_connection.assert_awaited_once()
+
+    async def test_already_connected(self):
+        client = make_client("http://example1.ru", "8000", "model1")
+        reconnector = Reconnector(AsyncMock(return_value=client), lambda server, client: False)
+        reconnector.add(make_server())
+
+        self.assertTrue(await reconnector.attempt(next(iter(reconnector.pending.values()))))
+        self.assertEqual(reconnector.pending, {})
+        client.close_connection.assert_awaited_once()
+
+    def test_remove(self):
+        reconnector = self.make_reconnector(AsyncMock())
+        reconnector.add(make_server("http://example1.ru"))
+        reconnector.add(make_server("http://example2.ru"))
+        reconnector.add(make_server("http://example1.ru", "model2"))
+
+        self.assertTrue(reconnector.remove("model1", "http://example1.ru:8000/v2"))
+        self.assertFalse(reconnector.remove("model1", "http://example1.ru:8000/v2"))
+        self.assertEqual(reconnector.model_names(), {"model1", "model2"})
+        self.assertTrue(reconnector.remove("model1"))
+        self.assertEqual(reconnector.model_names(), {"model2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock
+
+import httpx
+
+from app.delivery import PlatformDelivery
+from app.metrics import DELIVERY_FAILURES, DELIVERY_LATENCY
+
+URL = "http://platform/add-posts-attributes"
+PAYLOAD = {"texts": [{"id": "1", "predictions": [{"prediction": "класс", "color": "#ffffff"}]}]}
+
+
+class FakePlatform:
+    """Handler for httpx.MockTransport answering with the given status codes."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.payloads = []
+
+    def __call__(self, request):
+        self.payloads.append(json.loads(request.content))
+        response = self.responses.pop(0) if self.responses else 200
+        if isinstance(response, Exception):
+            raise response
+        return httpx.Response(response)
+
+
+class TestPlatformDelivery(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dead_letter_path = os.path.join(self.tmp_dir.name, "dead_letter.jsonl")
+
+    async def asyncTearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_delivery(self, platform, max_retries=3):
+        delivery = PlatformDelivery(
+            max_retries, backoff=0.001, dead_letter_path=self.dead_letter_path,
+            transport=httpx.MockTransport(platform),
+        )
+        self.addAsyncCleanup(delivery.close)
+        return delivery
+
+    def read_dead_letters(self):
+        with open(self.dead_letter_path, encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+
+    async def test_delivered(self):
+        platform = FakePlatform(200)
+
+        self.assertTrue(await self.make_delivery(platform).send(URL, PAYLOAD))
+        self.assertEqual(platform.payloads, [PAYLOAD])
+
+    async def test_retry_on_server_and_network_errors(self):
+        platform = FakePlatform(503, httpx.ConnectError("refused"), 200)
+
+        self.assertTrue(await self.make_delivery(platform).send(URL, PAYLOAD))
+        self.assertEqual(len(platform.payloads), 3)
+        self.assertFalse(os.path.exists(self.dead_letter_path))
+
+    async def test_dead_letter_after_retries(self):
+        platform = FakePlatform(500, 500, 500)
+
+        self.assertFalse(await self.make_delivery(platform, max_retries=2).send(URL, PAYLOAD))
+        self.assertEqual(len(platform.payloads), 3)
+        [record] = self.read_dead_letters()
+        self.assertEqual(record["url"], URL)
+        self.assertEqual(record["payload"], PAYLOAD)
+        self.assertIn("500", record["error"])
+
+    async def test_no_retry_on_client_error(self):
+        platform = FakePlatform(400)
+
+        self.assertFalse(await self.make_delivery(platform).send(URL, PAYLOAD))
+        self.assertEqual(len(platform.payloads), 1)
+        self.assertEqual(len(self.read_dead_letters()), 1)
+
+    async def test_metrics(self):
+        failures = dict(DELIVERY_FAILURES.values)
+        n_requests = DELIVERY_LATENCY.count()
+        platform = FakePlatform(500, httpx.ConnectError("refused"))
+
+        await self.make_delivery(platform, max_retries=1).send(URL, PAYLOAD)
+
+        self.assertEqual(DELIVERY_LATENCY.count(), n_requests + 1)
+        for kind in ("http", "network", "undelivered"):
+            self.assertEqual(DELIVERY_FAILURES.values[(kind,)], failures.get((kind,), 0) + 1)
+
+    async def test_replay_dead_letters(self):
+        await self.make_delivery(FakePlatform(400)).send(URL, PAYLOAD)
+        await self.make_delivery(FakePlatform(400)).send(URL, {"texts": []})
+
+        platform = FakePlatform(200, 400)
+        delivered, failed = await self.make_delivery(platform).replay_dead_letters()
+
+        self.assertEqual((delivered, failed), (1, 1))
+        self.assertEqual([r["payload"] for r in self.read_dead_letters()], [{"texts": []}])
+        self.assertFalse(os.path.exists(self.dead_letter_path + ".replay"))
+
+    async def test_interrupted_replay_is_continued(self):
+        await self.make_delivery(FakePlatform(400)).send(URL, PAYLOAD)
+        platform = FakePlatform(200)
+        delivery = self.make_delivery(platform)
+        # the replay is interrupted after the file is renamed
+        delivery.send = AsyncMock(side_effect=RuntimeError("crash"))
+        with self.assertRaises(RuntimeError):
+            await delivery.replay_dead_letters()
+        # the payloads written meanwhile go to a new file
+        await self.make_delivery(FakePlatform(400)).send(URL, {"texts": []})
+
+        delivered, failed = await self.make_delivery(platform).replay_dead_letters()
+
+        self.assertEqual((delivered, failed), (1, 0))
+        self.assertEqual(platform.payloads, [PAYLOAD])
+        self.assertEqual([r["payload"] for r in self.read_dead_letters()], [{"texts": []}])
+
+
+if __name__ == '__main__':
+    unittest.main()
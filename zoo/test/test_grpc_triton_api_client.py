@@ -0,0 +1,71 @@
+import unittest
+
+try:
+    import grpc
+    from test.grpc_triton_stub import GrpcTritonStub
+except ImportError:
+    grpc = None
+
+from app.grpc_triton_api_client import GrpcTritonApiClient, _channel_users, _channels, grpc_target
+from app.utils import create_triton_client
+
+
+@unittest.skipIf(grpc is None, "tritonclient[grpc] is not installed")
+class TestGrpcTritonApiClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.stub = await GrpcTritonStub(max_batch_size=2, model_version="3").__aenter__()
+        self.addAsyncCleanup(self.stub.__aexit__, None, None, None)
+
+    async def create_client(self, model_name="test_model", **kwargs):
+        client = await GrpcTritonApiClient.create(self.stub.url, self.stub.port, model_name, **kwargs)
+        self.addAsyncCleanup(client.close_connection)
+        return client
+
+    async def test_create(self):
+        client = await self.create_client()
+
+        self.assertEqual(client.base, f"http://127.0.0.1:{self.stub.port}/v2")
+        self.assertEqual(client.max_batch_size, 2)
+        self.assertEqual(client.model_version, "3")
+
+    async def test_is_ready(self):
+        client = await self.create_client()
+
+        self.assertTrue(await client.is_ready())
+        self.stub.ready = False
+        self.assertFalse(await client.is_ready())
+
+    async def test_make_prediction(self):
+        client = await self.create_client(max_concurrency=2)
+        texts = ["text1", "текст2", "text3"]
+
+        result = await client.make_prediction(texts)
+
+        self.assertEqual(result, [f"test_model:{t}" for t in texts])
+        self.assertEqual(sorted(self.stub.requests), [["text1", "текст2"], ["text3"]])
+
+    async def test_inference_error(self):
+        client = await self.create_client()
+
+        with self.assertRaises(grpc.aio.AioRpcError):
+            await client.make_prediction_on_batch(["t1", "t2", "t3"])
+
+    async def test_shared_channel(self):
+        client1 = await self.create_client()
+        client2 = await create_triton_client(self.stub.url, self.stub.port, "other_model", "grpc")
+
+        self.assertIsInstance(client2, GrpcTritonApiClient)
+        self.assertEqual(_channel_users[client1.target], 2)
+        await client2.close_connection()
+        self.assertIn(client1.target, _channels)
+        self.assertEqual(await client1.make_prediction_on_batch(["t"]), ["test_model:t"])
+
+
+class TestGrpcTarget(unittest.TestCase):
+    def test_grpc_target(self):
+        self.assertEqual(grpc_target("http://triton", 8001), "triton:8001")
+        self.assertEqual(grpc_target("triton", "8001"), "triton:8001")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.health import CircuitBreaker, HealthMonitor
+
+
+def make_client(name, ready=True):
+    client = MagicMock(model_name=name)
+    client.is_ready = AsyncMock(return_value=ready)
+    return client
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_failures_in_row(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "degraded")
+        self.assertTrue(breaker.allow_request())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow_request())
+
+    def test_success_closes(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, "degraded")
+
+    def test_half_open_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+
+        self.assertTrue(breaker.allow_request())
+        # only one trial at a time
+        self.assertFalse(breaker.allow_request())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow_request())
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "healthy")
+
+    def test_abandoned_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow_request())
+
+        breaker.abandon_trial()
+
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow_request())
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow_request())
+
+
+class TestHealthMonitor(unittest.IsolatedAsyncioTestCase):
+    async def test_check(self):
+        health = HealthMonitor(failure_threshold=1, reset_timeout=60)
+        clients = [make_client("up"), make_client("down", ready=False)]
+
+        await health.check(clients)
+
+        self.assertEqual(health.states(), {"up": "healthy", "down": "open"})
+        # the open circuit is probed without waiting for a trial request
+        clients[1].is_ready.return_value = True
+        await health.check(clients)
+        self.assertEqual(health.states(), {"up": "healthy", "down": "healthy"})
+
+    async def test_check_error_and_timeout(self):
+        health = HealthMonitor(failure_threshold=2, timeout=0.01)
+        failing = make_client("failing")
+        failing.is_ready.side_effect = ConnectionError("refused")
+        hanging = make_client("hanging")
+
+        async def hang():
+            await asyncio.sleep(1)
+
+        hanging.is_ready.side_effect = hang
+
+        await health.check([failing, hanging])
+
+        self.assertEqual(health.states(), {"failing": "degraded", "hanging": "degraded"})
+
+    async def test_background_checks(self):
+        health = HealthMonitor(interval=0.01, failure_threshold=1, reset_timeout=0.01)
+        client = make_client("model", ready=False)
+
+        await health.start(lambda: [client])
+        await asyncio.sleep(0.05)
+        self.assertEqual(health.states(), {"model": "open"})
+        client.is_ready.return_value = True
+        await asyncio.sleep(0.05)
+        await health.stop()
+
+        self.assertEqual(health.states(), {"model": "healthy"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import unittest
+
+from app.hedging import HedgeBudget, Hedger, LatencyWindow
+
+
+def make_call(result, delay=0.0, error=None):
+    calls = {"started": 0, "cancelled": 0}
+
+    async def call():
+        calls["started"] += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            calls["cancelled"] += 1
+            raise
+        if error is not None:
+            raise error
+        return result
+
+    return call, calls
+
+
+class TestLatencyWindow(unittest.TestCase):
+    def test_quantile(self):
+        window = LatencyWindow(size=100)
+        for i in range(200):
+            window.add(i / 1000)
+
+        self.assertEqual(len(window), 100)
+        self.assertAlmostEqual(window.quantile(0.95), 0.195)
+        self.assertAlmostEqual(window.quantile(1.0), 0.199)
+
+
+class TestHedgeBudget(unittest.TestCase):
+    def test_ratio_and_burst(self):
+        budget = HedgeBudget(0.5, burst=2)
+
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+
+        for _ in range(10):
+            budget.deposit()
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+
+
+class TestHedger(unittest.IsolatedAsyncioTestCase):
+    def make_hedger(self, budget=1.0):
+        hedger = Hedger("model", quantile=0.95, budget=budget, min_samples=5)
+        for _ in range(50):
+            hedger.latency.add(0.01)
+        return hedger
+
+    async def test_no_hedge_before_enough_samples(self):
+        hedger = Hedger("model", budget=1.0, min_samples=5)
+        primary, primary_calls = make_call("primary", delay=0.05)
+        backup, backup_calls = make_call("backup")
+
+        self.assertEqual(await hedger.run(primary, backup), "primary")
+        self.assertEqual(backup_calls["started"], 0)
+        self.assertEqual(len(hedger.latency), 1)
+
+    async def test_slow_call_is_hedged(self):
+        hedger = self.make_hedger()
+        primary, primary_calls = make_call("primary", delay=1)
+        backup, backup_calls = make_call("backup")
+
+        self.assertEqual(await hedger.run(primary, backup), "backup")
+        await asyncio.sleep(0)
+
+        self.assertEqual(primary_calls["cancelled"], 1)
+        self.assertEqual(hedger.stats()["hedged"], 1)
+        self.assertEqual(hedger.stats()["won"], 1)
+        self.assertEqual(hedger.stats()["hedge_rate"], 1.0)
+
+    async def test_fast_call_is_not_hedged(self):
+        hedger = self.make_hedger()
+        primary, _ = make_call("primary")
+        backup, backup_calls = make_call("backup")
+
+        self.assertEqual(await hedger.run(primary, backup), "primary")
+        self.assertEqual(backup_calls["started"], 0)
+
+    async def test_failed_hedge_waits_for_primary(self):
+        hedger = self.make_hedger()
+        primary, _ = make_call("primary", delay=0.1)
+        backup, _ = make_call("backup", error=ConnectionError("refused"))
+
+        self.assertEqual(await hedger.run(primary, backup), "primary")
+        self.assertEqual(hedger.stats()["won"], 0)
+
+        primary, _ = make_call("primary", delay=0.1, error=ConnectionError("primary"))
+        with self.assertRaisesRegex(ConnectionError, "refused"):
+            await hedger.run(primary, backup)
+
+    async def test_budget_limits_hedges(self):
+        hedger = self.make_hedger(budget=0.5)
+        hedger.budget.tokens = 0
+
+        for _ in range(4):
+            primary, _ = make_call("primary", delay=0.1)
+            backup, _ = make_call("backup")
+            await hedger.run(primary, backup)
+
+        self.assertEqual(hedger.stats()["batches"], 4)
+        self.assertEqual(hedger.stats()["hedged"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import httpx
+from fastapi import HTTPException
+
+from app.jobs import JobQueue, is_transient
+from app.models import ServiceInput, TextToPredict
+from app.scheduler import ModelsUnavailable
+
+
+def make_input(n):
+    return ServiceInput(texts=[TextToPredict(text_id=str(i), text=f"text{i}") for i in range(n)])
+
+
+async def wait_for_status(queue, job_id, status, timeout=2):
+    async def poll():
+        while queue.get(job_id).status != status:
+            await asyncio.sleep(0.005)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+class TestJobQueue(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "jobs.sqlite")
+        self.chunks = []
+
+    async def asyncTearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def handler(self, data):
+        self.chunks.append([t.text_id for t in data.texts])
+
+    async def test_job_is_processed_in_chunks(self):
+        queue = JobQueue(self.path, self.handler, n_workers=1, chunk_size=2)
+        await queue.start()
+
+        job_id = await queue.submit(make_input(5))
+        await wait_for_status(queue, job_id, "done")
+        await queue.stop()
+
+        self.assertEqual(self.chunks, [["0", "1"], ["2", "3"], ["4"]])
+        job = queue.get(job_id)
+        self.assertEqual((job.done, job.total), (5, 5))
+        self.assertEqual(queue.pending_texts(), 0)
+        queue.close()
+
+    async def test_unfinished_job_is_resumed(self):
+        processed = asyncio.Event()
+
+        async def stalling_handler(data):
+            self.chunks.append([t.text_id for t in data.texts])
+            if len(self.chunks) == 2:
+                processed.set()
+                await asyncio.sleep(10)
+
+        queue = JobQueue(self.path, stalling_handler, n_workers=1, chunk_size=2)
+        await queue.start()
+        job_id = await queue.submit(make_input(5))
+        await asyncio.wait_for(processed.wait(), 2)
+        await queue.stop()
+        queue.close()
+
+        queue = JobQueue(self.path, self.handler, n_workers=1, chunk_size=2)
+        self.assertEqual(queue.pending_texts(), 3)
+        await queue.start()
+        await wait_for_status(queue, job_id, "done")
+        await queue.stop()
+        queue.close()
+
+        self.assertEqual(self.chunks, [["0", "1"], ["2", "3"], ["2", "3"], ["4"]])
+
+    async def test_cancel(self):
+        queue = JobQueue(self.path, self.handler)
+        job_id = await queue.submit(make_input(3))
+
+        self.assertTrue(await queue.cancel(job_id))
+        self.assertFalse(await queue.cancel(job_id))
+        self.assertFalse(await queue.cancel("unknown"))
+
+        await queue.start()
+        await asyncio.sleep(0.05)
+        await queue.stop()
+
+        self.assertEqual(queue.get(job_id).status, "cancelled")
+        self.assertEqual(self.chunks, [])
+        queue.close()
+
+    async def test_failed_job(self):
+        async def failing_handler(data):
+            raise RuntimeError("platform is down")
+
+        queue = JobQueue(self.path, failing_handler)
+        await queue.start()
+        job_id = await queue.submit(make_input(1))
+        await wait_for_status(queue, job_id, "failed")
+        await queue.stop()
+
+        self.assertEqual(queue.get(job_id).error, "platform is down")
+        queue.close()
+
+    async def test_transient_error_is_retried(self):
+        calls = 0
+
+        async def restarting_handler(data):
+            nonlocal calls
+            calls += 1
+            if calls <= 2:
+                raise ModelsUnavailable("The models ['presui'] are unavailable")
+            self.chunks.append([t.text_id for t in data.texts])
+
+        queue = JobQueue(
+            self.path, restarting_handler, n_workers=1, chunk_size=2, poll_interval=0.01, retry_backoff=0.01
+        )
+        await queue.start()
+        job_id = await queue.submit(make_input(3))
+        await wait_for_status(queue, job_id, "done")
+        await queue.stop()
+
+        self.assertEqual(self.chunks, [["0", "1"], ["2"]])
+        self.assertIsNone(queue.get(job_id).error)
+        queue.close()
+
+    def test_is_transient(self):
+        self.assertTrue(is_transient(ModelsUnavailable("down")))
+        self.assertTrue(is_transient(httpx.ConnectError("refused")))
+        self.assertTrue(is_transient(HTTPException(status_code=503)))
+        self.assertFalse(is_transient(HTTPException(status_code=400)))
+        self.assertFalse(is_transient(ValueError("Expected 2 predictions from the model, got 1")))
+
+    async def test_fixed_number_of_workers(self):
+        running = 0
+        peak = 0
+
+        async def slow_handler(data):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        queue = JobQueue(self.path, slow_handler, n_workers=2)
+        await queue.start()
+        job_ids = [await queue.submit(make_input(1)) for _ in range(5)]
+        for job_id in job_ids:
+            await wait_for_status(queue, job_id, "done")
+        await queue.stop()
+
+        self.assertEqual(peak, 2)
+        queue.close()
+
+    async def test_check_in_insert_transaction(self):
+        queue = JobQueue(self.path, self.handler)
+
+        def check(pending, n_texts):
+            if pending + n_texts > 3:
+                raise OverflowError("queue is full")
+
+        await queue.submit(make_input(2), check)
+        with self.assertRaises(OverflowError):
+            await queue.submit(make_input(2), check)
+
+        self.assertEqual(queue.pending_texts(), 2)
+        queue.close()
+
+    async def test_shared_file_processes_job_once(self):
+        queues = [
+            JobQueue(self.path, self.handler, n_workers=2, poll_interval=0.01) for _ in range(3)
+        ]
+        for queue in queues:
+            await queue.start()
+
+        job_ids = [await queues[0].submit(make_input(1)) for _ in range(6)]
+        for job_id in job_ids:
+            # the status is the same whichever worker is asked
+            await wait_for_status(queues[2], job_id, "done")
+        for queue in queues:
+            await queue.stop()
+            queue.close()
+
+        self.assertEqual(sorted(self.chunks), [["0"]] * 6)
+
+    async def test_expired_lease_is_taken_over(self):
+        async def stalling_handler(data):
+            await asyncio.sleep(10)
+
+        crashed = JobQueue(self.path, stalling_handler, n_workers=1, lease=0.05)
+        await crashed.start()
+        job_id = await crashed.submit(make_input(1))
+        await wait_for_status(crashed, job_id, "running")
+
+        queue = JobQueue(self.path, self.handler, n_workers=1, poll_interval=0.01)
+        await queue.start()
+        await wait_for_status(queue, job_id, "done")
+        await queue.stop()
+        queue.close()
+
+        self.assertEqual(self.chunks, [["0"]])
+        await crashed.stop()
+        crashed.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import io
+import json
+import logging
+import unittest
+
+from app.logs import JsonFormatter, sample_payload, setup_logging
+
+
+class TestJsonFormatter(unittest.TestCase):
+    def test_extra_fields(self):
+        record = logging.LogRecord("app.test", logging.INFO, "", 0, "Predicted %d texts", (3,), None)
+        record.model_ms = {"model1": 12.5}
+
+        data = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(data["message"], "Predicted 3 texts")
+        self.assertEqual(data["level"], "INFO")
+        self.assertEqual(data["logger"], "app.test")
+        self.assertEqual(data["model_ms"], {"model1": 12.5})
+
+
+class TestSetupLogging(unittest.TestCase):
+    def test_records_are_written_by_listener(self):
+        stream = io.StringIO()
+        setup_logging(stream=stream)
+
+        logging.getLogger("app.test").info("Сообщение", extra={"texts": 2})
+        logging.getLogger("app.test").debug("Hidden")
+        # the new setup stops the listener, the queued records are written
+        setup_logging()
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["message"], "Сообщение")
+        self.assertEqual(json.loads(lines[0])["texts"], 2)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            setup_logging("xml")
+
+
+class TestSamplePayload(unittest.TestCase):
+    def test_disabled(self):
+        self.assertIsNone(sample_payload(["text"], 0))
+
+    def test_truncated(self):
+        items = [{"id": str(i), "predictions": ["класс"]} for i in range(100)]
+
+        self.assertEqual(len(json.loads(sample_payload(items, 1.0, max_items=3))), 3)
+        self.assertEqual(len(sample_payload(items, 1.0, max_chars=50)), 53)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,21 @@
+import asyncio
+import json
+import os
+import tempfile
 import unittest
-from unittest.mock import patch,  MagicMock
+from unittest.mock import patch,  MagicMock, AsyncMock
+
+import msgpack
 from fastapi.testclient import TestClient
 
-from app.main import app
+from app.main import app, apply_registry, process_batch_chunk, register_replica
 from app.models import TextList, ServiceInput, TextToPredict, TritonServerAddr
 from app.utils import normalize_predictions
+from app.cache import PredictionCache
+from app.admission import AdmissionController
+from app.replicas import ReplicaGroup
+from app.registry import RegistryWatcher, ServiceRegistry
+from app.jobs import JobQueue
 
 
 class TestTritonAPI(unittest.TestCase):
@@ -26,6 +37,10 @@ class TestTritonAPI(unittest.TestCase):
 
         self.client = TestClient(app)
 
+        # the jobs of the tests are not left in the file of the config
+        self.job_queue = app.state.job_queue
+        app.state.job_queue = JobQueue(":memory:", process_batch_chunk)
+
         self.yaml_patcher = patch('builtins.open')
         self.mock_open = self.yaml_patcher.start()
         
@@ -44,6 +59,8 @@ class TestTritonAPI(unittest.TestCase):
     def tearDown(self):
         self.yaml_patcher.stop()
         self.yaml_load_patcher.stop()
+        app.state.job_queue.close()
+        app.state.job_queue = self.job_queue
 
     def test_normalize_predictions(self):
         predictions = [
@@ -80,18 +97,147 @@ class TestTritonAPI(unittest.TestCase):
         test_data = TextList(text_list=["sample text"])
         
         app.state.triton_model_list = [MagicMock()]
-        app.state.triton_model_list[0].make_prediction.return_value = ["pred1"]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(return_value=["pred1"])
         
         response = self.client.post("/predict", json=test_data.model_dump())
         
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), [["pred1"]])
 
+    def test_process_text_msgpack(self):
+        app.state.prediction_cache = None
+        app.state.triton_model_list = [MagicMock(model_name="msgpack_model")]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(return_value=["pred1", "pred2"])
+
+        response = self.client.post(
+            "/predict",
+            content=msgpack.packb({"text_list": ["text1", "text2"]}),
+            headers={"Content-Type": "application/x-msgpack", "Accept": "application/x-msgpack"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-msgpack")
+        self.assertEqual(msgpack.unpackb(response.content), [["pred1"], ["pred2"]])
+
+    def test_process_text_invalid_body(self):
+        response = self.client.post("/predict", json={"text_list": ["text1", 2]})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["detail"], [{
+            "type": "string_type", "loc": ["body", "text_list", 1],
+            "msg": "Input should be a valid string", "input": 2,
+        }])
+
+    def test_process_text_whole_list_per_model(self):
+        test_data = TextList(text_list=["text1", "text2", "text3"])
+
+        app.state.triton_model_list = [MagicMock(), MagicMock()]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(
+            side_effect=lambda texts: [f"a_{t}" for t in texts]
+        )
+        app.state.triton_model_list[1].make_prediction = AsyncMock(
+            side_effect=lambda texts: [f"b_{t}" for t in texts]
+        )
+
+        response = self.client.post("/predict", json=test_data.model_dump())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            ["a_text1", "b_text1"], ["a_text2", "b_text2"], ["a_text3", "b_text3"]
+        ])
+        for tr in app.state.triton_model_list:
+            tr.make_prediction.assert_awaited_once_with(["text1", "text2", "text3"])
+
+    def test_process_text_duplicates_are_predicted_once(self):
+        test_data = TextList(text_list=["text1", "text2", "text1"])
+
+        app.state.prediction_cache = PredictionCache()
+        app.state.triton_model_list = [MagicMock(model_name="dedup_model", model_version="1")]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(
+            side_effect=lambda texts: [f"pred_{t}" for t in texts]
+        )
+
+        response = self.client.post("/predict", json=test_data.model_dump())
+
+        self.assertEqual(response.json(), [["pred_text1"], ["pred_text2"], ["pred_text1"]])
+        app.state.triton_model_list[0].make_prediction.assert_awaited_once_with(["text1", "text2"])
+        self.assertEqual(self.client.get("/cache_stats").json()["coalesced"], 1)
+
+    def test_metrics(self):
+        app.state.prediction_cache = None
+        app.state.triton_model_list = [MagicMock(model_name="metrics_model")]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(return_value=["pred1"])
+        self.client.post("/predict", json={"text_list": ["text1"]})
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('zoo_http_requests_total{endpoint="/predict",method="POST",status="200"}', response.text)
+        self.assertIn("zoo_batch_queue_texts ", response.text)
+        self.assertIn('zoo_in_flight_texts{model="metrics_model"} 0', response.text)
+        self.assertIn("zoo_predicted_texts_total ", response.text)
+
+    def test_process_text_skips_failed_model(self):
+        app.state.prediction_cache = None
+        app.state.triton_model_list = [
+            MagicMock(model_name="up_model"), MagicMock(model_name="down_model")
+        ]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(return_value=["pred1"])
+        app.state.triton_model_list[1].make_prediction = AsyncMock(
+            side_effect=ConnectionError("refused")
+        )
+
+        response = self.client.post("/predict", json={"text_list": ["text1"]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [["pred1"]])
+        self.assertEqual(response.headers["X-Skipped-Models"], "down_model")
+        self.assertEqual(
+            self.client.get("/models_health").json(),
+            {"up_model": "healthy", "down_model": "degraded"},
+        )
+
+        app.state.triton_model_list.pop(0)
+        response = self.client.post("/predict", json={"text_list": ["text1"]})
+        self.assertEqual(response.status_code, 503)
+        app.state.health.remove("down_model")
+
+    def test_process_text_deadline(self):
+        app.state.prediction_cache = None
+        app.state.prediction_store = None
+
+        async def hang(texts):
+            await asyncio.sleep(10)
+
+        app.state.triton_model_list = [
+            MagicMock(model_name="fast_model"), MagicMock(model_name="slow_model")
+        ]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(return_value=["pred1"])
+        app.state.triton_model_list[1].make_prediction = AsyncMock(side_effect=hang)
+        headers = {"X-Request-Timeout": "0.05"}
+
+        response = self.client.post("/predict", json={"text_list": ["text1"]}, headers=headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [["pred1"]])
+        self.assertEqual(response.headers["X-Skipped-Models"], "slow_model")
+        self.assertEqual(response.headers["X-Incomplete"], "true")
+
+        app.state.triton_model_list.pop(0)
+        response = self.client.post("/predict", json={"text_list": ["text1"]}, headers=headers)
+        self.assertEqual(response.status_code, 504)
+
+        headers["X-Request-Timeout"] = "-1"
+        response = self.client.post("/predict", json={"text_list": ["text1"]}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        app.state.health.remove("fast_model")
+        app.state.health.remove("slow_model")
+
     def test_process_text_list(self):
         test_data = TextList(text_list=["sample text"])
         
-        app.state.triton_model_list = [MagicMock()]
-        app.state.triton_model_list[0].make_prediction.return_value = ["класс1"]
+        app.state.triton_model_list = [MagicMock(max_batch_size=8)]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(return_value=["класс1"])
         app.state.label_mapping = self.mapping_data
         
         response = self.client.post("/predict_on_text", json=test_data.model_dump())
@@ -99,15 +245,65 @@ class TestTritonAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), [["mapped_class1"]])
          
+    def test_predict_stream(self):
+        app.state.prediction_cache = None
+        app.state.triton_model_list = [MagicMock(max_batch_size=8, model_name="stream_model")]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(
+            side_effect=lambda texts: ["класс1" if t == "text1" else "unknown" for t in texts]
+        )
+        app.state.label_mapping = self.mapping_data
+        app.state.config = {"separator": ";", "stream_chunk_size": 1}
+
+        response = self.client.post(
+            "/predict_stream",
+            content='{"text": "text1", "text_id": "1"}\n"text2"\n'.encode(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        raw_response = self.client.post("/predict_stream?raw=true", json={"text_list": ["text1"]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [json.loads(line) for line in response.text.splitlines()],
+            [
+                {"index": 0, "predictions": ["mapped_class1"], "text_id": "1"},
+                {"index": 1, "predictions": ["нерелевантный"]},
+            ],
+        )
+        self.assertEqual(json.loads(raw_response.text), {"index": 0, "predictions": ["класс1"]})
+
+    def test_predict_stream_is_admitted(self):
+        admission = app.state.admission
+        app.state.admission = AdmissionController(max_texts_per_request=2, max_model_in_flight_texts=1)
+        app.state.prediction_cache = None
+        app.state.triton_model_list = [MagicMock(max_batch_size=8, model_name="stream_model")]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(side_effect=lambda texts: ["класс1"] * len(texts))
+        app.state.label_mapping = self.mapping_data
+        app.state.config = {"separator": ";", "stream_chunk_size": 1, "stream_max_in_flight_chunks": 1}
+
+        response = self.client.post(
+            "/predict_stream",
+            content='"text1"\n"text2"\n"text3"\n'.encode(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        with app.state.admission.model_slots(["stream_model"], 1):
+            busy_response = self.client.post("/predict_stream", json={"text_list": ["text1"]})
+        app.state.admission = admission
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([line.get("index") for line in lines], [0, 1, None])
+        self.assertIn("Too many texts", lines[-1]["error"])
+        self.assertIn("overloaded", json.loads(busy_response.text)["error"])
+
     def test_show_services(self):
-        app.state.triton_model_list = [
-            MagicMock(base="http://example1.ru:8000/v2", model_name="model1"),
-            MagicMock(base="http://example2.ru:8001/v2", model_name="model2")
-        ]
+        app.state.triton_model_list = [ReplicaGroup("model1"), ReplicaGroup("model2")]
+        app.state.triton_model_list[0].add(MagicMock(base="http://example1.ru:8000/v2"))
+        app.state.triton_model_list[1].add(MagicMock(base="http://example2.ru:8001/v2"))
+        app.state.triton_model_list[1].add(MagicMock(base="http://example3.ru:8001/v2"))
 
         expected_response = [
             {"url": "http://example1.ru:8000/v2", "model_name": "model1"},
-            {"url": "http://example2.ru:8001/v2", "model_name": "model2"}
+            {"url": "http://example2.ru:8001/v2", "model_name": "model2"},
+            {"url": "http://example3.ru:8001/v2", "model_name": "model2"}
         ]
 
         response = self.client.get("/show_services")
@@ -115,6 +311,146 @@ class TestTritonAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), expected_response)
 
+    def test_batch_sizes(self):
+        adaptive = MagicMock(base="http://example1.ru:8000/v2")
+        adaptive.batch_sizing.stats.return_value = {"max_batch_size": 32, "batch_size": 16}
+        app.state.triton_model_list = [ReplicaGroup("model1")]
+        app.state.triton_model_list[0].add(adaptive)
+        app.state.triton_model_list[0].add(
+            MagicMock(base="http://example2.ru:8000/v2", max_batch_size=32, batch_size=32, batch_sizing=None)
+        )
+
+        response = self.client.get("/batch_sizes")
+
+        self.assertEqual(response.json(), {"model1": [
+            {"url": "http://example1.ru:8000/v2", "max_batch_size": 32, "batch_size": 16},
+            {"url": "http://example2.ru:8000/v2", "max_batch_size": 32, "batch_size": 32},
+        ]})
+
+    def test_hedge_stats(self):
+        app.state.triton_model_list = [ReplicaGroup("model1", hedge_quantile=0.95), ReplicaGroup("model2")]
+
+        response = self.client.get("/hedge_stats")
+
+        self.assertEqual(response.json(), {"model1": {
+            "batches": 0, "hedged": 0, "won": 0, "hedge_rate": 0.0, "delay_ms": None,
+        }})
+
+    @patch('app.async_triton_api_client.AsyncTritonApiClient.create')
+    def test_connect_and_disconnect_replicas(self, mock_create):
+        app.state.triton_model_list = []
+        mock_create.side_effect = lambda url, port, model_name, **kwargs: MagicMock(
+            base=f"{url}:{port}/v2", model_name=model_name, close_connection=AsyncMock()
+        )
+        server = {"url": "http://example1.ru", "port": "8000", "model_name": "model1"}
+
+        self.assertEqual(self.client.post("/connect_server", json=server).json(), 200)
+        self.assertEqual(self.client.post("/connect_server", json=server).json(), 400)
+        server["url"] = "http://example2.ru"
+        self.assertEqual(self.client.post("/connect_server", json=server).json(), 200)
+
+        self.assertEqual(len(app.state.triton_model_list), 1)
+        self.assertEqual(len(app.state.triton_model_list[0]), 2)
+
+        params = {"model_name": "model1", "url": "http://example1.ru", "port": "8000"}
+        self.assertEqual(self.client.delete("/disconnect_server", params=params).json(), 200)
+        self.assertEqual(self.client.delete("/disconnect_server", params=params).json(), 400)
+        self.assertEqual(
+            self.client.get("/show_services").json(),
+            [{"url": "http://example2.ru:8000/v2", "model_name": "model1"}],
+        )
+
+        response = self.client.delete("/disconnect_server", params={"model_name": "model1"})
+        self.assertEqual(response.json(), 200)
+        self.assertEqual(app.state.triton_model_list, [])
+
+    @patch('app.async_triton_api_client.AsyncTritonApiClient.create')
+    def test_connect_server_connected_meanwhile(self, mock_create):
+        app.state.triton_model_list = []
+        first = MagicMock(base="http://example1.ru:8000/v2", model_name="model1", close_connection=AsyncMock())
+        second = MagicMock(base="http://example1.ru:8000/v2", model_name="model1", close_connection=AsyncMock())
+        server = TritonServerAddr(url="http://example1.ru", port="8000", model_name="model1")
+
+        async def create(*args, **kwargs):
+            # the reconnector connects the same service while the request waits
+            register_replica(server, first)
+            return second
+
+        mock_create.side_effect = create
+
+        self.assertEqual(self.client.post("/connect_server", json=server.model_dump()).json(), 200)
+        self.assertEqual(len(app.state.triton_model_list[0]), 1)
+        second.close_connection.assert_awaited_once()
+        first.close_connection.assert_not_awaited()
+        app.state.triton_model_list = []
+
+    def test_ready(self):
+        app.state.triton_model_list = [ReplicaGroup("model1"), ReplicaGroup("model2")]
+        app.state.health.remove("model1")
+        app.state.health.remove("model2")
+        for _ in range(app.state.health.failure_threshold):
+            app.state.health.breaker("model2").record_failure()
+        app.state.reconnector.add(TritonServerAddr(url="http://example3.ru", port="8000", model_name="model3"))
+
+        response = self.client.get("/ready")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["models"], {"model1": "live", "model2": "unavailable", "model3": "pending"}
+        )
+        self.assertEqual(response.json()["pending_services"][0]["url"], "http://example3.ru:8000/v2")
+
+        app.state.triton_model_list = []
+        response = self.client.get("/ready")
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()["ready"])
+
+        params = {"model_name": "model3"}
+        self.assertEqual(self.client.delete("/disconnect_server", params=params).json(), 200)
+        self.assertEqual(self.client.delete("/disconnect_server", params=params).json(), 400)
+        self.assertEqual(self.client.get("/ready").json()["models"], {})
+        app.state.health.remove("model2")
+
+    @patch('app.async_triton_api_client.AsyncTritonApiClient.create')
+    def test_registry_shared_by_workers(self, mock_create):
+        app.state.triton_model_list = []
+        mock_create.side_effect = lambda url, port, model_name, **kwargs: MagicMock(
+            base=f"{url}:{port}/v2", model_name=model_name, close_connection=AsyncMock()
+        )
+        endpoint = app.state.config.get("endpoint_to_send_preds")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "registry.sqlite")
+            app.state.registry = ServiceRegistry(path)
+            other_worker = ServiceRegistry(path)
+            server = {"url": "http://example1.ru", "port": "8000", "model_name": "model1"}
+
+            self.assertEqual(self.client.post("/connect_server", json=server).json(), 200)
+            self.assertEqual([s.url for s in other_worker.snapshot()[1]], ["http://example1.ru"])
+            self.client.put("/update_platform_endpoint?new_endpoint=http://new-endpoint.ru")
+            self.assertEqual(other_worker.snapshot()[2], {"endpoint_to_send_preds": "http://new-endpoint.ru"})
+
+            # another worker replaces the replica and the endpoint
+            other_worker.add_service(TritonServerAddr(url="http://example2.ru", port="8000", model_name="model1"))
+            other_worker.remove_services("model1", "http://example1.ru:8000/v2")
+            other_worker.set_setting("endpoint_to_send_preds", None)
+            self.assertTrue(asyncio.run(RegistryWatcher(app.state.registry, apply_registry).check()))
+
+            self.assertEqual(
+                self.client.get("/show_services").json(),
+                [{"url": "http://example2.ru:8000/v2", "model_name": "model1"}],
+            )
+            self.assertIsNone(app.state.config["endpoint_to_send_preds"])
+
+            params = {"model_name": "model1"}
+            self.assertEqual(self.client.delete("/disconnect_server", params=params).json(), 200)
+            self.assertEqual(other_worker.snapshot()[1], [])
+            self.assertEqual(app.state.triton_model_list, [])
+
+            app.state.registry.close()
+            other_worker.close()
+        app.state.registry = None
+        app.state.config["endpoint_to_send_preds"] = endpoint
+
     def test_show_services_empty(self):
         app.state.triton_model_list = []
 
@@ -150,8 +486,83 @@ class TestTritonAPI(unittest.TestCase):
         response = self.client.post("/predict_on_batch", json=test_data.model_dump())
         
         self.assertEqual(response.status_code, 202)
-        self.assertEqual(response.json(), {"status": "texts received"})
+        self.assertEqual(response.json()["status"], "texts received")
     
+    def test_predict_on_batch_msgpack(self):
+        test_data = {"texts": [{"text_id": "1", "text": "text1"}]}
+
+        response = self.client.post(
+            "/predict_on_batch",
+            content=msgpack.packb(test_data),
+            headers={"Content-Type": "application/x-msgpack", "Accept": "application/x-msgpack"},
+        )
+
+        self.assertEqual(response.status_code, 202)
+        job_id = msgpack.unpackb(response.content)["job_id"]
+        self.assertEqual(self.client.get(f"/jobs/{job_id}").json()["total"], 1)
+        self.client.delete(f"/jobs/{job_id}")
+
+    def test_batch_job_status_and_cancel(self):
+        test_data = {"texts": [{"text_id": "1", "text": "text1"}]}
+
+        job_id = self.client.post("/predict_on_batch", json=test_data).json()["job_id"]
+
+        response = self.client.get(f"/jobs/{job_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], 1)
+        self.assertEqual(response.json()["done"], 0)
+
+        response = self.client.delete(f"/jobs/{job_id}")
+        self.assertEqual(response.json()["status"], "cancelled")
+
+    def test_unknown_job(self):
+        response = self.client.get("/jobs/unknown")
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_predict_on_batch_queue_is_full(self):
+        admission = app.state.admission
+        app.state.admission = AdmissionController(max_queued_texts=2, retry_after=7)
+        test_data = {"texts": [{"text_id": "1", "text": "text1"}, {"text_id": "2", "text": "text2"}]}
+
+        first = self.client.post("/predict_on_batch", json={"texts": test_data["texts"][:1]})
+        response = self.client.post("/predict_on_batch", json=test_data)
+        app.state.admission = admission
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "7")
+
+    def test_too_many_texts_in_request(self):
+        admission = app.state.admission
+        app.state.admission = AdmissionController(max_texts_per_request=1)
+        app.state.triton_model_list = []
+
+        response = self.client.post("/predict", json={"text_list": ["text1", "text2"]})
+        app.state.admission = admission
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_model_in_flight_limit(self):
+        admission = app.state.admission
+        app.state.admission = AdmissionController(max_model_in_flight_texts=2)
+        app.state.prediction_cache = None
+        app.state.triton_model_list = [MagicMock(model_name="busy_model")]
+        app.state.triton_model_list[0].make_prediction = AsyncMock(return_value=["pred1"])
+
+        with app.state.admission.model_slots(["busy_model"], 2):
+            response = self.client.post("/predict", json={"text_list": ["text1"]})
+            self.assertEqual(response.status_code, 429)
+            self.assertIn("Retry-After", response.headers)
+            self.assertEqual(
+                self.client.get("/queue_depth").json()["in_flight_texts"], {"busy_model": 2}
+            )
+        response = self.client.post("/predict", json={"text_list": ["text1"]})
+        app.state.admission = admission
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(app.state.admission.in_flight, {})
+
     @patch('app.main.collect_predictions')
     def test_predict_on_batch_invalid_data(self, mock_collect_predictions):
         test_data = {
@@ -184,7 +595,7 @@ class TestTritonAPI(unittest.TestCase):
         )
 
         self.assertEqual(response.status_code, 202)
-        self.assertEqual(response.json(), {"status": "texts received"})
+        self.assertEqual(response.json()["status"], "texts received")
 
 
 if __name__ == '__main__':
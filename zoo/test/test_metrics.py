@@ -0,0 +1,72 @@
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.metrics import Counter, Gauge, Histogram, MetricsMiddleware, Registry
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        counter = registry.register(Counter("requests_total", "Requests.", ("endpoint",)))
+        gauge = registry.register(Gauge("queue", "Queue."))
+
+        counter.inc("/predict")
+        counter.inc("/predict", value=2)
+        counter.inc('/a"b')
+        gauge.set(value=5)
+
+        self.assertEqual(
+            registry.render(),
+            "# HELP requests_total Requests.\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{endpoint="/predict"} 3\n'
+            'requests_total{endpoint="/a\\"b"} 1\n'
+            "# HELP queue Queue.\n"
+            "# TYPE queue gauge\n"
+            "queue 5\n",
+        )
+
+    def test_histogram(self):
+        histogram = Histogram("latency", "Latency.", ("model",), buckets=(0.1, 1.0))
+
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe("m", value=value)
+
+        self.assertEqual(histogram.count("m"), 4)
+        self.assertEqual(histogram.count("other"), 0)
+        self.assertEqual(
+            histogram.render()[2:],
+            [
+                'latency_bucket{model="m",le="0.1"} 2',
+                'latency_bucket{model="m",le="1.0"} 3',
+                'latency_bucket{model="m",le="+Inf"} 4',
+                'latency_sum{model="m"} 2.65',
+                'latency_count{model="m"} 4',
+            ],
+        )
+
+    def test_middleware_counts_by_route_template(self):
+        from app.metrics import HTTP_LATENCY, HTTP_REQUESTS
+
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        def get_item(item_id: str) -> str:
+            return item_id
+
+        client = TestClient(app)
+        before = HTTP_REQUESTS.values.get(("/items/{item_id}", "GET", "200"), 0)
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/unknown")
+
+        self.assertEqual(HTTP_REQUESTS.values[("/items/{item_id}", "GET", "200")], before + 2)
+        self.assertIn(("unmatched", "GET", "404"), HTTP_REQUESTS.values)
+        self.assertGreaterEqual(HTTP_LATENCY.count("/items/{item_id}"), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
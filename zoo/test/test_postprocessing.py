@@ -0,0 +1,75 @@
+import unittest
+
+from app.postprocessing import PostProcessor, get_postprocessor
+
+MAPPING = {
+    "класс1": ("mapped_class1", "#FF0000"),
+    "класс2": ("mapped_class2", "#00FF00"),
+    "нерелевантный": ("нерелевантный", "#CCCCCC"),
+}
+
+
+class TestPostProcessor(unittest.TestCase):
+    def setUp(self):
+        self.postprocessor = PostProcessor(MAPPING, ";", "нерелевантный")
+
+    def test_normalize(self):
+        result = self.postprocessor.normalize([
+            ["класс1;класс2", "unknown"],
+            ["нерелевантный;класс2"],
+            ["нерелевантный", "unknown"],
+            [],
+        ])
+
+        self.assertEqual(result, [
+            [{"prediction": "mapped_class1", "color": "#FF0000"}, {"prediction": "mapped_class2", "color": "#00FF00"}],
+            [{"prediction": "mapped_class2", "color": "#00FF00"}],
+            [{"prediction": "нерелевантный", "color": "#CCCCCC"}],
+            [{"prediction": "нерелевантный", "color": "#CCCCCC"}],
+        ])
+
+    def test_objects_are_shared_and_immutable(self):
+        first, second = self.postprocessor.normalize([["класс1"], ["класс1;unknown"]])
+
+        self.assertIs(first[0], second[0])
+        with self.assertRaises(TypeError):
+            first[0]["prediction"] = "changed"
+        with self.assertRaises(TypeError):
+            first[0].update(color="#000000")
+
+    def test_raw_predictions_are_memoized(self):
+        self.postprocessor.normalize([["класс1;класс2"]] * 3)
+
+        self.assertEqual(list(self.postprocessor._memo), ["класс1;класс2"])
+
+    def test_normalize_columns(self):
+        columns = [["класс1", "нерелевантный"], ["класс2", "нерелевантный"]]
+
+        self.assertEqual(
+            self.postprocessor.normalize_columns(columns),
+            self.postprocessor.normalize([["класс1", "класс2"], ["нерелевантный", "нерелевантный"]]),
+        )
+
+    def test_class_names(self):
+        result = self.postprocessor.class_names([["класс1;класс2"], ["нерелевантный"]])
+
+        self.assertEqual(result, [["mapped_class1", "mapped_class2"], ["нерелевантный"]])
+
+    def test_separator(self):
+        postprocessor = PostProcessor(MAPPING, "|", "нерелевантный")
+
+        self.assertEqual(postprocessor.class_names([["класс1|класс2"]]), [["mapped_class1", "mapped_class2"]])
+
+    def test_irrelevant_class_not_in_mapping(self):
+        with self.assertRaises(ValueError):
+            PostProcessor(MAPPING, ";", "other")
+
+    def test_compiled_once(self):
+        postprocessor = get_postprocessor(MAPPING, ";", "нерелевантный")
+
+        self.assertIs(get_postprocessor(MAPPING, ";", "нерелевантный"), postprocessor)
+        self.assertIsNot(get_postprocessor(dict(MAPPING), ";", "нерелевантный"), postprocessor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock
+
+from app.models import TritonServerAddr
+from app.registry import RegistryWatcher, ServiceRegistry
+
+
+def make_server(url="http://example1.ru", model_name="model1", **kwargs):
+    return TritonServerAddr(url=url, port="8000", model_name=model_name, **kwargs)
+
+
+class TestServiceRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "registry.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_seed_only_on_first_start(self):
+        registry = ServiceRegistry(self.path)
+
+        self.assertTrue(registry.seed([make_server(weight=2, protocol="grpc")], {"endpoint": "http://a.ru"}))
+        self.assertFalse(registry.seed([make_server("http://example2.ru")], {"endpoint": "http://b.ru"}))
+
+        version, services, settings = registry.snapshot()
+        self.assertEqual(version, 1)
+        self.assertEqual(services, [make_server(weight=2, protocol="grpc")])
+        self.assertEqual(settings, {"endpoint": "http://a.ru"})
+        registry.close()
+
+    def test_changes_are_versioned_and_shared(self):
+        registry = ServiceRegistry(self.path)
+        other_worker = ServiceRegistry(self.path)
+
+        self.assertTrue(registry.add_service(make_server()))
+        self.assertFalse(registry.add_service(make_server()))
+        self.assertTrue(registry.add_service(make_server("http://example2.ru")))
+        self.assertEqual(other_worker.version(), 2)
+
+        self.assertTrue(other_worker.remove_services("model1", "http://example1.ru:8000/v2"))
+        self.assertFalse(other_worker.remove_services("model2"))
+        other_worker.set_setting("endpoint_to_send_preds", None)
+
+        version, services, settings = registry.snapshot()
+        self.assertEqual(version, 4)
+        self.assertEqual([server.url for server in services], ["http://example2.ru"])
+        self.assertEqual(settings, {"endpoint_to_send_preds": None})
+
+        self.assertTrue(registry.remove_services("model1"))
+        self.assertEqual(other_worker.snapshot()[1], [])
+        registry.close()
+        other_worker.close()
+
+
+class TestRegistryWatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_applies_only_changes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            registry = ServiceRegistry(os.path.join(tmp_dir, "registry.sqlite"))
+            apply = AsyncMock()
+            watcher = RegistryWatcher(registry, apply)
+            watcher.version = registry.version()
+
+            self.assertFalse(await watcher.check())
+            registry.add_service(make_server())
+            self.assertTrue(await watcher.check())
+            self.assertFalse(await watcher.check())
+
+            apply.assert_awaited_once_with([make_server()], {})
+            registry.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.replicas import ReplicaGroup
+
+
+def make_replica(base, max_batch_size=2, delay=0.0, batching="arrival", max_batch_chars=None):
+    replica = MagicMock(
+        base=base, max_batch_size=max_batch_size, batch_size=max_batch_size, model_version="1",
+        batching=batching, max_batch_chars=max_batch_chars,
+    )
+    replica.batches = []
+
+    async def predict(batch):
+        replica.batches.append(batch)
+        await asyncio.sleep(delay)
+        return [f"p_{t}" for t in batch]
+
+    replica.make_prediction_on_batch = AsyncMock(side_effect=predict)
+    replica.make_prediction = AsyncMock(side_effect=predict)
+    replica.is_ready = AsyncMock(return_value=True)
+    replica.close_connection = AsyncMock()
+    return replica
+
+
+class TestReplicaGroup(unittest.IsolatedAsyncioTestCase):
+    async def test_batches_of_replica_size_in_text_order(self):
+        group = ReplicaGroup("model")
+        small, large = make_replica("small", max_batch_size=1), make_replica("large", max_batch_size=3)
+        group.add(small)
+        group.add(large)
+        texts = [f"t{i}" for i in range(7)]
+
+        result = await group.make_prediction(texts)
+
+        self.assertEqual(result, [f"p_{t}" for t in texts])
+        self.assertTrue(all(len(batch) == 1 for batch in small.batches))
+        self.assertTrue(all(len(batch) <= 3 for batch in large.batches))
+        self.assertEqual(group.max_batch_size, 3)
+        self.assertEqual(group.outstanding, [0, 0])
+
+    async def test_hedged_batch_goes_to_other_replica(self):
+        group = ReplicaGroup("model", balancing="round_robin", hedge_quantile=0.95, hedge_budget=1.0)
+        group.hedger.min_samples = 1
+        group.hedger.latency.add(0.01)
+        slow, fast = make_replica("slow", delay=1), make_replica("fast")
+        group.add(slow)
+        group.add(fast)
+
+        result = await group.make_prediction(["t1", "t2"])
+        await asyncio.sleep(0)
+
+        self.assertEqual(result, ["p_t1", "p_t2"])
+        self.assertEqual(slow.batches, [["t1", "t2"]])
+        self.assertEqual(fast.batches, [["t1", "t2"]])
+        self.assertEqual(group.outstanding, [0, 0])
+
+    async def test_single_replica_is_hedged_to_itself(self):
+        group = ReplicaGroup("model", hedge_quantile=0.95, hedge_budget=1.0)
+        group.hedger.min_samples = 1
+        group.hedger.latency.add(0.01)
+        replica = make_replica("only")
+        calls = 0
+
+        async def predict(batch):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(1 if calls == 1 else 0)
+            return [f"p_{t}" for t in batch]
+
+        replica.make_prediction_on_batch.side_effect = predict
+        group.add(replica)
+
+        self.assertEqual(await group.make_prediction(["t1"]), ["p_t1"])
+        self.assertEqual(calls, 2)
+        replica.make_prediction.assert_not_awaited()
+
+    async def test_length_batching(self):
+        group = ReplicaGroup("model", balancing="round_robin")
+        first = make_replica("first", batching="length", max_batch_chars=6)
+        second = make_replica("second", batching="length", max_batch_chars=6)
+        group.add(first)
+        group.add(second)
+        texts = ["long text", "a", "bb", "ccc", "d"]
+
+        result = await group.make_prediction(texts)
+
+        self.assertEqual(result, [f"p_{t}" for t in texts])
+        self.assertEqual(first.batches, [["a", "d"], ["long text"]])
+        self.assertEqual(second.batches, [["bb", "ccc"]])
+
+    async def test_weighted_round_robin(self):
+        group = ReplicaGroup("model", "round_robin")
+        heavy, light = make_replica("heavy", max_batch_size=1), make_replica("light", max_batch_size=1)
+        group.add(heavy, weight=2)
+        group.add(light, weight=1)
+
+        await group.make_prediction([f"t{i}" for i in range(6)])
+
+        self.assertEqual((len(heavy.batches), len(light.batches)), (4, 2))
+
+    async def test_least_outstanding(self):
+        group = ReplicaGroup("model")
+        slow, fast = make_replica("slow", delay=1), make_replica("fast")
+        group.add(slow)
+        group.add(fast)
+        stalled = asyncio.create_task(group.make_prediction(["t1", "t2"]))
+        await asyncio.sleep(0.01)
+
+        await group.make_prediction(["t3", "t4"])
+        stalled.cancel()
+
+        self.assertEqual(fast.batches[-1], ["t3", "t4"])
+
+    async def test_single_replica_splits_itself(self):
+        group = ReplicaGroup("model")
+        replica = make_replica("only")
+        group.add(replica)
+
+        await group.make_prediction(["t1", "t2", "t3"])
+
+        replica.make_prediction.assert_awaited_once_with(["t1", "t2", "t3"])
+
+    async def test_add_and_remove(self):
+        group = ReplicaGroup("model")
+        first, second = make_replica("first"), make_replica("second")
+        group.add(first)
+        group.add(second)
+
+        group.remove(group.find("first"))
+
+        self.assertEqual(group.replicas, [second])
+        self.assertIsNone(group.find("first"))
+        await group.make_prediction(["t1", "t2", "t3"])
+        self.assertEqual(second.make_prediction.await_count, 1)
+
+    async def test_failed_replica_is_ejected_and_batch_retried(self):
+        group = ReplicaGroup("model", eject_time=60)
+        dead, alive = make_replica("dead"), make_replica("alive")
+        dead.make_prediction_on_batch.side_effect = ConnectionError("refused")
+        group.add(dead)
+        group.add(alive)
+        texts = [f"t{i}" for i in range(4)]
+
+        self.assertEqual(await group.make_prediction(texts), [f"p_{t}" for t in texts])
+        calls = dead.make_prediction_on_batch.await_count
+        self.assertEqual(await group.make_prediction(texts), [f"p_{t}" for t in texts])
+
+        # the ejected replica gets no batches
+        self.assertEqual(dead.make_prediction_on_batch.await_count, calls)
+        self.assertEqual(group.outstanding, [0, 0])
+
+    async def test_all_replicas_failed(self):
+        group = ReplicaGroup("model")
+        first, second = make_replica("first"), make_replica("second")
+        for replica in (first, second):
+            replica.make_prediction_on_batch.side_effect = ConnectionError("refused")
+            group.add(replica)
+
+        with self.assertRaises(ConnectionError):
+            await group.make_prediction(["t1"])
+        # every replica is ejected, so they are all tried again
+        second.make_prediction_on_batch.side_effect = None
+        second.make_prediction_on_batch.return_value = ["p_t1"]
+        self.assertEqual(await group.make_prediction(["t1"]), ["p_t1"])
+
+    async def test_is_ready_if_any_replica_is(self):
+        group = ReplicaGroup("model")
+        down = make_replica("down")
+        down.is_ready.side_effect = ConnectionError("refused")
+        group.add(down)
+        group.add(make_replica("up"))
+
+        self.assertTrue(await group.is_ready())
+
+    def test_unknown_balancing(self):
+        with self.assertRaises(ValueError):
+            ReplicaGroup("model", "random")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.health import HealthMonitor
+from app.scheduler import (
+    DeadlineExceeded,
+    ModelsUnavailable,
+    predict_with_available_models,
+    predict_with_models,
+)
+
+
+def make_model(name, delay=0.0):
+    model = MagicMock(model_name=name)
+
+    async def predict(texts):
+        await asyncio.sleep(delay)
+        return [f"{name}_{t}" for t in texts]
+
+    model.make_prediction = AsyncMock(side_effect=predict)
+    return model
+
+
+class TestScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_predictions_in_text_and_model_order(self):
+        models = [make_model("m1", delay=0.02), make_model("m2")]
+        texts = [f"t{i}" for i in range(7)]
+
+        result = await predict_with_models(models, texts, HealthMonitor())
+
+        self.assertEqual(result, [[f"m1_{t}", f"m2_{t}"] for t in texts])
+        for model in models:
+            model.make_prediction.assert_awaited_once_with(texts)
+
+    async def test_models_are_requested_concurrently(self):
+        all_started = asyncio.Event()
+        started = []
+        models = [make_model(f"m{i}") for i in range(3)]
+
+        async def predict(texts):
+            started.append(texts)
+            if len(started) == len(models):
+                all_started.set()
+            # hangs unless all models are in flight together
+            await asyncio.wait_for(all_started.wait(), timeout=1)
+            return ["ok"] * len(texts)
+
+        for model in models:
+            model.make_prediction.side_effect = predict
+
+        result = await predict_with_models(models, ["t"], HealthMonitor())
+
+        self.assertEqual(result, [["ok", "ok", "ok"]])
+
+    async def test_no_models(self):
+        with self.assertRaises(ModelsUnavailable):
+            await predict_with_models([], ["t1", "t2"], HealthMonitor())
+
+    async def test_every_model_must_answer(self):
+        health = HealthMonitor(failure_threshold=1, reset_timeout=60)
+        cancelled = asyncio.Event()
+        failing, slow = make_model("failing"), make_model("slow")
+        failing.make_prediction.side_effect = ConnectionError("refused")
+
+        async def hang(texts):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        slow.make_prediction.side_effect = hang
+
+        with self.assertRaises(ModelsUnavailable):
+            await predict_with_models([slow, failing], ["t"], health)
+
+        # the other models are not waited for
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(health.states(), {"slow": "healthy", "failing": "open"})
+        # the model with the open circuit is not requested
+        model = make_model("m1")
+        with self.assertRaises(ModelsUnavailable):
+            await predict_with_models([model, failing], ["t"], health)
+        model.make_prediction.assert_not_awaited()
+
+    async def test_wrong_number_of_predictions(self):
+        model = make_model("m")
+        model.make_prediction.side_effect = lambda texts: ["p"]
+
+        with self.assertRaises(ValueError):
+            await predict_with_models([model], ["t1", "t2"], HealthMonitor())
+
+    async def test_failed_and_open_models_are_skipped(self):
+        health = HealthMonitor(failure_threshold=1, reset_timeout=60)
+        health.record("open", False)
+        failing = make_model("failing")
+        failing.make_prediction.side_effect = ConnectionError("refused")
+        models = [make_model("m1"), failing, make_model("open")]
+
+        result, skipped = await predict_with_available_models(models, ["t"], health)
+
+        self.assertEqual(result, [["m1_t"]])
+        self.assertEqual(skipped, ["open", "failing"])
+        models[2].make_prediction.assert_not_awaited()
+        self.assertEqual(health.states(), {"m1": "healthy", "failing": "open", "open": "open"})
+
+    async def test_slow_models_are_cancelled_at_deadline(self):
+        health = HealthMonitor(failure_threshold=1, reset_timeout=60)
+        cancelled = asyncio.Event()
+        slow = make_model("slow")
+
+        async def hang(texts):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        slow.make_prediction.side_effect = hang
+        models = [make_model("m1"), slow]
+
+        result, skipped = await predict_with_available_models(models, ["t"], health, timeout=0.05)
+
+        self.assertEqual(result, [["m1_t"]])
+        self.assertEqual(skipped, ["slow"])
+        self.assertTrue(cancelled.is_set())
+        # the deadline of the caller is not a failure of the model
+        self.assertEqual(health.states(), {"m1": "healthy", "slow": "healthy"})
+
+        with self.assertRaises(DeadlineExceeded):
+            await predict_with_available_models([slow], ["t"], health, timeout=0.05)
+
+    async def test_timed_out_trial_is_released(self):
+        health = HealthMonitor(failure_threshold=1, reset_timeout=0.01)
+        health.record("slow", False)
+        slow = make_model("slow", delay=10)
+        await asyncio.sleep(0.02)
+
+        with self.assertRaises(DeadlineExceeded):
+            await predict_with_available_models([slow], ["t"], health, timeout=0.01)
+
+        self.assertEqual(health.states(), {"slow": "open"})
+        await asyncio.sleep(0.02)
+        self.assertTrue(health.breaker("slow").allow_request())
+
+
+if __name__ == '__main__':
+    unittest.main()
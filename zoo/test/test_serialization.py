@@ -0,0 +1,37 @@
+import unittest
+
+from fastapi.exceptions import RequestValidationError
+
+from app.models import TextItem
+from app.serialization import parse_service_input, parse_text_list, request_body
+
+
+class TestSerialization(unittest.TestCase):
+    def test_parse_text_list(self):
+        self.assertEqual(parse_text_list({"text_list": ["text1", "text2"]}).text_list, ["text1", "text2"])
+
+        with self.assertRaises(RequestValidationError) as cm:
+            parse_text_list({"text_list": ["text1", 2]})
+        self.assertEqual(cm.exception.errors()[0]["loc"], ("body", "text_list", 1))
+
+    def test_parse_service_input(self):
+        data = parse_service_input({"texts": [{"text_id": "1", "text": "text1", "extra": 0}]})
+
+        self.assertEqual(data.texts, [TextItem("1", "text1")])
+        self.assertEqual(data.texts[0].text_id, "1")
+
+        with self.assertRaises(RequestValidationError) as cm:
+            parse_service_input({"texts": [{"text_id": 1, "text": "text1"}]})
+        self.assertEqual(cm.exception.errors()[0]["loc"], ("body", "texts", 0, "text_id"))
+
+    def test_request_body_inlines_nested_models(self):
+        from app.models import ServiceInput
+
+        schema = request_body(ServiceInput)["requestBody"]["content"]["application/json"]["schema"]
+
+        self.assertEqual(schema["properties"]["texts"]["items"]["title"], "TextToPredict")
+        self.assertNotIn("$ref", str(schema))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import yaml
+
+from app.cache import hash_text
+from app.store import PredictionStore, StoredPredictor, main
+
+MODEL_ID = ("model", "1")
+
+
+class TestPredictionStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "predictions.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_put_and_get(self):
+        store = PredictionStore(self.path)
+        store.put_many(MODEL_ID, {b"a": "pa", b"b": "pb"})
+        # the stored prediction is not counted twice
+        store.put_many(MODEL_ID, {b"a": "pa"})
+
+        self.assertEqual(store.get_many(MODEL_ID, [b"a", b"c"]), {b"a": "pa"})
+        self.assertEqual(store.get_many(("model", "2"), [b"a"]), {})
+        self.assertEqual(len(store), 2)
+        store.close()
+
+    def test_survives_reopening(self):
+        store = PredictionStore(self.path)
+        store.put_many(MODEL_ID, {b"a": "pa"})
+        store.close()
+
+        store = PredictionStore(self.path)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get_many(MODEL_ID, [b"a"]), {b"a": "pa"})
+        store.close()
+
+    def test_eviction_of_least_recently_used(self):
+        store = PredictionStore(self.path, max_entries=2)
+        with patch("app.store.time.time", return_value=1):
+            store.put_many(MODEL_ID, {b"a": "pa", b"b": "pb"})
+        with patch("app.store.time.time", return_value=2):
+            store.get_many(MODEL_ID, [b"a"])
+        with patch("app.store.time.time", return_value=3):
+            store.put_many(MODEL_ID, {b"c": "pc"})
+
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.get_many(MODEL_ID, [b"a", b"b", b"c"]), {b"a": "pa", b"c": "pc"})
+        store.close()
+
+    def test_size_is_shared_by_workers(self):
+        first = PredictionStore(self.path, max_entries=2)
+        second = PredictionStore(self.path, max_entries=2)
+        first.put_many(MODEL_ID, {b"a": "pa", b"b": "pb"})
+        second.put_many(MODEL_ID, {b"c": "pc"})
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 2)
+        first.close()
+        second.close()
+
+    def test_many_hashes(self):
+        store = PredictionStore(self.path)
+        items = {hash_text(str(i)): str(i) for i in range(1200)}
+        store.put_many(MODEL_ID, items)
+
+        self.assertEqual(store.get_many(MODEL_ID, list(items)), items)
+        store.close()
+
+    def test_compact_command(self):
+        config_path = os.path.join(self.tmp_dir.name, "config.yml")
+        with open(config_path, "w") as file:
+            yaml.safe_dump({"store_path": self.path, "store_max_entries": 1}, file)
+        store = PredictionStore(self.path, max_entries=10)
+        store.put_many(MODEL_ID, {b"a": "pa", b"b": "pb"})
+        store.close()
+
+        with patch("sys.argv", ["store", "compact", "--config", config_path]):
+            main()
+
+        store = PredictionStore(self.path)
+        self.assertEqual(len(store), 1)
+        store.close()
+
+
+class TestStoredPredictor(unittest.IsolatedAsyncioTestCase):
+    async def test_only_missing_texts_are_predicted(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = PredictionStore(os.path.join(tmp_dir, "predictions.sqlite"))
+            store.put_many(MODEL_ID, {hash_text("a"): "stored_a"})
+            model = MagicMock(model_name="model")
+            model.make_prediction = AsyncMock(side_effect=lambda texts: [f"pred_{t}" for t in texts])
+            predictor = StoredPredictor(store, model, MODEL_ID)
+
+            first = await predictor.make_prediction(["a", "b"])
+            second = await predictor.make_prediction(["b", "a"])
+            store.close()
+
+        self.assertEqual(first, ["stored_a", "pred_b"])
+        self.assertEqual(second, ["pred_b", "stored_a"])
+        model.make_prediction.assert_awaited_once_with(["b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
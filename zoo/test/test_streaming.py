@@ -0,0 +1,133 @@
+import asyncio
+import json
+import unittest
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.streaming import PredictionStreamResponse, StreamError, parse_line
+
+
+async def echo_chunk(items, start):
+    # the first chunk is the slowest, the lines are still sent in order
+    await asyncio.sleep(0.02 if start == 0 else 0)
+    return [{"index": start + i, "text": text, "id": text_id} for i, (text_id, text) in enumerate(items)]
+
+
+def make_client(predict_chunk=echo_chunk, **kwargs):
+    app = FastAPI()
+
+    @app.post("/stream")
+    async def stream(request: Request) -> PredictionStreamResponse:
+        return PredictionStreamResponse(request.headers.get("content-type", ""), predict_chunk, **kwargs)
+
+    return TestClient(app)
+
+
+def read_lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+class TestParseLine(unittest.TestCase):
+    def test_lines(self):
+        self.assertEqual(parse_line(b'"text"\n'), (None, "text"))
+        self.assertEqual(parse_line(b'{"text": "t", "text_id": 5}'), ("5", "t"))
+        self.assertIsNone(parse_line(b"  \n"))
+        with self.assertRaises(StreamError):
+            parse_line(b"{broken")
+        with self.assertRaises(StreamError):
+            parse_line(b'{"id": 1}')
+
+
+class TestPredictionStream(unittest.TestCase):
+    def test_ndjson_body_in_order(self):
+        body = "".join(json.dumps(f"t{i}") + "\n" for i in range(5)) + '{"text": "last", "text_id": "x"}'
+
+        response = make_client(chunk_size=2).post(
+            "/stream", content=body.encode(), headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        lines = read_lines(response)
+        self.assertEqual([line["index"] for line in lines], list(range(6)))
+        self.assertEqual(lines[-1], {"index": 5, "text": "last", "id": "x"})
+
+    def test_streamed_body(self):
+        def body():
+            for i in range(3):
+                yield (json.dumps(f"t{i}") + "\n").encode()
+
+        response = make_client().post("/stream", content=body())
+
+        self.assertEqual([line["text"] for line in read_lines(response)], ["t0", "t1", "t2"])
+
+    def test_json_body(self):
+        response = make_client(chunk_size=2).post("/stream", json={"text_list": ["a", "b", "c"]})
+
+        self.assertEqual([line["text"] for line in read_lines(response)], ["a", "b", "c"])
+
+    def test_invalid_line_stops_stream(self):
+        response = make_client(chunk_size=1).post(
+            "/stream", content=b'"t0"\n{broken\n"t2"\n', headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        lines = read_lines(response)
+        self.assertEqual(lines[0]["text"], "t0")
+        self.assertIn("error", lines[-1])
+        self.assertEqual(len(lines), 2)
+
+    def test_bounded_chunks_in_flight(self):
+        in_flight = 0
+        peak = 0
+
+        async def slow_chunk(items, start):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return [{"index": start + i} for i in range(len(items))]
+
+        body = "".join(json.dumps(f"t{i}") + "\n" for i in range(20))
+        response = make_client(slow_chunk, chunk_size=1, max_in_flight=3).post("/stream", content=body.encode())
+
+        self.assertEqual(len(read_lines(response)), 20)
+        self.assertEqual(peak, 3)
+
+
+class TestClientDisconnect(unittest.IsolatedAsyncioTestCase):
+    async def test_work_stops_on_disconnect(self):
+        cancelled = asyncio.Event()
+
+        async def hanging_chunk(items, start):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        messages = [
+            {"type": "http.request", "body": b'"t0"\n"t1"\n', "more_body": False},
+        ]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.sleep(0.02)
+            return {"type": "http.disconnect"}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        response = PredictionStreamResponse("application/x-ndjson", hanging_chunk)
+        await asyncio.wait_for(response({"type": "http"}, receive, send), 1)
+
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(sent[0]["type"], "http.response.start")
+
+
+if __name__ == '__main__':
+    unittest.main()
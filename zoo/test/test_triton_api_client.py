@@ -1,7 +1,12 @@
 import unittest
 import requests
 from unittest.mock import Mock, patch
-from app.triton_api_client import TritonApiClient
+from app.triton_api_client import (
+    TritonApiClient,
+    length_order,
+    restore_order,
+    split_into_batches,
+)
 
 class TestTritonApiClient(unittest.TestCase):
     def setUp(self):
@@ -98,5 +103,21 @@ class TestTritonApiClient(unittest.TestCase):
         self.assertIsNone(client.sess)
         self.mock_session.return_value.close.assert_called_once()
 
+class TestBatching(unittest.TestCase):
+    def test_split_into_batches(self):
+        texts = ["aaaa", "bb", "cc", "d", "eeeeeeee", "f"]
+
+        self.assertEqual(split_into_batches(texts, 4), [(0, 4), (4, 6)])
+        # a text over the limit is a batch on its own
+        self.assertEqual(split_into_batches(texts, 4, max_batch_chars=6), [(0, 2), (2, 4), (4, 5), (5, 6)])
+
+    def test_length_order(self):
+        texts = ["ccc", "a", "bb", "d"]
+        order = length_order(texts)
+
+        self.assertEqual([texts[i] for i in order], ["a", "d", "bb", "ccc"])
+        self.assertEqual(restore_order([f"p_{texts[i]}" for i in order], order), [f"p_{t}" for t in texts])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,151 @@
+"""A local stand-in for Triton HTTP server, speaks KServe v2 protocol.
+
+It supports JSON and binary tensor data requests and serves every
+requested model with the same `predict` function. The latency, the
+failure rate and the max batch size are configurable, so it also serves
+as the model server of the benchmark. POST /platform imitates the
+platform endpoint receiving predictions.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.binary_tensor import (
+    INFERENCE_HEADER,
+    deserialize_bytes_tensor,
+    serialize_bytes_tensor,
+)
+
+_MODEL_PATH = re.compile(r"^/v2/models/(?P<model>[^/]+)(/(?P<action>config|infer))?$")
+
+
+def default_predict(model_name: str, texts: list[str]) -> list[str]:
+    return [f"{model_name}:{t}" for t in texts]
+
+
+class TritonStub:
+    """The stand-in server running in a background thread.
+
+    Use it as a context manager, `url` and `port` are available inside.
+    """
+
+    def __init__(
+        self,
+        max_batch_size=8,
+        binary_support=True,
+        predict=default_predict,
+        model_version="1",
+        latency=0.0,
+        per_text_latency=0.0,
+        per_char_latency=0.0,
+        failure_rate=0.0,
+        seed=0,
+    ):
+        self.max_batch_size = max_batch_size
+        self.model_version = model_version
+        self.binary_support = binary_support
+        self.predict = predict
+        # an inference takes `latency` plus `per_text_latency` for every text of the batch
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        # and `per_char_latency` for every character of the batch padded to its longest text
+        self.per_char_latency = per_char_latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests = []
+        self.platform_payloads = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        self.url = "http://127.0.0.1"
+        self.port = self.server.server_address[1]
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # the headers and the body are written separately, Nagle would delay the body
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body=b"", headers=None):
+                self.send_response(code)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                match = _MODEL_PATH.match(self.path)
+                if self.path in ("/v2", "/v2/health/ready"):
+                    self._send(200)
+                elif match and match["action"] == "config":
+                    config = {"name": match["model"], "max_batch_size": stub.max_batch_size}
+                    self._send(200, json.dumps(config).encode())
+                elif match and match["action"] is None:
+                    metadata = {"name": match["model"], "versions": [stub.model_version]}
+                    self._send(200, json.dumps(metadata).encode())
+                else:
+                    self._send(404)
+
+            def do_POST(self):
+                match = _MODEL_PATH.match(self.path)
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.path == "/platform":
+                    stub.platform_payloads += 1
+                    return self._send(200)
+                if not match or match["action"] != "infer":
+                    return self._send(404)
+                header_length = self.headers.get(INFERENCE_HEADER)
+                binary = header_length is not None
+                stub.requests.append({"binary": binary, "size": len(body)})
+                if binary and not stub.binary_support:
+                    return self._send(400, b'{"error": "failed to parse the request JSON buffer"}')
+                if binary:
+                    header = json.loads(body[: int(header_length)])
+                    texts = deserialize_bytes_tensor(body[int(header_length) :])
+                else:
+                    header = json.loads(body)
+                    texts = header["inputs"][0]["data"]
+                if len(texts) > stub.max_batch_size:
+                    return self._send(400, b'{"error": "the batch is larger than max_batch_size"}')
+                padded_chars = len(texts) * max(map(len, texts), default=0)
+                time.sleep(
+                    stub.latency
+                    + stub.per_text_latency * len(texts)
+                    + stub.per_char_latency * padded_chars
+                )
+                if stub.random.random() < stub.failure_rate:
+                    return self._send(500, b'{"error": "inference failed"}')
+                preds = stub.predict(match["model"], texts)
+                output = {"name": "labels", "datatype": "BYTES", "shape": [len(preds), 1]}
+                if header.get("parameters", {}).get("binary_data_output"):
+                    tensor = serialize_bytes_tensor(preds)
+                    output["parameters"] = {"binary_data_size": len(tensor)}
+                    response = json.dumps({"outputs": [output]}).encode()
+                    self._send(
+                        200,
+                        response + tensor,
+                        {INFERENCE_HEADER: str(len(response)), "Content-Type": "application/octet-stream"},
+                    )
+                else:
+                    output["data"] = preds
+                    self._send(200, json.dumps({"outputs": [output]}).encode(), {"Content-Type": "application/json"})
+
+        return Handler